@@ -1,13 +1,88 @@
-"""PolyClaw Web Dashboard"""
-from flask import Flask, render_template, request, jsonify
-import json, os, sys
+"""PolyClaw Web Dashboard
+
+    python app.py [port]            # Flask 开发服务器（默认 8877）
+    python app.py serve [port]      # 生产模式：waitress 线程池（pip install waitress），没装时退回 werkzeug 多线程
+
+- /api/markets 的 JSON 在进程内缓存 MARKETS_RESPONSE_TTL 秒（序列化 + gzip 只做一次）
+- /api/portfolio 按实时价估值（valuation.py），按 paper_trading.version() 缓存 PRICE_TTL 秒，
+  带 ETag，If-None-Match 命中回 304
+- JSON / HTML 响应按 Accept-Encoding 做 gzip（SSE 流不压）
+- buy / sell / reset 在 paper_trading.PortfolioService 的锁 + file_lock 下串行（跨线程也跨进程）
+- /api/stream 每个连接一直占着一个线程，所以同时最多 MAX_STREAMS 个（默认线程数 - SSE_RESERVE），
+  多出来的回 503 + Retry-After，页面退回轮询 /api/portfolio，过一会儿再连
+POLYCLAW_HTTP_CACHE=0 关掉缓存 / ETag / gzip（压测对照用，见 bench_app.py）。
+"""
+from flask import Flask, Response, render_template, request, jsonify
+import gzip, hashlib, json, os, queue, sys, threading, time
 
 sys.path.insert(0, os.path.dirname(__file__))
-from market_data import get_trending_markets
+from market_cache import get_markets
+import paper_trading
 from paper_trading import buy, sell, get_portfolio, get_pnl, reset
+import live_feed
+from valuation import PRICE_TTL
+
+HTTP_CACHE = os.environ.get("POLYCLAW_HTTP_CACHE", "1") != "0"
+MARKETS_RESPONSE_TTL = 2.0      # 秒；底层 market_cache 另有自己的 TTL
+GZIP_MIN_SIZE = 500             # 小于这个不压
+SERVE_THREADS = int(os.environ.get("POLYCLAW_HTTP_THREADS", "32"))   # 每个 SSE 连接占一个线程
+SSE_RESERVE = 8                 # 留给普通 API 请求的线程
+MAX_STREAMS = int(os.environ.get("POLYCLAW_SSE_MAX", max(SERVE_THREADS - SSE_RESERVE, 1)))
+SSE_RETRY_AFTER = 30            # 秒：满了之后让客户端多久再试
+COMPRESSIBLE = ("application/json", "text/html", "text/css", "application/javascript")
 
 app = Flask(__name__, template_folder=os.path.dirname(__file__))
 
+_responses = {}                 # key -> {"version", "expires", "etag", "body", "gz"}
+_responses_lock = threading.Lock()
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+def _accepts_gzip():
+    return "gzip" in request.headers.get("Accept-Encoding", "")
+
+
+def _cached_json(key, version, build, ttl=None):
+    """JSON response reused while `version` is unchanged (and within `ttl`), with ETag + gzip."""
+    now = time.monotonic()
+    with _responses_lock:
+        entry = _responses.get(key)
+    if entry is None or entry["version"] != version or (entry["expires"] is not None and now >= entry["expires"]):
+        body = json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode()
+        entry = {"version": version, "expires": now + ttl if ttl else None,
+                 "etag": hashlib.sha1(body).hexdigest()[:16], "body": body, "gz": None}
+        with _responses_lock:
+            _responses[key] = entry
+    if request.if_none_match.contains(entry["etag"]):
+        resp = Response(status=304)
+    elif _accepts_gzip() and len(entry["body"]) >= GZIP_MIN_SIZE:
+        if entry["gz"] is None:
+            entry["gz"] = gzip.compress(entry["body"], 6)
+        resp = Response(entry["gz"], mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = Response(entry["body"], mimetype="application/json")
+    resp.set_etag(entry["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
+@app.after_request
+def _compress(resp):
+    if (not HTTP_CACHE or resp.is_streamed or resp.direct_passthrough or resp.status_code != 200
+            or "Content-Encoding" in resp.headers or resp.mimetype not in COMPRESSIBLE
+            or not _accepts_gzip()):
+        return resp
+    body = resp.get_data()
+    if len(body) < GZIP_MIN_SIZE:
+        return resp
+    resp.set_data(gzip.compress(body, 6))
+    resp.headers["Content-Encoding"] = "gzip"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
 @app.route("/")
 def index():
     return render_template("index.html")
@@ -15,30 +90,90 @@ def index():
 @app.route("/api/markets")
 def api_markets():
     try:
-        markets = get_trending_markets(30)
+        if HTTP_CACHE:
+            return _cached_json("markets", None, lambda: get_markets(30), ttl=MARKETS_RESPONSE_TTL)
+        markets = get_markets(30)
         return jsonify(markets)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route("/api/portfolio")
 def api_portfolio():
-    return jsonify(get_pnl())
+    if HTTP_CACHE:
+        return _cached_json("portfolio", paper_trading.version(), lambda: get_pnl(live=True), ttl=PRICE_TTL)
+    return jsonify(get_pnl(live=True))
+
+@app.route("/api/stream")
+def api_stream():
+    """SSE: snapshot on connect, then markets / prices / portfolio deltas (see live_feed.py)."""
+    if not _streams.acquire(blocking=False):
+        resp = jsonify({"error": f"too many live streams (max {MAX_STREAMS}), poll /api/portfolio"})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = str(SSE_RETRY_AFTER)
+        return resp
+    try:
+        feed = live_feed.get_feed()
+        q = feed.hub.subscribe()
+        feed.poke()
+    except Exception:
+        _streams.release()
+        raise
+
+    def events():
+        while True:
+            try:
+                yield q.get(timeout=live_feed.HEARTBEAT)
+            except queue.Empty:
+                yield ": ping\n\n"
+
+    def closed():
+        # 服务器关掉响应时调用（包括还没开始迭代就断开的连接），名额一定会还回去
+        feed.hub.unsubscribe(q)
+        _streams.release()
+
+    resp = Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    resp.call_on_close(closed)
+    return resp
+
+def _traded(result):
+    live_feed.poke()
+    return jsonify(result)
 
 @app.route("/api/buy", methods=["POST"])
 def api_buy():
     d = request.json
     result = buy(d["market_id"], d["question"], d["side"], d["price"], d["amount"])
-    return jsonify(result)
+    return _traded(result)
 
 @app.route("/api/sell", methods=["POST"])
 def api_sell():
     d = request.json
     result = sell(d["market_id"], d["side"], d["price"], d.get("shares"))
-    return jsonify(result)
+    return _traded(result)
 
 @app.route("/api/reset", methods=["POST"])
 def api_reset():
-    return jsonify(reset())
+    return _traded(reset())
+
+
+def serve(host="0.0.0.0", port=8877, threads=SERVE_THREADS):
+    """Production server: waitress thread pool when installed, else a threaded werkzeug server."""
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        waitress_serve = None
+    if waitress_serve is not None:
+        print(f"PolyClaw on http://{host}:{port} (waitress, {threads} threads)")
+        waitress_serve(app, host=host, port=port, threads=threads, ident="polyclaw")
+        return
+    from werkzeug.serving import make_server
+    print(f"PolyClaw on http://{host}:{port} (werkzeug threaded — pip install waitress for production)")
+    make_server(host, port, app, threaded=True).serve_forever()
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8877, debug=False)
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve(port=int(sys.argv[2]) if len(sys.argv) > 2 else 8877)
+    else:
+        app.run(host="0.0.0.0", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8877, debug=False, threaded=True)
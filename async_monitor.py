@@ -0,0 +1,159 @@
+"""
+PolyClaw Async Monitor — 抓价 / 异动检测 / 交易 三段流水线
+
+    fetcher ──price_q──▶ evaluator ──trade_q──▶ trader
+
+- fetcher: 每 SCAN_INTERVAL 抓一次价格（在线程里跑，不阻塞事件循环）
+- evaluator: 对比上一份价格、冷却过滤、每小时限额（should_trigger_trade）
+- trader: 在线程里跑 run_trading_cycle，慢也不影响抓价
+- reconciler（仅 POLYCLAW_EXECUTION=live）: 每 RECONCILE_INTERVAL 把实盘订单的成交对账进持仓；
+  下单/查单本身在 execution.OrderManager 的后台线程里，不占这条循环
+
+队列都有上限。price_q 满了丢最旧的快照（价格只要最新的）；
+trade_q 满了（上一轮交易还没跑完）就把新警报合并进待发批次，
+等 trader 空出来一次性处理，不会堆积出一串交易周期。
+Ctrl-C / 取消时各阶段退出前把缓存和警报落盘。
+"""
+import asyncio, os, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+import price_monitor as pm
+from price_monitor import log
+
+PRICE_QUEUE_SIZE = 2
+TRADE_QUEUE_SIZE = 1
+RECONCILE_INTERVAL = 5
+
+
+def _held_ids():
+    portfolio = pm.load_portfolio()
+    return {pos["market_id"] for pos in portfolio.get("positions", {}).values()}
+
+
+async def _put_latest(q, item):
+    """Non-blocking put that evicts the oldest item when the queue is full."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            try:
+                q.get_nowait()
+                q.task_done()
+            except asyncio.QueueEmpty:
+                pass
+
+
+async def fetcher(price_q, fetch=None, interval=None):
+    fetch = fetch or pm.fetch_market_prices
+    interval = pm.SCAN_INTERVAL if interval is None else interval
+    failures = 0
+    while True:
+        started = time.monotonic()
+        try:
+            held_ids = await asyncio.to_thread(_held_ids)
+            prices = await asyncio.to_thread(fetch, held_ids)
+        except Exception as e:
+            log.error(f"Fetch stage error: {e}", exc_info=True)
+            prices, held_ids = None, set()
+        if prices:
+            failures = 0
+            await _put_latest(price_q, (held_ids, prices))
+            wait = interval
+        else:
+            failures += 1
+            wait = pm.SCAN_INTERVAL_FALLBACK if failures >= pm.MAX_FAILURES_BEFORE_BACKOFF else interval
+            if failures >= pm.MAX_FAILURES_BEFORE_BACKOFF:
+                log.warning(f"⚠️ {failures} consecutive failures, backing off to {wait}s")
+        await asyncio.sleep(max(0, wait - (time.monotonic() - started)))
+
+
+async def evaluator(price_q, trade_q, alert_data):
+    cache = await asyncio.to_thread(pm.load_price_cache)
+    detector = await asyncio.to_thread(pm.get_detector)
+    pending = {}  # market_id -> alert，trader 忙时攒着
+    try:
+        while True:
+            held_ids, prices = await price_q.get()
+            try:
+                new_alerts = pm.check_price_movements(prices, held_ids, detector)
+                for a in pm.filter_cooldown(new_alerts, held_ids, alert_data):
+                    pending[a["market_id"]] = a
+                if pending and not trade_q.full():
+                    batch = list(pending.values())
+                    pending.clear()  # 超出每小时限额的直接丢弃，和同步循环一致
+                    if pm.should_trigger_trade(alert_data):
+                        trade_q.put_nowait(batch)
+                        pm.record_trigger(alert_data, batch)
+                        await asyncio.to_thread(pm.save_alerts, alert_data)
+                if prices != cache:
+                    cache = prices
+                    await asyncio.to_thread(pm.save_price_cache, prices)
+            finally:
+                price_q.task_done()
+    finally:
+        pm.save_price_cache(cache)
+
+
+async def trader(trade_q, trigger=None):
+    trigger = trigger or pm.trigger_trading_cycle
+    while True:
+        alerts = await trade_q.get()
+        try:
+            await asyncio.to_thread(trigger, alerts)
+        except Exception as e:
+            log.error(f"❌ Trade stage error: {e}", exc_info=True)
+        finally:
+            trade_q.task_done()
+
+
+async def reconciler(sync=None, interval=RECONCILE_INTERVAL):
+    if sync is None:
+        from auto_trader import sync_orders as sync
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for action in await asyncio.to_thread(sync):
+                log.info(f"  {action}")
+        except Exception as e:
+            log.error(f"❌ Reconcile error: {e}", exc_info=True)
+
+
+async def run_pipeline(duration=None, fetch=None, trigger=None, interval=None):
+    """Run the three stages until cancelled (or for `duration` seconds)."""
+    price_q = asyncio.Queue(PRICE_QUEUE_SIZE)
+    trade_q = asyncio.Queue(TRADE_QUEUE_SIZE)
+    alert_data = pm.load_alerts()
+    tasks = [
+        asyncio.create_task(fetcher(price_q, fetch, interval), name="fetcher"),
+        asyncio.create_task(evaluator(price_q, trade_q, alert_data), name="evaluator"),
+        asyncio.create_task(trader(trade_q, trigger), name="trader"),
+    ]
+    if os.environ.get("POLYCLAW_EXECUTION") == "live":
+        tasks.append(asyncio.create_task(reconciler(), name="reconciler"))
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=duration, return_when=asyncio.FIRST_EXCEPTION)
+        for t in done:
+            t.result()  # 某个阶段崩了就抛出来
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pm.save_alerts(alert_data)
+
+
+def main():
+    log.info("=" * 50)
+    log.info("🔍 PolyClaw Async Monitor started")
+    log.info(f"   Scan interval: {pm.SCAN_INTERVAL}s")
+    log.info(f"   Alert threshold: {pm.ALERT_THRESHOLD*100}%")
+    log.info(f"   Max triggers/hour: {pm.MAX_ALERTS_PER_HOUR}")
+    log.info("=" * 50)
+    try:
+        asyncio.run(run_pipeline())
+    except KeyboardInterrupt:
+        log.info("Monitor stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Crash-safe file writes + per-file locks
+
+monitor / cron 的 auto_trader / generate_dashboard / Flask 可能同时读写同一批 JSON：
+- atomic_write_*: 写临时文件 → fsync → rename，读的人永远看到完整的旧版或新版
+- file_lock(path): 针对单个文件的进程间互斥锁（flock，同线程可重入），
+  只在 读-改-写 期间持有；不同文件互不阻塞，纯读取不需要锁
+"""
+import json, os, tempfile, threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: 只保留进程内互斥
+    fcntl = None
+
+_local = threading.local()
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path, text, encoding="utf-8"):
+    """Replace `path` with `text` so readers never observe a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _fsync_dir(path)
+
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    dump_kwargs.setdefault("ensure_ascii", False)
+    atomic_write_text(path, json.dumps(obj, **dump_kwargs))
+
+
+def read_json(path, default=None):
+    """Load JSON from path; `default()` (or None) when the file is missing."""
+    if not os.path.exists(path):
+        return default() if callable(default) else default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _process_lock(path):
+    with _process_locks_guard:
+        return _process_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock for read-modify-write of `path` across threads and processes.
+
+    Re-entrant within one thread, so generate_report() inside
+    take_daily_snapshot() doesn't deadlock on the same portfolio.
+    """
+    path = os.path.abspath(path)
+    held = getattr(_local, "held", None)
+    if held is None:
+        held = _local.held = {}
+    if path in held:
+        held[path] += 1
+        try:
+            yield
+        finally:
+            held[path] -= 1
+        return
+
+    plock = _process_lock(path)
+    with plock:
+        with open(path + ".lock", "a") as lf:
+            if fcntl:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+            held[path] = 1
+            try:
+                yield
+            finally:
+                del held[path]
+                if fcntl:
+                    fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
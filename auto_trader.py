@@ -9,13 +9,26 @@ PolyClaw Auto Trader v4 — 结构性策略
 - 策略4: 低概率彩票 — 小额分散，赌赔率
 - 绝对禁止: 同主题反复开仓、单场体育、"分析新闻选方向"
 """
-import json, os, sys, random, re
+import json, os, sys, random, re, time
+from collections import Counter
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 sys.path.insert(0, os.path.dirname(__file__))
-from market_data import get_trending_markets
+from market_cache import get_markets
+from market_data import get_markets_by_ids
+import trade_journal, portfolio_db, strategy_registry
+from strategy_registry import Strategy, register, REGISTRY
+from atomic_io import atomic_write_json, file_lock
+try:
+    import vector_scan   # NumPy 向量化扫描；没装 numpy 就走逐条扫描
+except ImportError:
+    vector_scan = None
 
 PORTFOLIO_FILE = os.path.join(os.path.dirname(__file__), "auto_portfolio.json")
+TRADES_FILE = os.path.join(os.path.dirname(__file__), "auto_trades.jsonl")
+DB_FILE = os.path.join(os.path.dirname(__file__), "auto_portfolio.db")
+STORE = os.environ.get("POLYCLAW_STORE", "json")   # json | sqlite
 TRIGGER_FILE = os.path.join(os.path.dirname(__file__), "trigger_trade.json")
 STARTING_BALANCE = 10000.0
 
@@ -54,6 +67,16 @@ LS_TAKE_PROFIT = 2.0       # +200%
 LS_STOP_LOSS = -0.60
 LS_MIN_DAYS_TO_EXPIRY = 7
 
+# 市场数少于这个数时逐个扫描更快（NumPy 建列的固定开销 > 省下的分类和循环）；
+# 冷启动端到端 ~300 持平，1000 起快 1.1-1.2x（python bench_vector_scan.py）
+VECTOR_MIN_MARKETS = 1000
+# 成交模型：mid = 按中间价全额成交（旧行为）；book = 按 CLOB 盘口逐档成交（execution_sim.py）
+FILL_MODEL = os.environ.get("POLYCLAW_FILLS", "mid")
+# 下单出口：paper = 模拟盘（按 FILL_MODEL 成交）；live = py-clob-client 实盘（execution.py）
+EXECUTION = os.environ.get("POLYCLAW_EXECUTION", "paper")
+MAX_SLIPPAGE = 0.05        # 吃单最多比参考价差 5%，更差的档位不吃（剩下的取消）
+REPRICE_DRIFT = 0.25       # 挂单价和策略当前入场价差超过 25% 就撤单重挂
+
 # === 关键词 ===
 SPORTS_SINGLE_GAME = [
     " vs. ", " vs ", "win on 202", "game on", "match on",
@@ -78,88 +101,219 @@ TOPIC_KEYWORDS = [
 ]
 
 
-def _load():
-    if os.path.exists(PORTFOLIO_FILE):
-        with open(PORTFOLIO_FILE) as f:
-            return json.load(f)
+def _config(**overrides):
+    """Snapshot of the module's strategy constants as an attribute object.
+
+    Keyword overrides replace individual constants (used by backtest sweeps);
+    unknown names raise KeyError so a typo doesn't silently test the default.
+    """
+    cfg = {k: v for k, v in globals().items() if k.isupper()}
+    unknown = overrides.keys() - cfg.keys()
+    if unknown:
+        raise KeyError(f"unknown strategy constant(s): {', '.join(sorted(unknown))}")
+    cfg.update(overrides)
+    return SimpleNamespace(**cfg)
+
+
+def _new_portfolio():
     return {
-        "balance": STARTING_BALANCE, "positions": {}, "history": [],
+        "balance": STARTING_BALANCE, "positions": {},
         "daily_snapshots": [], "created": datetime.now().isoformat(), "last_trade": None,
     }
 
+def _load_json():
+    # history 是 append-only journal（auto_trades.jsonl），不随 state 一起读写
+    return trade_journal.load(PORTFOLIO_FILE, TRADES_FILE, _new_portfolio)
+
+def _load():
+    if STORE == "sqlite":
+        return portfolio_db.load(DB_FILE, _new_portfolio)
+    return _load_json()
+
+def _portfolio_lock():
+    """读-改-写整个组合时持有；只锁当前后端的那个文件"""
+    return file_lock(DB_FILE if STORE == "sqlite" else PORTFOLIO_FILE)
+
 def _save(data):
-    with open(PORTFOLIO_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    if STORE == "sqlite":
+        portfolio_db.save(data, DB_FILE)
+    else:
+        trade_journal.save(data, PORTFOLIO_FILE)
 
 
-def _is_single_game_sports(q):
-    q_lower = q.lower()
+def _trie_regex(words):
+    """Prefix-factored alternation (a trie) so the regex branches on one char at a time."""
+    trie = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        alts = [re.escape(ch) + build(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = "(?:" + "|".join(alts) + ")"
+        return body + "?" if "" in node else body
+    return build(trie)
+
+
+def _compile_keywords():
+    """One lookahead trie regex over every keyword list.
+
+    At each position the (greedy) regex reports the longest keyword starting there;
+    every shorter keyword matching at the same position is a prefix of it,
+    so adding those back makes the result identical to the per-keyword
+    substring checks.
+    """
+    tags = {}  # keyword -> [(kind, value)]
     for kw in SPORTS_SINGLE_GAME:
-        if kw in q_lower:
-            return True
-    if re.search(r'win on 202\d-\d{2}-\d{2}', q_lower):
-        return True
-    return False
+        tags.setdefault(kw, []).append(("sports", None))
+    for category, keywords in FEAR_KEYWORDS.items():
+        for kw in keywords:
+            tags.setdefault(kw, []).append(("fear", category))
+    for kw in TOPIC_KEYWORDS:
+        tags.setdefault(kw, []).append(("topic", kw))
+    pattern = re.compile("(?=(" + _trie_regex(tags) + "))")
+    prefixes = {kw: [p for p in tags if kw.startswith(p)] for kw in tags}
+    return pattern, tags, prefixes
+
+_KEYWORD_RE, _KEYWORD_TAGS, _KEYWORD_PREFIXES = _compile_keywords()
+_FEAR_ORDER = {c: i for i, c in enumerate(FEAR_KEYWORDS)}
+_class_cache = {}  # market_id -> (is_sports, fear_category, topics)，每轮交易开始时清空
+_classify_ms = 0.0  # 分类累计耗时；_timed 从各阶段里扣掉，step_cycle 单独记成 "classify"
+
+
+def _classify(q):
+    """Classify a question in one scan: (is_single_game_sports, fear_category|None, topics)."""
+    sports, fear, topics = False, None, set()
+    for match in _KEYWORD_RE.finditer(q.lower()):
+        for kw in _KEYWORD_PREFIXES[match.group(1)]:
+            for kind, value in _KEYWORD_TAGS[kw]:
+                if kind == "sports":
+                    sports = True
+                elif kind == "topic":
+                    topics.add(value)
+                elif fear is None or _FEAR_ORDER[value] < _FEAR_ORDER[fear]:
+                    fear = value
+    # "win on 202X-XX-XX" 已被 "win on 202" 关键词覆盖
+    return sports, fear, frozenset(topics)
+
+
+def _market_class(m):
+    """_classify memoised by market id (works for both markets and positions)."""
+    mid = m.get("market_id", m.get("id"))
+    c = _class_cache.get(mid)
+    if c is None:
+        global _classify_ms
+        t0 = time.perf_counter()
+        c = _class_cache[mid] = _classify(m["question"])
+        _classify_ms += (time.perf_counter() - t0) * 1000
+    return c
+
+
+def _is_single_game_sports(q):
+    return _classify(q)[0]
 
 
 def _get_topics(q):
     """Extract topic keywords from question."""
-    q_lower = q.lower()
-    return {kw for kw in TOPIC_KEYWORDS if kw in q_lower}
+    return set(_classify(q)[2])
 
 
 def _is_fear_market(q):
     """Check if market is fear-driven (war, crash, etc)."""
-    q_lower = q.lower()
-    for category, keywords in FEAR_KEYWORDS.items():
-        for kw in keywords:
-            if kw in q_lower:
-                return True, category
-    return False, None
+    fear = _classify(q)[1]
+    return fear is not None, fear
 
 
-def _held_topics(data):
-    """Get all topics currently held, with their sides."""
-    topics = {}  # topic -> set of sides
-    for pos in data["positions"].values():
-        for t in _get_topics(pos["question"]):
-            if t not in topics:
-                topics[t] = set()
-            topics[t].add(pos["side"])
-    return topics
+class PortfolioIndex:
+    """Incrementally maintained lookups over data["positions"].
 
+    Built once per cycle and updated by add()/remove() as positions open and
+    close, so candidate filtering is O(1) per market instead of rescanning
+    every held position (and its topics) for every candidate.
+    """
 
-def _topic_ok(question, side, data):
-    """Check if we can open this position without topic conflict."""
-    new_topics = _get_topics(question)
-    held = _held_topics(data)
-    
-    for t in new_topics:
-        if t in held:
+    def __init__(self, positions=(), max_topic_positions=None):
+        self.max_topic_positions = MAX_TOPIC_POSITIONS if max_topic_positions is None else max_topic_positions
+        self.market_ids = Counter()     # market_id -> 持仓数
+        self.topic_count = Counter()    # topic -> 持仓数
+        self.topic_sides = Counter()    # (topic, side) -> 持仓数
+        self.strategy_count = Counter() # strategy -> 持仓数
+        for pos in (positions.values() if isinstance(positions, dict) else positions):
+            self.add(pos)
+
+    def _update(self, pos, delta):
+        self.market_ids[pos["market_id"]] += delta
+        self.strategy_count[pos.get("strategy")] += delta
+        for t in _market_class(pos)[2]:
+            self.topic_count[t] += delta
+            self.topic_sides[(t, pos["side"])] += delta
+
+    def add(self, pos):
+        self._update(pos, 1)
+
+    def remove(self, pos):
+        self._update(pos, -1)
+
+    def holds(self, market_id):
+        return self.market_ids[market_id] > 0
+
+    def held_topics(self):
+        """topic -> set of sides, same shape as the old _held_topics()."""
+        topics = {}
+        for (t, side), n in self.topic_sides.items():
+            if n > 0:
+                topics.setdefault(t, set()).add(side)
+        return topics
+
+    def topic_ok(self, topics, side, limit=None):
+        """limit: per-strategy MAX_TOPIC_POSITIONS (defaults to the index's)."""
+        limit = self.max_topic_positions if limit is None else limit
+        for t in topics:
+            if self.topic_count[t] <= 0:
+                continue
             # 同主题数量限制
-            count = sum(1 for pos in data["positions"].values() 
-                       if t in _get_topics(pos["question"]))
-            if count >= MAX_TOPIC_POSITIONS:
+            if self.topic_count[t] >= limit:
                 return False
             # 禁止同主题反方向（这是之前最大的亏损来源）
-            if side not in held[t] and len(held[t]) > 0:
+            if self.topic_sides[(t, side)] <= 0:
                 return False
-    return True
+        return True
+
+
+def _held_topics(data):
+    """Get all topics currently held, with their sides."""
+    return PortfolioIndex(data["positions"]).held_topics()
 
 
-def _check_expiry_days(q):
+def _topic_ok(question, side, data):
+    """Check if we can open this position without topic conflict."""
+    return PortfolioIndex(data["positions"]).topic_ok(_get_topics(question), side)
+
+
+_EXPIRY_PATTERNS = [
+    re.compile(r'(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2}),?\s*(\d{4})?'),
+    re.compile(r'by\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*\s+(\d{1,2})'),
+]
+try:
+    import dateutil.parser as _dateparser   # 只导入一次；以前每次调用都重试 import，没装时很慢
+except ImportError:
+    _dateparser = None
+
+
+def _check_expiry_days(q, today=None):
     """Estimate days to expiry from question text. Returns None if can't determine."""
-    today = datetime.now()
-    patterns = [
-        r'(january|february|march|april|may|june|july|august|september|october|november|december)\s+(\d{1,2}),?\s*(\d{4})?',
-        r'by\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\w*\s+(\d{1,2})',
-    ]
-    for pat in patterns:
-        match = re.search(pat, q.lower())
+    if _dateparser is None:
+        return None
+    today = today or datetime.now()
+    for pat in _EXPIRY_PATTERNS:
+        match = pat.search(q.lower())
         if match:
             try:
-                import dateutil.parser
-                parsed = dateutil.parser.parse(match.group(0), default=today)
+                parsed = _dateparser.parse(match.group(0), default=today)
                 return (parsed - today).days
             except:
                 pass
@@ -169,18 +323,20 @@ def _check_expiry_days(q):
 # ============================================================
 # STRATEGY 1: Fear Premium — 恐惧溢价
 # ============================================================
-def _find_fear_trades(markets, data):
+def _find_fear_trades(markets, data, index=None, cfg=None):
     """Find fear-driven markets where NO is underpriced."""
+    cfg = cfg or _config()
+    index = index or PortfolioIndex(data["positions"], cfg.MAX_TOPIC_POSITIONS)
     candidates = []
     
     for m in markets:
-        if _is_single_game_sports(m["question"]):
+        is_sports, fear_type, topics = _market_class(m)
+        if is_sports:
             continue
-        if m["volume_24h"] < FEAR_MIN_VOLUME:
+        if m["volume_24h"] < cfg.FEAR_MIN_VOLUME:
             continue
         
-        is_fear, fear_type = _is_fear_market(m["question"])
-        if not is_fear:
+        if fear_type is None:
             continue
         
         yes_price = m["outcome_yes"]
@@ -191,11 +347,11 @@ def _find_fear_trades(markets, data):
         if yes_price < 0.20 or yes_price > 0.80:
             continue
         
-        if not _topic_ok(m["question"], "no", data):
+        if not index.topic_ok(topics, "no", cfg.MAX_TOPIC_POSITIONS):
             continue
         
         # 已持有的跳过
-        if m["id"] in {pos["market_id"] for pos in data["positions"].values()}:
+        if index.holds(m["id"]):
             continue
         
         score = 0
@@ -216,18 +372,20 @@ def _find_fear_trades(markets, data):
 # ============================================================
 # STRATEGY 2: High Probability Grinding — 高概率收割
 # ============================================================
-def _find_hp_trades(markets, data):
+def _find_hp_trades(markets, data, index=None, cfg=None):
     """Find high-probability markets (88-96%) for safe grinding."""
+    cfg = cfg or _config()
+    index = index or PortfolioIndex(data["positions"], cfg.MAX_TOPIC_POSITIONS)
     candidates = []
     
-    hp_count = sum(1 for pos in data["positions"].values() if pos.get("strategy") == "hp")
-    if hp_count >= HP_MAX_POSITIONS:
+    if index.strategy_count["hp"] >= cfg.HP_MAX_POSITIONS:
         return []
     
     for m in markets:
-        if _is_single_game_sports(m["question"]):
+        is_sports, _, topics = _market_class(m)
+        if is_sports:
             continue
-        if m["volume_24h"] < HP_MIN_VOLUME:
+        if m["volume_24h"] < cfg.HP_MIN_VOLUME:
             continue
         
         yes_price = m["outcome_yes"]
@@ -239,13 +397,13 @@ def _find_hp_trades(markets, data):
         else:
             high_side, high_price = "no", no_price
         
-        if high_price < HP_MIN_PRICE or high_price > HP_MAX_PRICE:
+        if high_price < cfg.HP_MIN_PRICE or high_price > cfg.HP_MAX_PRICE:
             continue
         
-        if not _topic_ok(m["question"], high_side, data):
+        if not index.topic_ok(topics, high_side, cfg.MAX_TOPIC_POSITIONS):
             continue
         
-        if m["id"] in {pos["market_id"] for pos in data["positions"].values()}:
+        if index.holds(m["id"]):
             continue
         
         score = 0
@@ -266,42 +424,60 @@ def _find_hp_trades(markets, data):
 # ============================================================
 # STRATEGY 3: Momentum — 价格动量（跟随异动）
 # ============================================================
-def _find_momentum_trades(markets, data):
+def _find_momentum_trades(markets, data, index=None):
     """React to price alerts from monitor. Buy in the direction of movement."""
-    if not os.path.exists(TRIGGER_FILE):
+    alerts = _trigger_alerts()
+    if not alerts:
         return []
-    
-    try:
-        with open(TRIGGER_FILE) as f:
-            trigger = json.load(f)
-    except:
+    return _momentum_candidates(alerts, markets, index or PortfolioIndex(data["positions"]))
+
+
+def _trigger_alerts():
+    """读 monitor 写的 trigger 文件，取出未处理的警报并标记为已处理"""
+    if not os.path.exists(TRIGGER_FILE):
         return []
     
-    # 只处理最近10分钟的trigger
-    triggered_at = trigger.get("triggered_at", "")
-    try:
-        trigger_time = datetime.fromisoformat(triggered_at)
-        if (datetime.now() - trigger_time).total_seconds() > 600:
+    with file_lock(TRIGGER_FILE):
+        try:
+            with open(TRIGGER_FILE) as f:
+                trigger = json.load(f)
+        except:
             return []
-    except:
-        return []
-    
-    if trigger.get("status") == "momentum_processed":
-        return []
-    
+        
+        # 只处理最近10分钟的trigger
+        triggered_at = trigger.get("triggered_at", "")
+        try:
+            trigger_time = datetime.fromisoformat(triggered_at)
+            if (datetime.now() - trigger_time).total_seconds() > 600:
+                return []
+        except:
+            return []
+        
+        if trigger.get("status") == "momentum_processed":
+            return []
+        
+        # Mark as processed
+        trigger["status"] = "momentum_processed"
+        atomic_write_json(TRIGGER_FILE, trigger, indent=2)
+        return trigger.get("alerts", [])
+
+
+def _momentum_candidates(alerts, markets, index, max_topic_positions=None):
+    """警报 → (score, market, side) 候选；markets 可以是列表或 id→market 字典"""
     candidates = []
-    markets_by_id = {m["id"]: m for m in markets}
+    markets_by_id = markets if isinstance(markets, dict) else {m["id"]: m for m in markets}
     
-    for alert in trigger.get("alerts", []):
+    for alert in alerts:
         mid = alert.get("market_id")
         m = markets_by_id.get(mid)
         if not m:
             continue
         
-        if _is_single_game_sports(m["question"]):
+        is_sports, _, topics = _market_class(m)
+        if is_sports:
             continue
         
-        if m["id"] in {pos["market_id"] for pos in data["positions"].values()}:
+        if index.holds(m["id"]):
             continue
         
         old_price = alert.get("old_price", 0)
@@ -316,45 +492,42 @@ def _find_momentum_trades(markets, data):
             side = "no"   # YES在跌，买NO
             price = m["outcome_no"]
         
-        if not _topic_ok(m["question"], side, data):
+        if not index.topic_ok(topics, side, max_topic_positions):
             continue
         
         score = int(abs(alert.get("change_pct", 0)) * 5)  # 变化越大分越高
         candidates.append((score, m, side))
     
-    # Mark as processed
-    trigger["status"] = "momentum_processed"
-    with open(TRIGGER_FILE, "w") as f:
-        json.dump(trigger, f, indent=2, ensure_ascii=False)
-    
     return sorted(candidates, key=lambda x: -x[0])
 
 
 # ============================================================
 # STRATEGY 4: Longshot — 低概率彩票
 # ============================================================
-def _find_longshot_trades(markets, data):
+def _find_longshot_trades(markets, data, index=None, cfg=None, now=None):
     """Find ultra-low probability markets for lottery plays."""
-    if not LS_ENABLED:
+    cfg = cfg or _config()
+    if not cfg.LS_ENABLED:
         return []
     
-    ls_count = sum(1 for pos in data["positions"].values() if pos.get("strategy") == "ls")
-    if ls_count >= LS_MAX_POSITIONS:
+    index = index or PortfolioIndex(data["positions"], cfg.MAX_TOPIC_POSITIONS)
+    if index.strategy_count["ls"] >= cfg.LS_MAX_POSITIONS:
         return []
     
     candidates = []
     for m in markets:
         yes_price = m["outcome_yes"]
-        if yes_price < LS_MIN_PRICE or yes_price > LS_MAX_PRICE:
+        if yes_price < cfg.LS_MIN_PRICE or yes_price > cfg.LS_MAX_PRICE:
             continue
-        if _is_single_game_sports(m["question"]):
+        is_sports, fear_type, _ = _market_class(m)
+        if is_sports:
             continue
-        if m["id"] in {pos["market_id"] for pos in data["positions"].values()}:
+        if index.holds(m["id"]):
             continue
         
         # 检查到期日
-        days = _check_expiry_days(m["question"])
-        if days is not None and days < LS_MIN_DAYS_TO_EXPIRY:
+        days = _check_expiry_days(m["question"], now)
+        if days is not None and days < cfg.LS_MIN_DAYS_TO_EXPIRY:
             continue
         
         score = 20
@@ -365,31 +538,418 @@ def _find_longshot_trades(markets, data):
         elif yes_price <= 0.03: score += 10
         
         # 地缘政治/政治更容易出黑天鹅
-        is_fear, _ = _is_fear_market(m["question"])
-        if is_fear: score += 10
+        if fear_type is not None: score += 10
         
         candidates.append((score, m))
     
     return sorted(candidates, key=lambda x: -x[0])
 
 
+def _add_held_markets(markets_by_id, data):
+    """持仓跌出trending列表时按id补抓，保证每个仓位都有现价（止盈止损/报告都依赖它）"""
+    held = list(data["positions"].values()) + list(data.get("orders", {}).values())
+    missing = {pos["market_id"] for pos in held} - markets_by_id.keys()
+    if not missing:
+        return markets_by_id
+    try:
+        markets_by_id.update(get_markets_by_ids(missing))
+    except Exception as e:
+        # 补抓失败这些仓位本轮就没有止盈止损检查，至少留个记录
+        print(f"⚠️ held market fetch failed ({len(missing)} markets): {e}", file=sys.stderr)
+    return markets_by_id
+
+
+# ============================================================
+# STRATEGY REGISTRY — 内置策略（接口和配置见 strategy_registry.py）
+# ============================================================
+@register
+class FearStrategy(Strategy):
+    name, emoji, label = "fear", "🛡️", "恐惧溢价"
+    size_pct, take_profit, stop_loss = "FEAR_POSITION_PCT", "FEAR_TAKE_PROFIT", "FEAR_STOP_LOSS"
+    min_order = 30
+
+    def scan(self, ctx, cfg):
+        found = (vector_scan.fear_candidates(ctx.frame, cfg) if ctx.frame is not None
+                 else _find_fear_trades(ctx.markets, ctx.data, ctx.index, cfg))
+        return [(score, m, "no") for score, m in found]
+
+
+@register
+class HighProbStrategy(Strategy):
+    name, emoji, label = "hp", "💎", "高概率"
+    size_pct, take_profit, stop_loss = "HP_POSITION_PCT", "HP_TAKE_PROFIT", "HP_STOP_LOSS"
+    max_positions = "HP_MAX_POSITIONS"
+    min_order = 50
+
+    def scan(self, ctx, cfg):
+        return (vector_scan.hp_candidates(ctx.frame, cfg) if ctx.frame is not None
+                else _find_hp_trades(ctx.markets, ctx.data, ctx.index, cfg))
+
+
+@register
+class MomentumStrategy(Strategy):
+    name, emoji, label, key_prefix = "momentum", "⚡", "动量", "mom"
+    size_pct, take_profit, stop_loss = "MOM_POSITION_PCT", "MOM_TAKE_PROFIT", "MOM_STOP_LOSS"
+    min_order = 30
+
+    def scan(self, ctx, cfg):
+        alerts = ctx.momentum_alerts() if callable(ctx.momentum_alerts) else ctx.momentum_alerts
+        return _momentum_candidates(alerts, ctx.markets, ctx.index, cfg.MAX_TOPIC_POSITIONS) if alerts else []
+
+
+@register
+class LongshotStrategy(Strategy):
+    name, emoji, label = "ls", "🎰", "彩票"
+    take_profit, stop_loss = "LS_TAKE_PROFIT", "LS_STOP_LOSS"
+    max_positions = "LS_MAX_POSITIONS"
+    min_order = 5
+    topic_exempt = True     # 彩票单笔小，一直不受同主题限制
+    resting = True          # 0.75x 限价单：book 成交模型下挂着等后面的 tick 成交
+    price_fmt = ".1f"
+
+    def scan(self, ctx, cfg):
+        found = (vector_scan.longshot_candidates(ctx.frame, cfg) if ctx.frame is not None
+                 else _find_longshot_trades(ctx.markets, ctx.data, ctx.index, cfg, ctx.now))
+        return [(score, m, "yes") for score, m in found]
+
+    def order_size(self, balance, cfg):
+        return round(min(cfg.LS_MAX_PER_TRADE, balance - cfg.MIN_RESERVE), 2)
+
+    def entry_price(self, m, side):
+        return round(max(m["outcome_yes"] * 0.75, 0.001), 4)   # 挂低价限价单
+
+
+_strategies = None
+_defaults = {}
+last_timings = {}           # 上一个 step_cycle 各阶段耗时（ms）
+timing_totals = Counter()   # 进程内累计（ms），backtest 用来看谁占大头
+
+
+def get_strategies(reload=False):
+    """Enabled strategies in allocation order, from strategies.yaml/.json (or the built-in defaults)."""
+    global _strategies
+    if _strategies is None or reload:
+        _strategies = strategy_registry.build(strategy_registry.load_config(),
+                                              known_params=vars(_config()).keys())
+    return _strategies
+
+
+def _strategy_for(name):
+    """Strategy object for a position's `strategy` field — also for disabled ones, so their exits still run."""
+    for s in get_strategies():
+        if s.name == name:
+            return s
+    if name not in _defaults and name in REGISTRY:
+        _defaults[name] = REGISTRY[name]()
+    return _defaults.get(name)
+
+
+def _timed(fn, *args):
+    """(fn(*args), ms) — ms leaves out keyword classification, which is its own stage."""
+    t0, c0 = time.perf_counter(), _classify_ms
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000 - (_classify_ms - c0)
+
+
+def _scan_strategies(markets, data, index, cfg, now, momentum_alerts=None, strategies=None):
+    """Run every strategy's scan against the same read-only portfolio snapshot.
+
+    Returns ({name: [(score, market, side), ...]}, {stage: ms}); the stages
+    are the strategies plus "frame" when the columnar frame is built. The
+    frame is built once and shared by all scans; the scans don't open
+    anything, so conflicts between strategies are resolved afterwards by
+    _allocate().
+    """
+    strategies = get_strategies() if strategies is None else strategies
+    frame, timings = None, {}
+    if vector_scan is not None and len(markets) >= cfg.VECTOR_MIN_MARKETS:
+        frame, timings["frame"] = _timed(vector_scan.MarketFrame, markets, index, _market_class,
+                                         lambda q: _check_expiry_days(q, now))
+    ctx = SimpleNamespace(markets=markets, data=data, index=index, frame=frame,
+                          now=now, momentum_alerts=momentum_alerts)
+    # 扫描是纯 Python（分类正则 + 小循环），线程池过 GIL 没有收益，顺序跑
+    results = {s.name: _timed(s.scan, ctx, s.config(cfg)) for s in strategies}
+    timings.update((name, r[1]) for name, r in results.items())
+    return {name: r[0] for name, r in results.items()}, timings
+
+
+def _allocate(data, proposals, index, cfg, ts, strategies=None, execution=None, now=None):
+    """Turn ranked proposals into positions, deterministically.
+
+    Strategies are served in registry order, each taking its best proposals
+    that still pass the live checks: total/strategy position caps, cash
+    reserve, not already held and topic limits (including positions opened
+    earlier in this same step; topic_exempt strategies skip the latter).
+    With an `execution` simulator orders fill against the book instead of
+    at the quoted price (see _execute_entry). Returns the action strings.
+    """
+    actions = []
+    for strat in (get_strategies() if strategies is None else strategies):
+        scfg = strat.config(cfg)
+        cap = strat.position_cap(scfg)
+        opened = 0
+        for score, m, side in proposals.get(strat.name, ()):
+            if opened >= strat.max_new or _open_count(data) >= cfg.MAX_POSITIONS:
+                break
+            if cap is not None and index.strategy_count[strat.name] >= cap:
+                break
+            amount = strat.order_size(data["balance"], scfg)
+            if amount < strat.min_order:
+                break
+            if index.holds(m["id"]):
+                continue
+            if not strat.topic_exempt and not index.topic_ok(_market_class(m)[2], side, scfg.MAX_TOPIC_POSITIONS):
+                continue
+            price = strat.entry_price(m, side)
+            if price is None:
+                continue
+            key = f"{strat.prefix}_{m['id']}_{side}"
+            if execution is not None:
+                action = _execute_entry(data, execution, strat, key, m, side, price, amount, score, ts, now, index, scfg)
+                if action:
+                    opened += 1
+                    actions.append(action)
+                continue
+            index.add(_open_position(data, key, m, side, price, amount, strat.name, score, ts))
+            opened += 1
+            actions.append(f"{strat.emoji} {strat.label or strat.name} | {m['question'][:40]} | "
+                           f"{side.upper()} @ {price*100:{strat.price_fmt}}¢ | ${amount:.0f}")
+    return actions
+
+
 # ============================================================
 # MAIN TRADING CYCLE
 # ============================================================
 def run_trading_cycle():
+    # 整轮持锁：monitor 触发和 cron 同时跑时不会互相覆盖
+    with _portfolio_lock():
+        return _run_trading_cycle()
+
+
+def _run_trading_cycle():
+    _class_cache.clear()
     data = _load()
-    actions = []
     
     # 1. Fetch markets
     try:
-        markets = get_trending_markets(100)
+        markets = get_markets(100)
     except Exception as e:
         return {"error": f"获取市场数据失败: {e}", "actions": []}
     
-    markets_by_id = {m["id"]: m for m in markets}
+    markets_by_id = _add_held_markets({m["id"]: m for m in markets}, data)
+    execution = _get_backend()
+    actions = step_cycle(data, markets, markets_by_id, momentum_alerts=_trigger_alerts, execution=execution)
+    _save(data)
+    
+    return {"actions": actions, "balance": round(data["balance"], 2), "positions": len(data["positions"]),
+            "timings": {k: round(v, 2) for k, v in last_timings.items()}}
+
+
+def _get_backend():
+    if EXECUTION == "paper" and FILL_MODEL == "mid":
+        return None
+    from execution import get_backend
+    return get_backend(EXECUTION, FILL_MODEL)
+
+
+def sync_orders():
+    """Reconcile live order fills into the portfolio without running a full cycle.
+
+    Cheap (no market fetch, the order state is already polled in the
+    background), so the monitor can call it every few seconds.
+    """
+    with _portfolio_lock():
+        data = _load()
+        execution = _get_backend() if data.get("orders") else None
+        if execution is None or execution.immediate:
+            return []
+        now = datetime.now()
+        actions = _match_orders(data, execution, {}, now, now.isoformat(), _config())
+        _save(data)
+        return actions
+
+
+def _exit_levels(strategy, cfg):
+    """(take_profit, stop_loss) for a position's strategy (unknown ones use the fear levels)."""
+    strat = _strategy_for(strategy) or _strategy_for("fear")
+    return strat.exit_levels(strat.config(cfg))
+
+
+def _open_position(data, key, m, side, price, amount, strategy, score, ts):
+    shares = amount / price
+    data["balance"] -= amount
+    data["positions"][key] = pos = {
+        "market_id": m["id"], "question": m["question"], "side": side,
+        "shares": round(shares, 2), "avg_price": round(price, 4),
+        "bought_at": ts, "strategy": strategy, "score": score
+    }
+    data["history"].append({
+        "action": "buy", "market_id": m["id"], "question": m["question"], "side": side,
+        "price": price, "amount": amount, "shares": round(shares, 2),
+        "strategy": strategy, "time": ts
+    })
+    return pos
+
+
+def _pending_entries(data):
+    """Resting buy orders that don't have a position yet — they take a slot like one."""
+    return [o for k, o in data.get("orders", {}).items()
+            if o.get("action", "buy") == "buy" and k not in data["positions"]]
+
+
+def _open_count(data):
+    return len(data["positions"]) + len(_pending_entries(data))
+
+
+def _add_fill(data, key, order, shares, cost, ts):
+    """Merge a resting-order fill into its position (cash was locked when the order was placed)."""
+    price = cost / shares
+    pos = data["positions"].get(key)
+    if pos is None:
+        data["positions"][key] = pos = {
+            "market_id": order["market_id"], "question": order["question"], "side": order["side"],
+            "shares": round(shares, 2), "avg_price": round(price, 4),
+            "bought_at": ts, "strategy": order["strategy"], "score": order.get("score"),
+        }
+    else:
+        total = pos["shares"] + shares
+        pos["avg_price"] = round((pos["shares"] * pos["avg_price"] + cost) / total, 4)
+        pos["shares"] = round(total, 2)
+    data["history"].append({
+        "action": "buy", "market_id": order["market_id"], "question": order["question"], "side": order["side"],
+        "price": round(price, 4), "amount": round(cost, 2), "shares": round(shares, 2),
+        "strategy": order["strategy"], "fill": "limit", "time": ts
+    })
+    return pos
+
+
+def _execute_entry(data, execution, strat, key, m, side, price, amount, score, ts, now, index, cfg):
+    """Open via an execution backend; returns the action string, or None if nothing filled or rested.
+
+    Resting strategies (and every entry on an asynchronous backend) become
+    orders in data["orders"] with the whole amount locked until they finish;
+    the rest take the book immediately, at most MAX_SLIPPAGE worse than `price`.
+    """
+    head = f"{strat.emoji} {strat.label or strat.name} | {m['question'][:40]} | {side.upper()}"
+    taker = min(price * (1 + cfg.MAX_SLIPPAGE), 0.99)
+    if strat.resting or not execution.immediate:
+        limit, order_type = (price, "GTC") if strat.resting else (taker, "FAK")
+        order, fill = execution.limit_order(m, side, limit, amount, strategy=strat.name,
+                                            now=now.timestamp(), order_type=order_type, score=score)
+        if order is None:
+            return None
+        data["balance"] -= amount   # 挂单期间整笔现金锁住，结束时退回没用掉的部分
+        if fill["shares"]:
+            _add_fill(data, key, order, fill["shares"], fill["cost"], ts)
+        if not execution.done(order):
+            data.setdefault("orders", {})[key] = order
+        else:
+            data["balance"] += amount - order["cost"]
+        index.add(data["positions"].get(key) or order)
+        return (f"{head} {'限价' if strat.resting else '下单'} @ {limit*100:{strat.price_fmt}}¢ | ${amount:.0f}"
+                f" (成交 ${order['cost']:.0f})")
+    fill = execution.market_order(m, side, "buy", usd=amount, limit=taker)
+    if fill["shares"] < 0.01:
+        return None
+    index.add(_open_position(data, key, m, side, fill["avg_price"], fill["cost"], strat.name, score, ts))
+    return (f"{head} @ {fill['avg_price']*100:{strat.price_fmt}}¢ | ${fill['cost']:.0f}"
+            f" (滑点 {fill['slippage']*100:+.1f}%)")
+
+
+def _sell(data, key, pos, shares, price, reason, ts):
+    """Book a (partial) close of `pos`; returns the action string. The position is dropped once empty."""
+    strategy = pos.get("strategy", "fear")
+    proceeds = shares * price
+    profit = (price - pos["avg_price"]) * shares
+    data["balance"] += proceeds
+    data["history"].append({
+        "action": "sell", "market_id": pos["market_id"], "question": pos["question"], "side": pos["side"],
+        "price": price, "shares": shares, "proceeds": round(proceeds, 2),
+        "profit": round(profit, 2), "reason": reason, "strategy": strategy,
+        "time": ts
+    })
+    if pos["shares"] - shares >= 0.01:
+        pos["shares"] = round(pos["shares"] - shares, 2)
+    else:
+        data["positions"].pop(key, None)
+    strat = _strategy_for(strategy)
+    emoji = strat.emoji if strat else "📤"
+    return f"{emoji} 卖出 | {pos['question'][:40]} | {reason} | {'赚' if profit>0 else '亏'}${abs(profit):.2f}"
+
+
+def _match_orders(data, execution, markets_by_id, now, ts, cfg):
+    """Reconcile resting orders: book new fills, re-price stale buys, cancel expired, settle finished ones."""
+    actions = []
+    orders = data.get("orders", {})
+    now_ts = now.timestamp()
+    expired, stale = [], []
+    for key, order in list(orders.items()):
+        m = markets_by_id.get(order["market_id"])
+        fill = execution.match(order, m, now_ts)
+        if fill and fill["shares"]:
+            if order.get("action") == "sell":
+                pos = data["positions"].get(order["position"])
+                if pos is not None:
+                    actions.append(_sell(data, order["position"], pos, min(fill["shares"], pos["shares"]),
+                                         fill["avg_price"], order["reason"], ts))
+            else:
+                _add_fill(data, key, order, fill["shares"], fill["cost"], ts)
+                strat = _strategy_for(order["strategy"])
+                actions.append(f"{strat.emoji if strat else '📥'} 成交 | {order['question'][:40]} | "
+                               f"{order['side'].upper()} {fill['shares']:.0f} 股 @ {fill['avg_price']*100:.1f}¢")
+        if execution.done(order):
+            continue
+        if execution.expired(order, now_ts):
+            expired.append(order)
+        elif m is not None and order.get("action", "buy") == "buy" and order.get("order_type", "GTC") == "GTC":
+            # 行情走远了，旧限价基本不会成交 → 按策略的当前入场价改单
+            strat = _strategy_for(order["strategy"])
+            price = strat.entry_price(m, order["side"]) if strat else None
+            if price and abs(price - order["price"]) / order["price"] > cfg.REPRICE_DRIFT:
+                stale.append((order, price))
+    if expired:
+        execution.cancel(expired)
+    if stale:
+        execution.replace(stale)
+    for key, order in list(orders.items()):
+        if not execution.done(order):
+            continue
+        if order.get("action", "buy") == "buy":
+            data["balance"] += order["amount"] - order["cost"]
+            if order["cost"] < order["amount"] - 0.01:
+                actions.append(f"⏹️ 撤单 | {order['question'][:40]} | "
+                               f"已成交 ${order['cost']:.0f}/${order['amount']:.0f}")
+        del orders[key]
+        execution.finish(order)
+    return actions
+
+
+def step_cycle(data, markets, markets_by_id=None, now=None, cfg=None, momentum_alerts=None,
+               strategies=None, execution=None):
+    """Run exits and the registered entry strategies on an in-memory portfolio.
+
+    No file I/O: the live cycle wraps this with load/fetch/save, backtest.py
+    replays recorded snapshots through it. `now` stamps trades and dates the
+    expiry check; `momentum_alerts` is a list of price alerts or a callable
+    returning one (only called when there is room for new positions);
+    `strategies` defaults to get_strategies(). `execution` is an
+    execution_sim.ExecutionSimulator: entries and exits then fill against
+    order-book depth and resting limit orders live in data["orders"];
+    without it everything fills at the quoted price. Per-stage timings (ms) land in
+    last_timings and accumulate in timing_totals. Returns the action strings.
+    """
+    now = now or datetime.now()
+    ts = now.isoformat()
+    cfg = cfg or _config()
+    if markets_by_id is None:
+        markets_by_id = {m["id"]: m for m in markets}
+    actions = []
+    t0, classify0 = time.perf_counter(), _classify_ms
+    if execution is not None:
+        execution.begin_tick(now.timestamp(), markets)
+        actions += _match_orders(data, execution, markets_by_id, now, ts, cfg)
     
     # 2. 止盈止损检查
-    positions_to_close = []
     for key, pos in list(data["positions"].items()):
         m = markets_by_id.get(pos["market_id"])
         if not m:
@@ -399,14 +959,7 @@ def run_trading_cycle():
         pnl_pct = (current_price - pos["avg_price"]) / pos["avg_price"] if pos["avg_price"] > 0 else 0
         
         strategy = pos.get("strategy", "fear")
-        if strategy == "hp":
-            tp, sl = HP_TAKE_PROFIT, HP_STOP_LOSS
-        elif strategy == "ls":
-            tp, sl = LS_TAKE_PROFIT, LS_STOP_LOSS
-        elif strategy == "momentum":
-            tp, sl = MOM_TAKE_PROFIT, MOM_STOP_LOSS
-        else:
-            tp, sl = FEAR_TAKE_PROFIT, FEAR_STOP_LOSS
+        tp, sl = _exit_levels(strategy, cfg)
         
         reason = None
         if current_price <= 0.002 or current_price >= 0.98:
@@ -416,141 +969,52 @@ def run_trading_cycle():
         elif pnl_pct <= sl:
             reason = f"止损 {pnl_pct*100:.0f}%"
         
-        if reason:
-            proceeds = pos["shares"] * current_price
-            profit = (current_price - pos["avg_price"]) * pos["shares"]
-            data["balance"] += proceeds
-            data["history"].append({
-                "action": "sell", "question": pos["question"], "side": pos["side"],
-                "price": current_price, "shares": pos["shares"], "proceeds": round(proceeds, 2),
-                "profit": round(profit, 2), "reason": reason, "strategy": strategy,
-                "time": datetime.now().isoformat()
-            })
-            emoji = {"fear": "🛡️", "hp": "💎", "momentum": "⚡", "ls": "🎰"}.get(strategy, "📤")
-            actions.append(f"{emoji} 卖出 | {pos['question'][:40]} | {reason} | {'赚' if profit>0 else '亏'}${abs(profit):.2f}")
-            positions_to_close.append(key)
-    
-    for key in positions_to_close:
-        del data["positions"][key]
-    
-    num_positions = len(data["positions"])
-    
-    # 3. 策略1: 恐惧溢价 — 买NO
-    if num_positions < MAX_POSITIONS:
-        fear_trades = _find_fear_trades(markets, data)
-        for score, m in fear_trades[:2]:  # 每周期最多2个
-            amount = round(min(data["balance"] * FEAR_POSITION_PCT, data["balance"] - MIN_RESERVE), 2)
-            if amount < 30:
-                break
-            no_price = m["outcome_no"]
-            if no_price <= 0 or no_price >= 1:
-                continue
-            shares = amount / no_price
-            data["balance"] -= amount
-            key = f"fear_{m['id']}_no"
-            data["positions"][key] = {
-                "market_id": m["id"], "question": m["question"], "side": "no",
-                "shares": round(shares, 2), "avg_price": round(no_price, 4),
-                "bought_at": datetime.now().isoformat(), "strategy": "fear", "score": score
-            }
-            data["history"].append({
-                "action": "buy", "question": m["question"], "side": "no",
-                "price": no_price, "amount": amount, "shares": round(shares, 2),
-                "strategy": "fear", "time": datetime.now().isoformat()
-            })
-            actions.append(f"🛡️ 恐惧溢价 | {m['question'][:40]} | NO @ {no_price*100:.0f}¢ | ${amount:.0f}")
-            num_positions += 1
-    
-    # 4. 策略2: 高概率收割
-    if num_positions < MAX_POSITIONS:
-        hp_trades = _find_hp_trades(markets, data)
-        for score, m, side in hp_trades[:2]:
-            amount = round(min(data["balance"] * HP_POSITION_PCT, data["balance"] - MIN_RESERVE), 2)
-            if amount < 50:
-                break
-            price = m["outcome_yes"] if side == "yes" else m["outcome_no"]
-            if price <= 0 or price >= 1:
-                continue
-            shares = amount / price
-            data["balance"] -= amount
-            key = f"hp_{m['id']}_{side}"
-            data["positions"][key] = {
-                "market_id": m["id"], "question": m["question"], "side": side,
-                "shares": round(shares, 2), "avg_price": round(price, 4),
-                "bought_at": datetime.now().isoformat(), "strategy": "hp", "score": score
-            }
-            data["history"].append({
-                "action": "buy", "question": m["question"], "side": side,
-                "price": price, "amount": amount, "shares": round(shares, 2),
-                "strategy": "hp", "time": datetime.now().isoformat()
-            })
-            actions.append(f"💎 高概率 | {m['question'][:40]} | {side.upper()} @ {price*100:.0f}¢ | ${amount:.0f}")
-            num_positions += 1
-    
-    # 5. 策略3: 价格动量
-    if num_positions < MAX_POSITIONS:
-        mom_trades = _find_momentum_trades(markets, data)
-        for score, m, side in mom_trades[:2]:
-            amount = round(min(data["balance"] * MOM_POSITION_PCT, data["balance"] - MIN_RESERVE), 2)
-            if amount < 30:
-                break
-            price = m["outcome_yes"] if side == "yes" else m["outcome_no"]
-            if price <= 0 or price >= 1:
-                continue
-            shares = amount / price
-            data["balance"] -= amount
-            key = f"mom_{m['id']}_{side}"
-            data["positions"][key] = {
-                "market_id": m["id"], "question": m["question"], "side": side,
-                "shares": round(shares, 2), "avg_price": round(price, 4),
-                "bought_at": datetime.now().isoformat(), "strategy": "momentum", "score": score
-            }
-            data["history"].append({
-                "action": "buy", "question": m["question"], "side": side,
-                "price": price, "amount": amount, "shares": round(shares, 2),
-                "strategy": "momentum", "time": datetime.now().isoformat()
-            })
-            actions.append(f"⚡ 动量 | {m['question'][:40]} | {side.upper()} @ {price*100:.0f}¢ | ${amount:.0f}")
-            num_positions += 1
+        if not reason:
+            continue
+        if execution is None or reason.startswith("已结算"):
+            actions.append(_sell(data, key, pos, pos["shares"], current_price, reason, ts))
+        elif execution.immediate:
+            # 按买盘逐档卖；买盘不够深就只卖掉能成交的部分，剩下的下个周期再卖
+            fill = execution.market_order(m, pos["side"], "sell", shares=pos["shares"],
+                                          limit=current_price * (1 - cfg.MAX_SLIPPAGE))
+            if fill["shares"] >= 0.01:
+                actions.append(_sell(data, key, pos, fill["shares"], fill["avg_price"], reason, ts))
+        elif f"{key}:sell" not in data.setdefault("orders", {}):
+            # 异步 backend：挂卖单，成交在之后的 _match_orders 里记账
+            order = execution.sell_order(m, pos["side"], current_price * (1 - cfg.MAX_SLIPPAGE),
+                                         pos["shares"], now=now.timestamp(), order_type="FAK",
+                                         strategy=strategy, position=key, reason=reason)
+            if order is not None:
+                data["orders"][f"{key}:sell"] = order
+                actions.append(f"📤 卖单 | {pos['question'][:40]} | {reason} | {pos['shares']:.0f} 股")
     
-    # 6. 策略4: 低概率彩票
-    if num_positions < MAX_POSITIONS:
-        ls_trades = _find_longshot_trades(markets, data)
-        for score, m in ls_trades[:2]:
-            amount = round(min(LS_MAX_PER_TRADE, data["balance"] - MIN_RESERVE), 2)
-            if amount < 5:
-                break
-            yes_price = m["outcome_yes"]
-            limit_price = round(max(yes_price * 0.75, 0.001), 4)
-            shares = amount / limit_price
-            data["balance"] -= amount
-            key = f"ls_{m['id']}_yes"
-            data["positions"][key] = {
-                "market_id": m["id"], "question": m["question"], "side": "yes",
-                "shares": round(shares, 2), "avg_price": limit_price,
-                "bought_at": datetime.now().isoformat(), "strategy": "ls", "score": score
-            }
-            data["history"].append({
-                "action": "buy", "question": m["question"], "side": "yes",
-                "price": limit_price, "amount": amount, "shares": round(shares, 2),
-                "strategy": "ls", "time": datetime.now().isoformat()
-            })
-            actions.append(f"🎰 彩票 | {m['question'][:40]} | YES @ {limit_price*100:.1f}¢ | ${amount:.0f}")
-            num_positions += 1
+    timings = {"exits": (time.perf_counter() - t0) * 1000}
     
-    data["last_trade"] = datetime.now().isoformat()
-    _save(data)
+    # 3. 各策略扫描同一份持仓快照，再按注册顺序统一分配
+    index = PortfolioIndex(list(data["positions"].values()) + _pending_entries(data), cfg.MAX_TOPIC_POSITIONS)
+    if _open_count(data) < cfg.MAX_POSITIONS:
+        proposals, scan_ms = _scan_strategies(markets, data, index, cfg, now, momentum_alerts, strategies)
+        timings.update(scan_ms)
+        opened, timings["allocate"] = _timed(_allocate, data, proposals, index, cfg, ts, strategies, execution, now)
+        actions += opened
+    timings["classify"] = _classify_ms - classify0
     
-    return {"actions": actions, "balance": round(data["balance"], 2), "positions": len(data["positions"])}
+    last_timings.clear()
+    last_timings.update(timings)
+    timing_totals.update(timings)
+    data["last_trade"] = ts
+    return actions
 
 
-def generate_report():
-    data = _load()
+def generate_report(data=None):
+    """Portfolio report; pass `data` when the caller already loaded the portfolio."""
+    data = _load() if data is None else data
     try:
-        markets = get_trending_markets(100)
+        markets = get_markets(100)
         markets_by_id = {m["id"]: m for m in markets}
     except:
         markets_by_id = {}
+    markets_by_id = _add_held_markets(markets_by_id, data)
     
     total_value = data["balance"]
     pos_details = []
@@ -573,9 +1037,10 @@ def generate_report():
             "strategy": pos.get("strategy", "unknown"),
         })
     
+    orders = data.get("orders", {})
+    total_value += sum(o["amount"] - o["cost"] for o in orders.values())   # 挂单锁住的现金
     total_pnl = total_value - STARTING_BALANCE
-    now = datetime.now()
-    recent = [h for h in data["history"] if (now - datetime.fromisoformat(h["time"])).total_seconds() < 86400]
+    recent = data["history"].since(datetime.now() - timedelta(days=1))
     
     return {
         "balance": round(data["balance"], 2),
@@ -584,6 +1049,7 @@ def generate_report():
         "total_pnl_pct": round(total_pnl / STARTING_BALANCE * 100, 2),
         "positions": pos_details,
         "position_count": len(pos_details),
+        "open_orders": len(orders),
         "total_trades": len(data["history"]),
         "recent_trades_24h": len(recent),
         "recent_trades": recent[-5:],
@@ -592,24 +1058,12 @@ def generate_report():
 
 def generate_weekly_summary():
     data = _load()
-    report = generate_report()
-    
-    sells = [h for h in data["history"] if h["action"] == "sell"]
-    wins = sum(1 for s in sells if s.get("profit", 0) > 0)
-    losses = sum(1 for s in sells if s.get("profit", 0) < 0)
-    total_profit = sum(s.get("profit", 0) for s in sells)
+    report = generate_report(data)
     
-    # 按策略统计
-    strategy_stats = {}
-    for s in sells:
-        st = s.get("strategy", "unknown")
-        if st not in strategy_stats:
-            strategy_stats[st] = {"wins": 0, "losses": 0, "profit": 0}
-        if s.get("profit", 0) > 0:
-            strategy_stats[st]["wins"] += 1
-        else:
-            strategy_stats[st]["losses"] += 1
-        strategy_stats[st]["profit"] += s.get("profit", 0)
+    stats = data["history"].sell_summary()
+    wins, losses = stats["wins"], stats["losses"]
+    total_profit = stats["realized"]
+    strategy_stats = stats["by_strategy"]
     
     return {
         **report,
@@ -622,8 +1076,13 @@ def generate_weekly_summary():
 
 
 def take_daily_snapshot():
+    with _portfolio_lock():
+        _take_daily_snapshot()
+
+
+def _take_daily_snapshot():
     data = _load()
-    report = generate_report()
+    report = generate_report(data)
     if "daily_snapshots" not in data:
         data["daily_snapshots"] = []
     data["daily_snapshots"].append({
@@ -643,6 +1102,8 @@ if __name__ == "__main__":
     elif len(sys.argv) > 1 and sys.argv[1] == "weekly":
         r = generate_weekly_summary()
         print(json.dumps(r, indent=2, ensure_ascii=False))
+    elif len(sys.argv) > 1 and sys.argv[1] == "sync":
+        print(json.dumps(sync_orders(), indent=2, ensure_ascii=False))
     else:
         result = run_trading_cycle()
         print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -0,0 +1,241 @@
+"""Historical backtester — 用录下来的市场快照回放 auto_trader 的交易逻辑
+
+    python backtest.py run <snapshots> [--fills book] [--books books.jsonl.gz] [--out result.json]   # 回放
+    python backtest.py record [snapshots.jsonl] [--books]    # 录一帧当前市场（放 cron 里每分钟跑）
+
+快照格式和 news_scanner.save_snapshot 一样：{"time": iso, "markets": [...]}。
+<snapshots> 可以是 JSONL（每行一帧，可 .gz）或装着单帧 .json 文件的目录。
+
+每一帧走 auto_trader.step_cycle —— 和实盘同一套止盈止损 + 四个策略，
+组合全程在内存里（history 是普通 list），不读写 auto_portfolio.*。
+动量策略的警报由 movement.MoveDetector 按快照时间算出（和 price_monitor 同一套多周期规则和阈值）。
+--fills book 时开平仓按盘口深度成交（execution_sim）：有录下的盘口（record --books）就回放，
+没有就按每个市场的 liquidity 合成盘口。
+"""
+import glob, gzip, json, os, sys, time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+import auto_trader
+from movement import MoveDetector
+from trade_journal import summarize_sells
+
+DEFAULT_SNAPSHOTS = os.path.join(os.path.dirname(__file__), "snapshots.jsonl")
+
+
+def _open(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, encoding="utf-8")
+
+
+def load_snapshots(path):
+    """Yield snapshots in time order from a JSONL file or a directory of snapshot files."""
+    if os.path.isdir(path):
+        frames = []
+        for fn in glob.glob(os.path.join(path, "*.json")):
+            with open(fn, encoding="utf-8") as f:
+                frames.append(json.load(f))
+        frames.sort(key=lambda s: s["time"])
+        yield from frames
+        return
+    with _open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def append_snapshot(markets, path=DEFAULT_SNAPSHOTS, when=None):
+    """Append one {"time", "markets"} frame to a JSONL recording."""
+    frame = {"time": (when or datetime.now()).isoformat(), "markets": markets}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(frame, ensure_ascii=False) + "\n")
+
+
+def _detector_prices(markets):
+    return {m["id"]: {"yes": m["outcome_yes"], "volume_24h": m.get("volume_24h"), "question": m["question"]}
+            for m in markets}
+
+
+def price_alerts(detector, markets, when, held_ids=()):
+    """Feed one frame to the rolling detector at the frame's own time; returns its alerts."""
+    alerts = detector.observe(_detector_prices(markets), held_ids, ts=datetime.fromisoformat(when).timestamp())
+    for a in alerts:
+        a["time"] = when
+    return alerts
+
+
+class AlertTape:
+    """price_alerts() for a fixed sequence of frames, with the detector work done once.
+
+    The only run-dependent input is which markets are held, so every frame is
+    evaluated at both thresholds the first time through and later runs over
+    the same frames (sweep.py) just pick per market. Gives the same alerts
+    as price_alerts() with a fresh detector.
+    """
+
+    def __init__(self):
+        self.detector = MoveDetector()
+        self.frames = []    # [({market_id: held alert}, {market_id: trending alert})]
+
+    def alerts(self, k, markets, when, held_ids=()):
+        if k == len(self.frames):
+            ts = datetime.fromisoformat(when).timestamp()
+            self.frames.append(self.detector.observe_split(_detector_prices(markets), ts=ts))
+        held, trending = self.frames[k]
+        out = []
+        for m in markets:
+            a = (held if m["id"] in held_ids else trending).get(m["id"])
+            if a is not None:
+                out.append(dict(a, time=when))
+        return out
+
+
+def _mark_to_market(data, last_seen):
+    value = data["balance"] + sum(o["amount"] - o["cost"] for o in data.get("orders", {}).values())
+    for pos in data["positions"].values():
+        m = last_seen.get(pos["market_id"])
+        if m is None:
+            price = pos["avg_price"]
+        else:
+            price = m["outcome_yes"] if pos["side"] == "yes" else m["outcome_no"]
+        value += pos["shares"] * price
+    return value
+
+
+def _max_drawdown(values):
+    peak, worst = float("-inf"), 0.0
+    for v in values:
+        peak = max(peak, v)
+        if peak > 0:
+            worst = max(worst, (peak - v) / peak)
+    return worst
+
+
+def sharpe_ratio(equity):
+    """Annualised Sharpe of per-frame returns (24/7 market, zero risk-free rate)."""
+    if len(equity) < 3:
+        return 0.0
+    times = [datetime.fromisoformat(t).timestamp() for t, _ in equity]
+    gaps = sorted(b - a for a, b in zip(times, times[1:]))
+    step = gaps[len(gaps) // 2]
+    returns = [(b - a) / a for (_, a), (_, b) in zip(equity, equity[1:]) if a > 0]
+    if step <= 0 or len(returns) < 2:
+        return 0.0
+    mean = sum(returns) / len(returns)
+    var = sum((r - mean) ** 2 for r in returns) / (len(returns) - 1)
+    if var <= 0:
+        return 0.0
+    return mean / var ** 0.5 * (365 * 86400 / step) ** 0.5
+
+
+def run_backtest(snapshots, cfg=None, starting_balance=None, momentum=True, fills=None, books=None, tape=None):
+    """Replay snapshots through step_cycle. Returns equity curve + weekly-summary style stats.
+
+    fills: "mid" or "book" (default cfg.FILL_MODEL); books: recorded book file
+    to replay for "book" fills (synthetic books from liquidity otherwise).
+    tape: an AlertTape shared by runs over the same snapshots (momentum alerts).
+    """
+    cfg = cfg or auto_trader._config()
+    execution = None
+    if (fills or cfg.FILL_MODEL) == "book":
+        from execution_sim import ExecutionSimulator, BookReplay
+        execution = ExecutionSimulator(BookReplay(books) if books else None)
+    balance = cfg.STARTING_BALANCE if starting_balance is None else starting_balance
+    data = {"balance": balance, "positions": {}, "history": [], "last_trade": None}
+    last_seen = {}   # market_id -> 最近一帧里的 market；跌出列表的持仓按最后价格估值/平仓
+    detector = MoveDetector()   # 默认阈值同 price_monitor（持仓 5% / trending 8%）
+    equity = []
+    steps = 0
+    timings = Counter()   # 各阶段累计耗时（ms）
+    t0 = time.perf_counter()
+
+    for snap in snapshots:
+        when = snap["time"]
+        now = datetime.fromisoformat(when)
+        markets = snap["markets"]
+        held = {pos["market_id"] for pos in data["positions"].values()}
+        if not momentum:
+            alerts = None
+        elif tape is not None:
+            alerts = tape.alerts(steps, markets, when, held)
+        else:
+            alerts = price_alerts(detector, markets, when, held)
+        for m in markets:
+            last_seen[m["id"]] = m
+
+        auto_trader.step_cycle(data, markets, last_seen, now=now, cfg=cfg, momentum_alerts=alerts,
+                               execution=execution)
+        timings.update(auto_trader.last_timings)
+        equity.append((when, round(_mark_to_market(data, last_seen), 2)))
+        steps += 1
+
+    sells = [h for h in data["history"] if h["action"] == "sell"]
+    stats = summarize_sells(sells)
+    wins, losses = stats["wins"], stats["losses"]
+    final = equity[-1][1] if equity else balance
+    return {
+        "steps": steps,
+        "elapsed": round(time.perf_counter() - t0, 3),
+        "start": equity[0][0] if equity else None,
+        "end": equity[-1][0] if equity else None,
+        "starting_balance": balance,
+        "final_value": final,
+        "total_pnl": round(final - balance, 2),
+        "total_pnl_pct": round((final - balance) / balance * 100, 2) if balance else 0,
+        "max_drawdown_pct": round(_max_drawdown(v for _, v in equity) * 100, 2),
+        "sharpe": round(sharpe_ratio(equity), 3),
+        "trades": len(data["history"]),
+        "open_positions": len(data["positions"]),
+        "open_orders": len(data.get("orders", {})),
+        "wins": wins, "losses": losses,
+        "win_rate": round(wins/(wins+losses)*100, 1) if (wins+losses) > 0 else 0,
+        "realized_profit": round(stats["realized"], 2),
+        "strategy_stats": {k: {**v, "profit": round(v["profit"], 2)} for k, v in stats["by_strategy"].items()},
+        "timings_ms": {k: round(v, 1) for k, v in timings.most_common()},
+        "equity": equity,
+    }
+
+
+def _print_result(r):
+    print(f"📼 {r['steps']} frames  {r['start']} → {r['end']}  ({r['elapsed']}s)")
+    print(f"💰 ${r['starting_balance']:,.2f} → ${r['final_value']:,.2f}  "
+          f"({r['total_pnl']:+,.2f}, {r['total_pnl_pct']:+.2f}%)  "
+          f"maxDD {r['max_drawdown_pct']:.2f}%  Sharpe {r['sharpe']:.2f}")
+    print(f"📊 {r['trades']} trades | {r['wins']}W/{r['losses']}L ({r['win_rate']}%) | "
+          f"realized ${r['realized_profit']:+,.2f} | open {r['open_positions']}")
+    for name, st in sorted(r["strategy_stats"].items()):
+        strat = auto_trader._strategy_for(name)
+        print(f"  {strat.emoji if strat else '•'} {name:<9} {st['wins']}W/{st['losses']}L  ${st['profit']:+,.2f}")
+    total = sum(r["timings_ms"].values()) or 1
+    print("⏱️  " + "  ".join(f"{k} {v:.0f}ms ({v / total * 100:.0f}%)" for k, v in r["timings_ms"].items()))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "record":
+        from market_cache import get_markets
+        path = args[1] if len(args) > 1 and not args[1].startswith("--") else DEFAULT_SNAPSHOTS
+        markets = get_markets(100, refresh=True)
+        append_snapshot(markets, path)
+        print(f"recorded {len(markets)} markets → {path}")
+        if "--books" in args:
+            from execution_sim import BookCache, BOOK_FILE
+            cache = BookCache(record_to=BOOK_FILE)
+            cache.begin_tick()
+            books = cache.prefetch([t for m in markets for t in (m.get("clob_token_ids") or [])[:2]])
+            cache.close()
+            print(f"recorded {sum(1 for v in books.values() if v)} books → {BOOK_FILE}")
+    elif args and args[0] == "run":
+        path = args[1] if len(args) > 1 and not args[1].startswith("--") else DEFAULT_SNAPSHOTS
+        opt = lambda name: args[args.index(name) + 1] if name in args else None
+        result = run_backtest(load_snapshots(path), fills=opt("--fills"), books=opt("--books"))
+        _print_result(result)
+        if "--out" in args:
+            out = args[args.index("--out") + 1]
+            from atomic_io import atomic_write_json
+            atomic_write_json(out, result, indent=2)
+            print(f"saved → {out}")
+    else:
+        print("Usage: python backtest.py run <snapshots.jsonl|dir> [--fills mid|book] [--books file] [--out result.json]"
+              " | record [path] [--books]")
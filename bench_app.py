@@ -0,0 +1,137 @@
+"""Load test: dashboard API before / after the production serving mode
+
+    python bench_app.py [seconds] [concurrency]         # 起两个服务对比：dev（旧行为）vs serve
+    python bench_app.py --url http://host:8877 [seconds] [concurrency]   # 压一个已经在跑的服务
+
+自动模式把代码拷到临时目录里跑（不碰真实 portfolio.json），market_cache.json
+用 market_snapshot.json 预填，TTL 调大 —— 不需要网络。
+负载：浏览器式混合请求 —— 45% /api/markets、50% /api/portfolio（带上次的 ETag）、5% /api/buy；
+都带 Accept-Encoding: gzip。结束后核对成交笔数，确认并发买入没有丢单。
+"""
+import json, os, random, shutil, socket, subprocess, sys, tempfile, threading, time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MIX = (("markets", 0.45), ("portfolio", 0.50), ("buy", 0.05))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _sandbox():
+    """Copy the app into a temp dir with a pre-seeded market cache."""
+    d = tempfile.mkdtemp(prefix="bench_app_")
+    for name in os.listdir(HERE):
+        if name.endswith(".py") or name == "index.html":
+            shutil.copy(os.path.join(HERE, name), d)
+    with open(os.path.join(HERE, "market_snapshot.json")) as f:
+        markets = json.load(f)["markets"]
+    with open(os.path.join(d, "market_cache.json"), "w") as f:
+        json.dump({"markets": markets, "limit": 100, "fetched_at": time.time()}, f)
+    return d
+
+
+def _start(sandbox, args, env):
+    port = _free_port()
+    env = {**os.environ, "POLYCLAW_MARKET_TTL": "86400", **env}
+    proc = subprocess.Popen([sys.executable, "app.py", *args, str(port)], cwd=sandbox, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(url + "/api/portfolio", timeout=1)
+            return proc, url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"server {args} didn't start")
+
+
+def _worker(url, deadline, markets, out, seed):
+    rnd = random.Random(seed)
+    etag = None
+    with httpx.Client(base_url=url, timeout=30, headers={"Accept-Encoding": "gzip"}) as c:
+        while time.monotonic() < deadline:
+            r, kind = rnd.random(), None
+            for kind, p in MIX:
+                r -= p
+                if r < 0:
+                    break
+            t0 = time.perf_counter()
+            if kind == "markets":
+                resp = c.get("/api/markets")
+            elif kind == "portfolio":
+                resp = c.get("/api/portfolio", headers={"If-None-Match": etag} if etag else {})
+                etag = resp.headers.get("ETag", etag)
+            else:
+                m = rnd.choice(markets)
+                resp = c.post("/api/buy", json={"market_id": m["id"], "question": m["question"], "side": "yes",
+                                                "price": m["outcome_yes"], "amount": 1})
+            ms = (time.perf_counter() - t0) * 1000
+            ok = resp.status_code in (200, 304) and (kind != "buy" or resp.json().get("ok"))
+            out.append((kind, ms, ok, resp.status_code))
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run(url, seconds, concurrency):
+    markets = [m for m in httpx.get(url + "/api/markets").json() if 0 < m["outcome_yes"] < 1]
+    before = httpx.get(url + "/api/portfolio").json()["trade_count"]
+    out, deadline = [], time.monotonic() + seconds
+    threads = [threading.Thread(target=_worker, args=(url, deadline, markets, out, i)) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    buys = sum(1 for kind, _, ok, _ in out if kind == "buy" and ok)
+    after = httpx.get(url + "/api/portfolio").json()["trade_count"]
+    result = {"rps": len(out) / elapsed, "p50": _pct([ms for _, ms, _, _ in out], 0.5),
+              "p99": _pct([ms for _, ms, _, _ in out], 0.99), "errors": sum(1 for *_, ok, _ in out if not ok),
+              "not_modified": sum(1 for *_, code in out if code == 304), "buys": buys,
+              "lost": buys - (after - before)}
+    for kind, _ in MIX:
+        lat = [ms for k, ms, _, _ in out if k == kind]
+        result[kind] = {"n": len(lat), "p50": _pct(lat, 0.5), "p99": _pct(lat, 0.99)}
+    return result
+
+
+def _print(name, r):
+    print(f"{name:6} {r['rps']:8.0f} req/s   p50 {r['p50']:6.1f}ms   p99 {r['p99']:7.1f}ms   "
+          f"304s {r['not_modified']:5d}   errors {r['errors']}   buys {r['buys']} (lost {r['lost']})")
+    for kind, _ in MIX:
+        k = r[kind]
+        print(f"         {kind:9} n={k['n']:6d}  p50 {k['p50']:6.1f}ms  p99 {k['p99']:7.1f}ms")
+
+
+def main(argv):
+    url = None
+    if argv[:1] == ["--url"]:
+        url, argv = argv[1], argv[2:]
+    seconds = float(argv[0]) if argv else 10
+    concurrency = int(argv[1]) if len(argv) > 1 else 16
+    if url:
+        _print("target", run(url, seconds, concurrency))
+        return
+    print(f"{seconds:.0f}s × {concurrency} clients")
+    for name, args, env in (("dev", [], {"POLYCLAW_HTTP_CACHE": "0"}), ("serve", ["serve"], {})):
+        sandbox = _sandbox()
+        proc, url = _start(sandbox, args, env)
+        try:
+            _print(name, run(url, seconds, concurrency))
+        finally:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,71 @@
+"""Microbenchmark: compiled keyword classifier vs the old per-keyword substring scans
+
+    python bench_classifier.py [repeat]
+
+语料是 market_snapshot.json 里的问题；先校验新旧结果完全一致，再计时。
+"""
+import json, os, re, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+import auto_trader as at
+from news_scanner import SNAPSHOT_FILE
+
+
+# --- 旧实现（逐关键词 in 检查），只作对照 ---
+def naive_is_sports(q):
+    q_lower = q.lower()
+    for kw in at.SPORTS_SINGLE_GAME:
+        if kw in q_lower:
+            return True
+    return bool(re.search(r'win on 202\d-\d{2}-\d{2}', q_lower))
+
+
+def naive_fear(q):
+    q_lower = q.lower()
+    for category, keywords in at.FEAR_KEYWORDS.items():
+        for kw in keywords:
+            if kw in q_lower:
+                return category
+    return None
+
+
+def naive_topics(q):
+    q_lower = q.lower()
+    return frozenset(kw for kw in at.TOPIC_KEYWORDS if kw in q_lower)
+
+
+def naive_classify(q):
+    return naive_is_sports(q), naive_fear(q), naive_topics(q)
+
+
+def _time(fn, questions, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for q in questions:
+            fn(q)
+    return (time.perf_counter() - t0) / (repeat * len(questions)) * 1e6
+
+
+def main(repeat=200):
+    with open(SNAPSHOT_FILE) as f:
+        markets = json.load(f)["markets"]
+    questions = [m["question"] for m in markets]
+
+    mismatches = [q for q in questions if naive_classify(q) != at._classify(q)]
+    print(f"corpus: {len(questions)} questions | parity: {'OK' if not mismatches else mismatches}")
+
+    naive = _time(naive_classify, questions, repeat)
+    compiled = _time(at._classify, questions, repeat)
+    print(f"naive    {naive:8.2f} µs/question")
+    print(f"compiled {compiled:8.2f} µs/question  ({naive / compiled:.1f}x)")
+
+    # 每轮交易内按 market id 记忆：第二次起只是一次 dict 查找
+    at._class_cache.clear()
+    for m in markets:
+        at._market_class(m)
+    memo = _time(lambda m: at._market_class(m), markets, repeat)
+    print(f"memoised {memo:8.2f} µs/market")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
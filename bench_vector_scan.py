@@ -0,0 +1,91 @@
+"""Parity check + benchmark: vector_scan vs the per-market _find_*_trades scanners
+
+    python bench_vector_scan.py [sizes...]      # 默认 100 1000 10000 100000
+
+市场是用 market_snapshot.json 的问题合成的（价格/交易量随机），
+持仓取 auto_portfolio.json 的当前持仓。先校验两边候选列表（顺序、分数、方向）
+完全一致，再计时。两边都是冷启动、端到端：每次先清 _class_cache，
+计时包含 PortfolioIndex、MarketFrame 的构建和分类，取 REPEAT 次里最快的一次。
+"""
+import json, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+import auto_trader as at
+import vector_scan as vs
+from atomic_io import read_json
+from news_scanner import SNAPSHOT_FILE
+
+PRICES = [0.001, 0.005, 0.01, 0.02, 0.03, 0.05, 0.2, 0.35, 0.5, 0.65, 0.8, 0.88, 0.9, 0.92, 0.94, 0.96]
+# 快照里恐惧类问题太少，补几条让 fear 策略也有候选
+EXTRA_QUESTIONS = [
+    "US military action against Iran by June 30?", "Russia invasion of a NATO country in 2026?",
+    "US recession in 2026?", "Bitcoin crash below $50k?", "China blockade of Taiwan (military action)?",
+    "Nuclear weapon detonation in 2026?", "Will the Fed default on payments?",
+]
+VOLUMES = [10000, 50000, 50001, 100000, 200000, 200001, 300001, 500000, 500001, 2000000]
+REPEAT = 3
+
+
+def synth_markets(n, questions, seed=7):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        yes = rnd.choice(PRICES) if rnd.random() < 0.7 else round(rnd.random(), 3)
+        out.append({
+            "id": f"bench{i}", "question": rnd.choice(questions),
+            "outcome_yes": yes, "outcome_no": round(1 - yes, 4),
+            "volume_24h": float(rnd.choice(VOLUMES)), "liquidity": float(rnd.randint(0, 10**6)),
+        })
+    return out
+
+
+def _key(cands):
+    return [(c[0], c[1]["id"]) + tuple(c[2:]) for c in cands]
+
+
+def _scalar(markets, data, cfg):
+    at._class_cache.clear()
+    index = at.PortfolioIndex(data["positions"])
+    return [at._find_fear_trades(markets, data, index, cfg),
+            at._find_hp_trades(markets, data, index, cfg),
+            at._find_longshot_trades(markets, data, index, cfg)]
+
+
+def _vector(markets, data, cfg):
+    at._class_cache.clear()
+    index = at.PortfolioIndex(data["positions"])
+    frame = vs.MarketFrame(markets, index, at._market_class, at._check_expiry_days)
+    return [vs.fear_candidates(frame, cfg), vs.hp_candidates(frame, cfg), vs.longshot_candidates(frame, cfg)]
+
+
+def _best(fn, *args):
+    best = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return out, best
+
+
+def main(sizes):
+    with open(SNAPSHOT_FILE) as f:
+        questions = [m["question"] for m in json.load(f)["markets"]]
+    portfolio = read_json(at.PORTFOLIO_FILE, {"positions": {}})  # 只读，不触发 journal 迁移
+    questions += [p["question"] for p in portfolio["positions"].values()] + EXTRA_QUESTIONS
+    data = {"positions": portfolio["positions"]}
+    cfg = at._config()
+
+    for n in sizes:
+        markets = synth_markets(n, questions)
+        a, t_slow = _best(_scalar, markets, data, cfg)
+        b, t_fast = _best(_vector, markets, data, cfg)
+        for name, x, y in zip(("fear", "hp", "longshot"), a, b):
+            assert _key(x) == _key(y), f"{name} mismatch at n={n}"
+        print(f"n={n:>6} | scalar {t_slow*1000:8.1f}ms | vector {t_fast*1000:8.1f}ms | "
+              f"{t_slow/t_fast:4.1f}x | candidates {'/'.join(str(len(x)) for x in a)}")
+    print("parity: OK")
+
+
+if __name__ == "__main__":
+    main([int(x) for x in sys.argv[1:]] or [100, 1000, 10000, 100000])
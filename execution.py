@@ -0,0 +1,490 @@
+"""Execution backends — step_cycle 的下单出口
+
+    POLYCLAW_EXECUTION=paper  （默认）模拟盘：
+        FILL_MODEL=mid  按报价直接成交（backend 为 None，step_cycle 的内置逻辑）
+        FILL_MODEL=book 按 CLOB 盘口深度成交（execution_sim.ExecutionSimulator）
+    POLYCLAW_EXECUTION=live   ClobBackend：通过 py-clob-client 真实下单
+
+接口（ExecutionBackend，step_cycle 只用这些）：
+- immediate                 True = market_order 当场返回成交；False = 所有订单都异步，
+                            开仓/平仓都先变成 data["orders"] 里的挂单，成交在之后的 match() 回报
+- begin_tick(ts, markets)
+- market_order(m, side, action, usd=None, shares=None, limit=None) → fill（仅 immediate）
+- limit_order(m, side, price, usd, strategy, now, order_type, **extra) → (order, fill)
+- sell_order(m, side, price, shares, now, **extra) → order（仅非 immediate）
+- match(order, m, now)      → 这个订单自上次以来的新成交（可能为 None）
+- cancel(orders) / replace([(order, price)])   批量撤单 / 改价
+- done(order) / expired(order, now)
+
+订单是普通 dict（能直接存进 auto_portfolio.json）：
+market_id, question, side, action(buy|sell), price, amount(买单 USD), size(股数),
+filled / cost（已成交股数 / 金额）, reserved（买单还锁着的现金）, strategy, placed_at, expires_at。
+
+ClobBackend 的下单、撤单、查单都在后台线程里的 asyncio 循环里跑（OrderManager）：
+同一批提交合并成 /orders 批量请求并发发出，签名也并发；轮询任务定期查未完结订单的
+size_matched，交易周期下次运行时 match() 把增量成交对账进持仓。交易周期本身只是
+把命令放进队列，不等网络 —— monitor 循环不会被下单延迟卡住。
+订单状态另存 live_orders.json，进程重启后继续跟踪。
+凭证：POLYCLAW_PRIVATE_KEY（必需）、POLYCLAW_FUNDER、POLYCLAW_SIGNATURE_TYPE；
+POLYCLAW_CLOB_HOST 可以指向 mock_clob.py 起的本地假 CLOB。
+"""
+import asyncio, atexit, json, os, sys, threading, time, uuid
+
+sys.path.insert(0, os.path.dirname(__file__))
+from atomic_io import atomic_write_json
+
+EXECUTION = os.environ.get("POLYCLAW_EXECUTION", "paper")   # paper | live
+CLOB_HOST = os.environ.get("POLYCLAW_CLOB_HOST", "https://clob.polymarket.com")
+CHAIN_ID = 137
+LIVE_ORDERS_FILE = os.path.join(os.path.dirname(__file__), "live_orders.json")
+ORDER_TTL = 24 * 3600
+POLL_INTERVAL = 2.0         # 秒：查未完结订单状态的间隔
+BATCH_WINDOW = 0.05         # 秒：这段时间内到的命令合并成一批
+POST_BATCH = 15             # /orders 一次最多 15 单
+MAX_INFLIGHT = 8            # 同时在飞的 HTTP 请求
+FINAL = {"MATCHED", "CANCELED", "CANCELED_MARKET_RESOLVED", "INVALID", "REJECTED"}
+
+NO_FILL = {"shares": 0.0, "cost": 0.0, "avg_price": None, "slippage": 0.0, "levels": 0, "unfilled": 0.0}
+
+
+class ExecutionBackend:
+    immediate = True
+
+    def begin_tick(self, ts=None, markets=None):
+        pass
+
+    def market_order(self, m, side, action, usd=None, shares=None, limit=None):
+        raise NotImplementedError
+
+    def limit_order(self, m, side, price, usd, strategy=None, now=None, order_type="GTC", **extra):
+        raise NotImplementedError
+
+    def sell_order(self, m, side, price, shares, now=None, **extra):
+        raise NotImplementedError
+
+    def match(self, order, m, now=None):
+        return None
+
+    def cancel(self, orders):
+        raise NotImplementedError
+
+    def replace(self, pairs):
+        raise NotImplementedError
+
+    def done(self, order):
+        raise NotImplementedError
+
+    def finish(self, order):
+        """Called once a done order has been settled into the portfolio."""
+
+    @staticmethod
+    def expired(order, now=None):
+        return (time.time() if now is None else now) >= order["expires_at"]
+
+
+def _token(m, side):
+    tokens = m.get("clob_token_ids") or []
+    if len(tokens) >= 2:
+        return str(tokens[0] if side == "yes" else tokens[1])
+    return None
+
+
+def _on_tick(price, tick, up):
+    """Snap a price onto the tick grid (buys round down, sells up) inside (0, 1)."""
+    n = price / tick
+    n = int(n + 1e-9) if not up else -int(-n + 1e-9)
+    return round(min(max(n * tick, tick), 1 - tick), 6)
+
+
+# ============================================================
+# 后台订单管理
+# ============================================================
+class OrderManager:
+    """Owns live order state; all network I/O runs on a private asyncio loop in a daemon thread.
+
+    Public methods are thread-safe and never wait on the network (except
+    flush/close). Records: client_id -> {token_id, side, price, size,
+    order_type, expires_at, order_id, status, size_matched, cost_matched, error}.
+    """
+
+    def __init__(self, client, path=LIVE_ORDERS_FILE, poll_interval=POLL_INTERVAL):
+        self.client = client
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self.orders = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.orders = json.load(f)
+        self._pending = 0           # 已入队还没处理完的命令数
+        self._idle = threading.Condition(self._lock)
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="clob-orders", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        atexit.register(self.close)
+
+    # ---------- 线程安全的调用方接口 ----------
+    def submit(self, client_id, token_id, side, price, size, order_type="GTC", expires_at=None):
+        with self._lock:
+            self.orders[client_id] = {
+                "token_id": token_id, "side": side, "price": price, "size": size,
+                "order_type": order_type, "expires_at": expires_at, "order_id": None,
+                "status": "PENDING", "size_matched": 0.0, "cost_matched": 0.0, "base_matched": 0.0,
+                "base_cost": 0.0, "error": None,
+            }
+        self._send(("post", client_id))
+
+    def cancel(self, client_ids):
+        if client_ids:
+            self._send(("cancel", list(client_ids)))
+
+    def replace(self, changes):
+        """[(client_id, price, size)] — cancel and re-post at the new price as one batch.
+
+        Only re-posted once the cancel is confirmed; until then the order stays
+        `replacing` and the poller retries the swap.
+        """
+        if changes:
+            with self._lock:
+                for cid, _, _ in changes:   # 撤旧挂新之间不算完结
+                    if cid in self.orders:
+                        self.orders[cid]["replacing"] = True
+            self._send(("replace", list(changes)))
+
+    def get(self, client_id):
+        with self._lock:
+            rec = self.orders.get(client_id)
+            return dict(rec) if rec else None
+
+    def forget(self, client_ids):
+        with self._lock:
+            for cid in client_ids:
+                self.orders.pop(cid, None)
+        self._persist()
+
+    def flush(self, timeout=10):
+        """Wait until every queued command has been sent (not until orders fill)."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._idle.wait(left)
+        return True
+
+    def close(self, timeout=10):
+        if not self._thread.is_alive():
+            return
+        self.flush(timeout)
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join(timeout)
+
+    def _send(self, cmd):
+        with self._lock:
+            self._pending += 1
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, cmd)
+
+    def _persist(self):
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = {cid: dict(rec) for cid, rec in self.orders.items()}
+        atomic_write_json(self.path, snapshot, separators=(",", ":"))
+
+    # ---------- 事件循环 ----------
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._stop = asyncio.Event()
+        self._sem = asyncio.Semaphore(MAX_INFLIGHT)
+        self._ready.set()
+        self._loop.run_until_complete(self._main())
+
+    async def _main(self):
+        tasks = [asyncio.create_task(self._dispatcher()), asyncio.create_task(self._poller())]
+        await self._stop.wait()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _io(self, fn, *args):
+        async with self._sem:
+            return await asyncio.to_thread(fn, *args)
+
+    async def _dispatcher(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(BATCH_WINDOW)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            posts, cancels, replaces = [], [], []
+            for kind, arg in batch:
+                if kind == "post":
+                    posts.append(arg)
+                elif kind == "cancel":
+                    cancels += arg
+                else:
+                    replaces += arg
+            try:
+                await self._process(posts, cancels, replaces)
+            except Exception as e:
+                with self._lock:
+                    for cid in posts:
+                        self.orders[cid].update(status="REJECTED", error=str(e))
+            finally:
+                self._persist()
+                with self._idle:
+                    self._pending -= len(batch)
+                    self._idle.notify_all()
+
+    async def _process(self, posts, cancels, replaces):
+        # 改价 = 先撤（和普通撤单同一批），确认撤掉了才按新价重新挂
+        replaces = {cid: (price, size) for cid, price, size in replaces}   # 同一单改了几次取最后一次
+        cancel_ids = list(dict.fromkeys(cancels + list(replaces)))
+        if cancel_ids:
+            await self._cancel(cancel_ids)
+        repost = []
+        for cid, (price, size) in replaces.items():
+            with self._lock:
+                rec = self.orders.get(cid)
+                if rec is None or rec["status"] == "MATCHED":
+                    if rec:
+                        rec.update(replacing=False, replace_to=None)
+                    continue
+                if rec["status"] not in FINAL:
+                    # 撤单失败或没确认：旧单可能还挂着，不能再挂一张；留给 _poller 下一轮重试
+                    rec["replace_to"] = [price, size]
+                    continue
+                # 旧单的成交留作基数，新单的 size_matched 叠加在上面
+                rec.update(base_matched=rec["size_matched"], base_cost=rec["cost_matched"],
+                           price=price, size=size, order_id=None, status="PENDING",
+                           replacing=False, replace_to=None)
+            repost.append(cid)
+        with self._lock:   # 同一批里 submit 完又撤了的单，_cancel 已经作废，不能再发
+            posts = [cid for cid in posts if cid in self.orders and self.orders[cid]["status"] == "PENDING"]
+        ids = posts + repost
+        await asyncio.gather(*(self._post(ids[i:i + POST_BATCH]) for i in range(0, len(ids), POST_BATCH)))
+
+    def _sign(self, rec):
+        from py_clob_client.clob_types import OrderArgs, PartialCreateOrderOptions
+        tick = float(self.client.get_tick_size(rec["token_id"]))
+        price = _on_tick(rec["price"], tick, up=rec["side"] == "SELL")
+        args = OrderArgs(token_id=rec["token_id"], price=price, size=round(rec["size"], 2), side=rec["side"])
+        return price, self.client.create_order(args, PartialCreateOrderOptions(tick_size=str(tick)))
+
+    async def _post(self, cids):
+        from py_clob_client.clob_types import PostOrdersArgs
+        with self._lock:
+            cids = [cid for cid in cids if cid in self.orders and self.orders[cid]["status"] == "PENDING"]
+            recs = [dict(self.orders[cid]) for cid in cids]
+        if not cids:
+            return
+        signed = await asyncio.gather(*(self._io(self._sign, rec) for rec in recs), return_exceptions=True)
+        ok = [(cid, s) for cid, s in zip(cids, signed) if not isinstance(s, Exception)]
+        with self._lock:
+            for cid, s in zip(cids, signed):
+                if isinstance(s, Exception):
+                    self.orders[cid].update(status="REJECTED", error=str(s))
+        if not ok:
+            return
+        types = {cid: rec["order_type"] for cid, rec in zip(cids, recs)}
+        args = [PostOrdersArgs(order=s[1], orderType=types[cid]) for cid, s in ok]
+        try:
+            resp = await self._io(self.client.post_orders, args)
+        except Exception as e:
+            resp = [{"success": False, "errorMsg": str(e)}] * len(ok)
+        recancel = []
+        with self._lock:
+            for (cid, (price, _)), r in zip(ok, resp):
+                rec = self.orders.get(cid)
+                if rec is None:
+                    continue
+                canceled = rec["status"] != "PENDING"   # 发送途中被撤了
+                if r.get("success") and r.get("orderID"):
+                    rec.update(order_id=r["orderID"], price=price, status=(r.get("status") or "LIVE").upper())
+                    self._apply_amounts(rec, r)
+                    if canceled and rec["status"] not in FINAL:
+                        recancel.append(cid)   # 已经挂上了：记下 order_id 再撤一次
+                elif canceled:
+                    continue
+                else:
+                    rec.update(status="REJECTED", error=r.get("errorMsg") or "rejected")
+        if recancel:
+            self._send(("cancel", recancel))
+
+    @staticmethod
+    def _apply_amounts(rec, r):
+        """Immediate match reported in the post response (making/taking amounts are in USDC/shares)."""
+        making, taking = float(r.get("makingAmount") or 0), float(r.get("takingAmount") or 0)
+        if not (making and taking):
+            return
+        shares, usd = (taking, making) if rec["side"] == "BUY" else (making, taking)
+        rec["size_matched"] = max(rec["size_matched"], rec["base_matched"] + shares)
+        rec["cost_matched"] = max(rec["cost_matched"], rec["base_cost"] + usd)
+
+    async def _cancel(self, cids):
+        with self._lock:
+            ids = {self.orders[cid]["order_id"]: cid for cid in cids
+                   if cid in self.orders and self.orders[cid]["order_id"]
+                   and self.orders[cid]["status"] not in FINAL}
+            for cid in cids:   # 还没发出去的直接作废
+                rec = self.orders.get(cid)
+                if rec and not rec["order_id"] and rec["status"] == "PENDING":
+                    rec["status"] = "CANCELED"
+        if not ids:
+            return
+        try:
+            resp = await self._io(self.client.cancel_orders, list(ids))
+        except Exception:
+            return   # 下一轮 poll 会看到真实状态，调用方还会再撤
+        await self._refresh(list(ids.values()))   # 撤单前可能又成交了一点，以交易所为准
+        with self._lock:
+            for oid in resp.get("canceled", []) if isinstance(resp, dict) else []:
+                rec = self.orders.get(ids.get(oid))
+                if rec and rec["status"] not in FINAL:
+                    rec["status"] = "CANCELED"
+
+    async def _refresh(self, cids):
+        with self._lock:
+            todo = [(cid, self.orders[cid]["order_id"]) for cid in cids
+                    if cid in self.orders and self.orders[cid]["order_id"]]
+        results = await asyncio.gather(*(self._io(self.client.get_order, oid) for _, oid in todo),
+                                       return_exceptions=True)
+        changed = False
+        with self._lock:
+            for (cid, _), r in zip(todo, results):
+                if isinstance(r, Exception) or not r:
+                    continue
+                rec = self.orders[cid]
+                matched = rec["base_matched"] + float(r.get("size_matched") or 0)
+                price = float(r.get("price") or rec["price"])
+                if matched > rec["size_matched"] + 1e-9:
+                    rec["cost_matched"] += (matched - rec["size_matched"]) * price
+                    rec["size_matched"] = matched
+                    changed = True
+                status = (r.get("status") or rec["status"]).upper()
+                if status != rec["status"]:
+                    rec["status"] = status
+                    changed = True
+        return changed
+
+    async def _poller(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            with self._lock:
+                live = [cid for cid, rec in self.orders.items()
+                        if rec["order_id"] and rec["status"] not in FINAL]
+            if live and await self._refresh(live):
+                self._persist()
+            with self._lock:
+                retry = [(cid, *rec["replace_to"]) for cid, rec in self.orders.items() if rec.get("replace_to")]
+            if retry:
+                self._send(("replace", retry))
+
+
+# ============================================================
+# 实盘 backend
+# ============================================================
+class ClobBackend(ExecutionBackend):
+    """Live orders through py-clob-client; fills come back asynchronously via match()."""
+
+    immediate = False
+
+    def __init__(self, client, manager=None, ttl=ORDER_TTL):
+        self.client = client
+        self.manager = manager or OrderManager(client)
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls, host=None, **kw):
+        from py_clob_client.client import ClobClient
+        key = os.environ.get("POLYCLAW_PRIVATE_KEY")
+        if not key:
+            raise RuntimeError("live execution needs POLYCLAW_PRIVATE_KEY")
+        sig_type = os.environ.get("POLYCLAW_SIGNATURE_TYPE")
+        client = ClobClient(host or CLOB_HOST, chain_id=CHAIN_ID, key=key,
+                            signature_type=int(sig_type) if sig_type else None,
+                            funder=os.environ.get("POLYCLAW_FUNDER"))
+        client.set_api_creds(client.create_or_derive_api_creds())
+        return cls(client, **kw)
+
+    def _order(self, m, side, action, price, size, amount, strategy, now, order_type, extra):
+        token = _token(m, side)
+        if token is None:
+            return None
+        now = time.time() if now is None else now
+        cid = uuid.uuid4().hex
+        order = {
+            "client_id": cid, "market_id": m["id"], "question": m["question"], "side": side,
+            "token_id": token, "action": action, "price": price, "amount": amount, "size": size,
+            "filled": 0.0, "cost": 0.0, "reserved": amount if action == "buy" else 0.0,
+            "strategy": strategy, "order_type": order_type,
+            "placed_at": now, "expires_at": now + self.ttl, **extra,
+        }
+        self.manager.submit(cid, token, action.upper(), price, size, order_type, order["expires_at"])
+        return order
+
+    def limit_order(self, m, side, price, usd, strategy=None, now=None, order_type="GTC", **extra):
+        order = self._order(m, side, "buy", price, round(usd / price, 2), usd, strategy, now, order_type, extra)
+        return order, dict(NO_FILL)
+
+    def sell_order(self, m, side, price, shares, now=None, order_type="GTC", **extra):
+        return self._order(m, side, "sell", price, shares, 0.0, extra.pop("strategy", None),
+                           now, order_type, extra)
+
+    def match(self, order, m=None, now=None):
+        rec = self.manager.get(order["client_id"])
+        if rec is None:
+            return None
+        shares = rec["size_matched"] - order["filled"]
+        if shares < 0.01:
+            return None
+        cost = rec["cost_matched"] - order["cost"]
+        order["filled"], order["cost"] = rec["size_matched"], rec["cost_matched"]
+        if order["action"] == "buy":
+            order["reserved"] = max(order["amount"] - order["cost"], 0.0)
+        return {**NO_FILL, "shares": shares, "cost": cost, "avg_price": cost / shares}
+
+    def done(self, order):
+        rec = self.manager.get(order["client_id"])
+        if rec is None:
+            return True
+        return (rec["status"] in FINAL and not rec.get("replacing")
+                and order["filled"] >= rec["size_matched"] - 0.01)
+
+    def cancel(self, orders):
+        self.manager.cancel([o["client_id"] for o in orders])
+
+    def replace(self, pairs):
+        changes = []
+        for order, price in pairs:
+            size = round((order["amount"] - order["cost"]) / price, 2)
+            order["price"] = price
+            changes.append((order["client_id"], price, size))
+        self.manager.replace(changes)
+
+    def finish(self, order):
+        """Drop a reconciled order from the manager's state file."""
+        self.manager.forget([order["client_id"]])
+
+
+_live = None
+
+
+def get_backend(name=None, fills="mid"):
+    """Backend for run_trading_cycle: None (quote fills), an ExecutionSimulator, or the shared ClobBackend."""
+    global _live
+    name = name or EXECUTION
+    if name == "live":
+        if _live is None:
+            _live = ClobBackend.from_env()
+        return _live
+    if name != "paper":
+        raise ValueError(f"unknown execution backend {name!r} (paper | live)")
+    if fills == "book":
+        from execution_sim import ExecutionSimulator, BookCache
+        return ExecutionSimulator(BookCache())
+    return None
@@ -0,0 +1,363 @@
+"""Execution simulator — 按 CLOB 盘口深度成交，而不是按中间价
+
+以前 run_trading_cycle / paper_trading 任何金额都按 outcome_yes/outcome_no 瞬间成交，
+薄市场上 12% 的 fear 仓位 P&L 被严重高估。这里：
+
+- OrderBook       一个 token 的盘口（bids 从高到低、asks 从低到高，[(price, size)]）
+                  walk() 逐档吃单，算成交均价（VWAP）、相对盘口中间价的滑点、没成交的部分
+- BookCache       每个 tick 一份盘口快照：用 py-clob-client 批量拉（一次请求拿所有 token），
+                  同一 tick 里多笔模拟订单共用；可以顺手录到 books.jsonl(.gz) 给回测用
+- BookReplay      回放录下来的盘口（接口和 BookCache 一样）
+- ExecutionSimulator
+    market_order  吃单（FAK：吃到限价为止，剩下的取消）
+    limit_order   限价单：能成交的部分立刻成交，剩下的挂着（GTC），之后每个 tick
+                  对面盘口穿过限价时继续部分成交，过期自动撤
+  同一 tick 里被前面订单吃掉的档位会记下来，后面的订单不会重复吃同一份流动性。
+
+没有真实盘口（回测快照、没 token id 的市场）时用 synthetic_book()：
+以中间价为中心、按市场的 liquidity 把深度平均摊到 DEPTH_LEVELS 档上 —— 粗略，但
+流动性越薄滑点越大，这正是中间价成交模型缺的东西。
+挂单只在对面盘口穿过限价时成交（不估计排队位置），偏保守。
+"""
+import gzip, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from execution import ExecutionBackend, _token
+
+CLOB_HOST = "https://clob.polymarket.com"
+BOOK_FILE = os.path.join(os.path.dirname(__file__), "books.jsonl.gz")
+BOOK_BATCH = 100            # 每次 get_order_books 请求的 token 数
+DEPTH_LEVELS = 10           # 合成盘口每边的档数
+ORDER_TTL = 24 * 3600       # 挂单默认有效期（秒）
+MIN_SHARES = 0.01
+
+
+def _tick_size(price):
+    return 0.001 if price < 0.04 or price > 0.96 else 0.01
+
+
+def _levels(rows, reverse):
+    out = []
+    for row in rows:
+        if isinstance(row, dict):
+            price, size = row["price"], row["size"]
+        elif hasattr(row, "price"):
+            price, size = row.price, row.size
+        else:
+            price, size = row
+        price, size = float(price), float(size)
+        if size > 0:
+            out.append((price, size))
+    out.sort(reverse=reverse)
+    return out
+
+
+class OrderBook:
+    __slots__ = ("bids", "asks", "ts")
+
+    def __init__(self, bids=(), asks=(), ts=None):
+        self.bids = _levels(bids, reverse=True)    # 最高买价在前
+        self.asks = _levels(asks, reverse=False)   # 最低卖价在前
+        self.ts = ts
+
+    @classmethod
+    def from_summary(cls, book):
+        """From a py-clob-client OrderBookSummary, a raw /book JSON dict or our recorded form."""
+        if isinstance(book, dict):
+            return cls(book.get("bids", ()), book.get("asks", ()), book.get("timestamp"))
+        return cls(book.bids or (), book.asks or (), getattr(book, "timestamp", None))
+
+    def to_json(self):
+        return {"bids": [list(l) for l in self.bids], "asks": [list(l) for l in self.asks]}
+
+    @property
+    def best_bid(self):
+        return self.bids[0][0] if self.bids else None
+
+    @property
+    def best_ask(self):
+        return self.asks[0][0] if self.asks else None
+
+    @property
+    def mid(self):
+        if self.bids and self.asks:
+            return (self.bids[0][0] + self.asks[0][0]) / 2
+        return self.best_bid if self.bids else self.best_ask
+
+    def depth(self, action, limit=None):
+        """USD available on the side a `buy`/`sell` would take, up to `limit`."""
+        levels = self.asks if action == "buy" else self.bids
+        return sum(p * s for p, s in levels if limit is None or _crosses(action, p, limit))
+
+    def walk(self, action, usd=None, shares=None, limit=None, taken=None):
+        """Fill a `buy` (against asks) or `sell` (against bids) level by level.
+
+        Size is either `usd` to spend or `shares`; `limit` caps the worst price
+        taken. `taken` ({price: shares}) is liquidity already used this tick and
+        gets updated. Returns {"shares", "cost", "avg_price", "slippage",
+        "levels", "unfilled"}: slippage is VWAP vs mid as a fraction (positive =
+        worse than mid), unfilled is in the same unit as the request.
+        """
+        levels = self.asks if action == "buy" else self.bids
+        want = usd if usd is not None else shares
+        filled_shares = cost = 0.0
+        used = 0
+        for price, size in levels:
+            if want <= 1e-9 or (limit is not None and not _crosses(action, price, limit)):
+                break
+            if taken is not None:
+                size -= taken.get(price, 0.0)
+                if size <= 1e-9:
+                    continue
+            n = min(size, want / price) if usd is not None else min(size, want)
+            filled_shares += n
+            cost += n * price
+            want -= n * price if usd is not None else n
+            used += 1
+            if taken is not None:
+                taken[price] = taken.get(price, 0.0) + n
+        avg = cost / filled_shares if filled_shares else None
+        mid = self.mid
+        slippage = 0.0
+        if avg is not None and mid:
+            slippage = (avg - mid) / mid if action == "buy" else (mid - avg) / mid
+        return {"shares": filled_shares, "cost": cost, "avg_price": avg,
+                "slippage": slippage, "levels": used, "unfilled": max(want, 0.0)}
+
+
+def _crosses(action, price, limit):
+    return price <= limit + 1e-9 if action == "buy" else price >= limit - 1e-9
+
+
+def synthetic_book(price, liquidity, levels=DEPTH_LEVELS):
+    """Book centred on `price` with `liquidity` USD spread evenly over `levels` ticks a side."""
+    tick = _tick_size(price)
+    per_level = max(liquidity or 0, 0) / (2 * levels)
+    bids, asks = [], []
+    for k in range(levels):
+        bid = round(price - tick / 2 - k * tick, 4)
+        ask = round(price + tick / 2 + k * tick, 4)
+        if bid > 0:
+            bids.append((bid, per_level / bid))
+        if ask < 1:
+            asks.append((ask, per_level / ask))
+    return OrderBook(bids, asks)
+
+
+# ============================================================
+# 盘口来源
+# ============================================================
+class BookCache:
+    """Live books from the CLOB, fetched at most once per token per tick."""
+
+    def __init__(self, client=None, host=CLOB_HOST, record_to=None):
+        self._client = client
+        self.host = host
+        self.record_to = record_to
+        self.books = {}     # token_id -> OrderBook（当前 tick）
+        self.ts = None
+        self.fetches = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from py_clob_client.client import ClobClient   # 只读接口不需要私钥
+            self._client = ClobClient(self.host)
+        return self._client
+
+    def begin_tick(self, ts=None):
+        if self.record_to and self.books:
+            self._record()
+        self.books = {}
+        self.ts = time.time() if ts is None else ts
+
+    def prefetch(self, token_ids):
+        """Batch-fetch every token not cached this tick (one request per BOOK_BATCH)."""
+        from py_clob_client.clob_types import BookParams
+        token_ids = [str(t) for t in token_ids]
+        missing = [t for t in dict.fromkeys(token_ids) if t not in self.books]
+        for i in range(0, len(missing), BOOK_BATCH):
+            chunk = missing[i:i + BOOK_BATCH]
+            try:
+                summaries = self.client.get_order_books([BookParams(token_id=t) for t in chunk])
+            except Exception:
+                continue   # 拉不到就让调用方退回合成盘口
+            self.fetches += 1
+            for s in summaries:
+                self.books[str(s.asset_id)] = OrderBook.from_summary(s)
+        for t in missing:
+            self.books.setdefault(t, None)   # 这个 tick 不再重试
+        return {t: self.books.get(t) for t in token_ids}
+
+    def get(self, token_id):
+        token_id = str(token_id)
+        if token_id not in self.books:
+            self.prefetch([token_id])
+        return self.books.get(token_id)
+
+    def _record(self):
+        opener = gzip.open if self.record_to.endswith(".gz") else open
+        line = json.dumps({"time": self.ts, "books": {t: b.to_json() for t, b in self.books.items() if b}},
+                          separators=(",", ":"))
+        with opener(self.record_to, "at", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def close(self):
+        if self.record_to and self.books:
+            self._record()
+            self.books = {}
+
+
+class BookReplay:
+    """Recorded books (BookCache(record_to=...)) played back by time, same interface as BookCache."""
+
+    def __init__(self, path=BOOK_FILE):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            self.frames = [json.loads(line) for line in f if line.strip()]
+        self.frames.sort(key=lambda fr: fr["time"])
+        self._pos = -1
+        self.books = {}
+
+    def begin_tick(self, ts=None):
+        """Move to the latest recorded frame at or before ts (epoch seconds)."""
+        pos = self._pos
+        while pos + 1 < len(self.frames) and (ts is None or self.frames[pos + 1]["time"] <= ts):
+            pos += 1
+            if ts is None:
+                break
+        if pos != self._pos:
+            self._pos = pos
+            self.books = {t: OrderBook.from_summary(b) for t, b in self.frames[pos]["books"].items()}
+
+    def prefetch(self, token_ids):
+        return {str(t): self.books.get(str(t)) for t in token_ids}
+
+    def get(self, token_id):
+        return self.books.get(str(token_id))
+
+
+# ============================================================
+# 模拟成交
+# ============================================================
+class ExecutionSimulator(ExecutionBackend):
+    """Fills orders against per-tick books; liquidity taken this tick is shared across orders.
+
+    books: a BookCache / BookReplay, or None to always use synthetic_book().
+    Resting orders are plain dicts (JSON-safe) owned by the caller — e.g.
+    auto_trader keeps them in data["orders"] — so they survive restarts.
+    """
+
+    def __init__(self, books=None, synthetic=True):
+        self.books = books
+        self.synthetic = synthetic
+        self._taken = {}    # (book key, action) -> {price: shares}
+        self._synth = {}    # key -> (price, liquidity, OrderBook)；价格没变就跨 tick 复用
+
+    def begin_tick(self, ts=None, markets=None):
+        """New tick: drop consumed liquidity and (if live) batch-fetch books for `markets`."""
+        self._taken = {}
+        if self.books is not None:
+            self.books.begin_tick(ts)
+            if markets:
+                tokens = [t for m in markets for t in (m.get("clob_token_ids") or [])[:2]]
+                if tokens:
+                    self.books.prefetch(tokens)
+
+    def book(self, m, side):
+        """(key, OrderBook) for one outcome of a market, or (key, None) if there is nothing to fill against."""
+        token = _token(m, side)
+        if token and self.books is not None:
+            b = self.books.get(token)
+            if b is not None and (b.bids or b.asks):
+                return token, b
+        if not self.synthetic:
+            return token or f"{m['id']}_{side}", None
+        key = f"{m['id']}_{side}"
+        price = m["outcome_yes"] if side == "yes" else m["outcome_no"]
+        liquidity = m.get("liquidity", 0)
+        cached = self._synth.get(key)
+        if cached is None or cached[0] != price or cached[1] != liquidity:
+            cached = self._synth[key] = (price, liquidity, synthetic_book(price, liquidity))
+        return key, cached[2]
+
+    def _walk(self, m, side, action, **kw):
+        key, book = self.book(m, side)
+        if book is None:
+            want = kw.get("usd") if kw.get("usd") is not None else kw.get("shares")
+            return {"shares": 0.0, "cost": 0.0, "avg_price": None, "slippage": 0.0, "levels": 0, "unfilled": want}
+        return book.walk(action, taken=self._taken.setdefault((key, action), {}), **kw)
+
+    def market_order(self, m, side, action, usd=None, shares=None, limit=None):
+        """Immediate fill (FAK) of a buy (`usd`) or sell (`shares`) up to `limit`."""
+        return self._walk(m, side, action, usd=usd, shares=shares, limit=limit)
+
+    def limit_order(self, m, side, price, usd, strategy=None, now=None, ttl=ORDER_TTL, **extra):
+        """Place a GTC buy at `price` for `usd`; returns the order dict after the immediate fill.
+
+        order["filled"]/["cost"] is what executed; order["reserved"] is the cash
+        still locked for the resting remainder (0 once done).
+        """
+        now = time.time() if now is None else now
+        fill = self._walk(m, side, "buy", usd=usd, limit=price)
+        order = {
+            "market_id": m["id"], "question": m["question"], "side": side,
+            "token_id": _token(m, side), "action": "buy", "price": price, "amount": usd,
+            "filled": fill["shares"], "cost": fill["cost"],
+            "reserved": max(usd - fill["cost"], 0.0), "strategy": strategy,
+            "placed_at": now, "expires_at": now + ttl, **extra,
+        }
+        if order["reserved"] < order["price"] * MIN_SHARES:
+            order["reserved"] = 0.0
+        return order, fill
+
+    def match(self, order, m, now=None):
+        """Fill a resting order against this tick's book; returns this tick's fill (may be empty)."""
+        if order["reserved"] <= 0 or m is None:
+            return None
+        fill = self._walk(m, order["side"], "buy", usd=order["reserved"], limit=order["price"])
+        if fill["shares"]:
+            order["filled"] += fill["shares"]
+            order["cost"] += fill["cost"]
+            order["reserved"] = max(order["reserved"] - fill["cost"], 0.0)
+            if order["reserved"] < order["price"] * MIN_SHARES:
+                order["reserved"] = 0.0
+        return fill
+
+    def done(self, order):
+        return order["reserved"] <= 0
+
+    def cancel(self, orders):
+        for order in orders:
+            order["reserved"] = 0.0
+
+    def replace(self, pairs):
+        for order, price in pairs:
+            order["price"] = price
+
+
+if __name__ == "__main__":
+    # python execution_sim.py <market_id> [usd]  — 看一笔买单在真实盘口上的成交均价和滑点
+    from market_data import get_markets_by_ids
+    if len(sys.argv) < 2:
+        print("Usage: python execution_sim.py <market_id> [usd]")
+        sys.exit(1)
+    usd = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    m = get_markets_by_ids([sys.argv[1]]).get(sys.argv[1])
+    if not m:
+        print("❌ market not found")
+        sys.exit(1)
+    sim = ExecutionSimulator(BookCache())
+    sim.begin_tick(markets=[m])
+    print(m["question"])
+    for side in ("yes", "no"):
+        key, book = sim.book(m, side)
+        fill = sim.market_order(m, side, "buy", usd=usd)
+        mid = m["outcome_yes"] if side == "yes" else m["outcome_no"]
+        src = "clob" if key == _token(m, side) else "synthetic"
+        if fill["avg_price"] is None:
+            print(f"  {side.upper():3}  no liquidity ({src})")
+            continue
+        print(f"  {side.upper():3}  mid {mid*100:.1f}¢  fill {fill['avg_price']*100:.2f}¢  "
+              f"slippage {fill['slippage']*100:+.2f}%  {fill['levels']} levels  "
+              f"unfilled ${fill['unfilled']:.2f}  ({src})")
@@ -1,87 +1,120 @@
-"""Generate static HTML dashboard from auto_portfolio.json"""
-import json, os, sys
+"""Generate static HTML dashboard from auto_portfolio.json
+
+    python generate_dashboard.py [--force]
+
+增量生成：
+- 页面拆成 cards / positions / history / chart 四段，每段按自己的输入（组合数字、
+  持仓现价、最近 20 笔、日快照）算哈希；哈希和 dashboard_cache.json 里的一样就复用缓存的 HTML 片段
+- 四段都没变就什么也不写（“最后更新”时间也不动），cron 不会再提交一模一样的文件
+- 资产曲线数据单独写 docs/dashboard_chart.json，页面加载时 fetch，只在日快照变了时改
+- 胜负统计按 history 长度缓存，history 没增长就不再扫全量 journal
+- 输出都是原子写（atomic_io）
+"""
+import hashlib, json, os, sys
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(__file__))
 from auto_trader import generate_report, generate_weekly_summary, _load
+from atomic_io import atomic_write_json, atomic_write_text, read_json
 
 OUTPUT = os.path.join(os.path.dirname(__file__), "docs", "dashboard.html")
+CHART_OUTPUT = os.path.join(os.path.dirname(__file__), "docs", "dashboard_chart.json")
+CACHE_FILE = os.path.join(os.path.dirname(__file__), "dashboard_cache.json")
+TEMPLATE_VERSION = 2        # 改了片段模板就 +1，旧缓存全部作废
+HISTORY_ROWS = 20
+CHART_DAYS = 30
 
-def generate():
-    data = _load()
-    report = generate_report()
-    
-    pnl_class = "pos" if report["total_pnl"] >= 0 else "neg"
-    pnl_sign = "+" if report["total_pnl"] >= 0 else ""
-    now = datetime.now().strftime("%Y-%m-%d %H:%M PST")
-    
-    # Positions HTML
-    if report["positions"]:
-        pos_rows = ""
-        for p in report["positions"]:
-            pc = "pos" if p["pnl"] >= 0 else "neg"
-            ps = "+" if p["pnl"] >= 0 else ""
-            side_cls = "yes" if p["side"] == "yes" else "no"
-            pos_rows += f"""<tr>
-                <td><span class="side {side_cls}">{p['side'].upper()}</span></td>
-                <td class="q">{p['question']}</td>
-                <td>{p['shares']:.0f}</td>
-                <td>{p['avg_price']*100:.0f}¢</td>
-                <td>{p['current_price']*100:.0f}¢</td>
-                <td>${p['value']:.2f}</td>
-                <td class="{pc}">{ps}${p['pnl']:.2f} ({ps}{p['pnl_pct']}%)</td>
-            </tr>"""
-        pos_html = f"""<table>
-            <thead><tr><th></th><th>市场</th><th>股数</th><th>成本</th><th>现价</th><th>市值</th><th>盈亏</th></tr></thead>
-            <tbody>{pos_rows}</tbody>
-        </table>"""
-    else:
-        pos_html = '<div class="empty">暂无持仓</div>'
-    
-    # History HTML
-    history = data.get("history", [])
-    if history:
-        hist_rows = ""
-        for h in reversed(history[-20:]):
-            if h["action"] == "settle":
-                continue  # skip settle entries in display
-            action_cls = "buy" if h["action"] == "buy" else "sell"
-            action_txt = "买入" if h["action"] == "buy" else "卖出"
-            side_cls = "yes" if h.get("side") == "yes" else "no"
-            t = datetime.fromisoformat(h["time"]).strftime("%m/%d %H:%M")
-            if h["action"] == "buy":
-                detail = f"-${h['amount']:.0f}"
-            else:
-                detail = f"+${h.get('proceeds',0):.0f}"
-                profit = h.get('profit', 0)
-                detail += f" ({'赚' if profit>=0 else '亏'}${abs(profit):.1f})"
-            reason = h.get("reason", "")
-            hist_rows += f"""<tr>
-                <td><span class="action {action_cls}">{action_txt}</span></td>
-                <td><span class="side {side_cls}">{h['side'].upper()}</span></td>
-                <td class="q">{h.get('question','')[:50]}</td>
-                <td>{h.get('shares',0):.0f}股 @ {h['price']*100:.0f}¢</td>
-                <td>{detail}</td>
-                <td class="dim">{reason}</td>
-                <td class="dim">{t}</td>
-            </tr>"""
-        hist_html = f"""<table><thead><tr><th></th><th></th><th>市场</th><th>详情</th><th>金额</th><th>原因</th><th>时间</th></tr></thead><tbody>{hist_rows}</tbody></table>"""
-    else:
-        hist_html = '<div class="empty">暂无记录</div>'
-    
-    # Snapshots chart data
-    snapshots = data.get("daily_snapshots", [])
-    chart_labels = json.dumps([s["date"][-5:] for s in snapshots[-30:]])
-    chart_values = json.dumps([s["total_value"] for s in snapshots[-30:]])
-    
-    # Win/loss stats
-    sells = [h for h in history if h["action"] == "sell"]
-    wins = sum(1 for s in sells if s.get("profit",0)>0)
-    losses = sum(1 for s in sells if s.get("profit",0)<0)
+
+def _key(obj):
+    raw = json.dumps([TEMPLATE_VERSION, obj], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _load_cache():
+    try:
+        cache = read_json(CACHE_FILE, dict)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _render_cards(c):
+    pnl_class = "pos" if c["total_pnl"] >= 0 else "neg"
+    pnl_sign = "+" if c["total_pnl"] >= 0 else ""
+    wins, losses = c["wins"], c["losses"]
     wr = round(wins/(wins+losses)*100) if (wins+losses)>0 else 0
-    realized = sum(s.get("profit",0) for s in sells)
+    return f"""<div class="cards">
+  <div class="card"><div class="label">💰 账户总值</div><div class="val">${c['total_value']:,.2f}</div></div>
+  <div class="card"><div class="label">📊 总盈亏</div><div class="val {pnl_class}">{pnl_sign}${c['total_pnl']:.2f}<br><span style="font-size:14px">({pnl_sign}{c['total_pnl_pct']}%)</span></div></div>
+  <div class="card"><div class="label">💵 可用余额</div><div class="val">${c['balance']:,.2f}</div></div>
+  <div class="card"><div class="label">📋 持仓数</div><div class="val">{c['position_count']}/25</div></div>
+  <div class="card"><div class="label">🔄 总交易次数</div><div class="val">{c['total_trades']}</div></div>
+  <div class="card"><div class="label">🎯 胜率</div><div class="val">{wr}%<br><span style="font-size:12px;color:#8b949e">{wins}胜 {losses}负</span></div></div>
+</div>"""
+
+
+def _render_positions(positions):
+    if not positions:
+        return '<div class="empty">暂无持仓</div>'
+    pos_rows = ""
+    for p in positions:
+        pc = "pos" if p["pnl"] >= 0 else "neg"
+        ps = "+" if p["pnl"] >= 0 else ""
+        side_cls = "yes" if p["side"] == "yes" else "no"
+        pos_rows += f"""<tr>
+            <td><span class="side {side_cls}">{p['side'].upper()}</span></td>
+            <td class="q">{p['question']}</td>
+            <td>{p['shares']:.0f}</td>
+            <td>{p['avg_price']*100:.0f}¢</td>
+            <td>{p['current_price']*100:.0f}¢</td>
+            <td>${p['value']:.2f}</td>
+            <td class="{pc}">{ps}${p['pnl']:.2f} ({ps}{p['pnl_pct']}%)</td>
+        </tr>"""
+    return f"""<table>
+        <thead><tr><th></th><th>市场</th><th>股数</th><th>成本</th><th>现价</th><th>市值</th><th>盈亏</th></tr></thead>
+        <tbody>{pos_rows}</tbody>
+    </table>"""
+
+
+def _render_history(entries):
+    if not entries:
+        return '<div class="empty">暂无记录</div>'
+    hist_rows = ""
+    for h in entries:
+        action_cls = "buy" if h["action"] == "buy" else "sell"
+        action_txt = "买入" if h["action"] == "buy" else "卖出"
+        side_cls = "yes" if h.get("side") == "yes" else "no"
+        t = datetime.fromisoformat(h["time"]).strftime("%m/%d %H:%M")
+        if h["action"] == "buy":
+            detail = f"-${h['amount']:.0f}"
+        else:
+            detail = f"+${h.get('proceeds',0):.0f}"
+            profit = h.get('profit', 0)
+            detail += f" ({'赚' if profit>=0 else '亏'}${abs(profit):.1f})"
+        reason = h.get("reason", "")
+        hist_rows += f"""<tr>
+            <td><span class="action {action_cls}">{action_txt}</span></td>
+            <td><span class="side {side_cls}">{h['side'].upper()}</span></td>
+            <td class="q">{h.get('question','')[:50]}</td>
+            <td>{h.get('shares',0):.0f}股 @ {h['price']*100:.0f}¢</td>
+            <td>{detail}</td>
+            <td class="dim">{reason}</td>
+            <td class="dim">{t}</td>
+        </tr>"""
+    return f"""<table><thead><tr><th></th><th></th><th>市场</th><th>详情</th><th>金额</th><th>原因</th><th>时间</th></tr></thead><tbody>{hist_rows}</tbody></table>"""
+
 
-    html = f"""<!DOCTYPE html>
+def _render_chart(points):
+    return f"""<canvas id="chart"></canvas>
+    {f'<div class="empty">数据积累中，明天开始显示曲线</div>' if len(points)<2 else ''}"""
+
+
+RENDERERS = {"cards": _render_cards, "positions": _render_positions,
+             "history": _render_history, "chart": _render_chart}
+
+
+def _page(now, fragments, chart_key):
+    return f"""<!DOCTYPE html>
 <html lang="zh">
 <head>
 <meta charset="UTF-8">
@@ -128,31 +161,23 @@ canvas{{width:100%!important;max-height:200px}}
   <div class="updated">最后更新: {now}</div>
 </div>
 
-<div class="cards">
-  <div class="card"><div class="label">💰 账户总值</div><div class="val">${report['total_value']:,.2f}</div></div>
-  <div class="card"><div class="label">📊 总盈亏</div><div class="val {pnl_class}">{pnl_sign}${report['total_pnl']:.2f}<br><span style="font-size:14px">({pnl_sign}{report['total_pnl_pct']}%)</span></div></div>
-  <div class="card"><div class="label">💵 可用余额</div><div class="val">${report['balance']:,.2f}</div></div>
-  <div class="card"><div class="label">📋 持仓数</div><div class="val">{report['position_count']}/25</div></div>
-  <div class="card"><div class="label">🔄 总交易次数</div><div class="val">{report['total_trades']}</div></div>
-  <div class="card"><div class="label">🎯 胜率</div><div class="val">{wr}%<br><span style="font-size:12px;color:#8b949e">{wins}胜 {losses}负</span></div></div>
-</div>
+{fragments['cards']}
 
 <div class="section">
   <h2>📈 资产曲线</h2>
   <div class="chart-box">
-    <canvas id="chart"></canvas>
-    {f'<div class="empty">数据积累中，明天开始显示曲线</div>' if len(snapshots)<2 else ''}
+    {fragments['chart']}
   </div>
 </div>
 
 <div class="section">
   <h2>📋 当前持仓</h2>
-  {pos_html}
+  {fragments['positions']}
 </div>
 
 <div class="section">
-  <h2>📜 交易记录（最近20笔）</h2>
-  {hist_html}
+  <h2>📜 交易记录（最近{HISTORY_ROWS}笔）</h2>
+  {fragments['history']}
 </div>
 
 <div class="footer">
@@ -162,9 +187,8 @@ canvas{{width:100%!important;max-height:200px}}
 
 <script src="https://cdn.jsdelivr.net/npm/chart.js@4/dist/chart.umd.min.js"></script>
 <script>
-const labels = {chart_labels};
-const values = {chart_values};
-if (labels.length >= 2) {{
+fetch('{os.path.basename(CHART_OUTPUT)}?v={chart_key}').then(r => r.json()).then(({{labels, values}}) => {{
+  if (labels.length < 2) return;
   new Chart(document.getElementById('chart'), {{
     type: 'line',
     data: {{
@@ -194,16 +218,54 @@ if (labels.length >= 2) {{
       }}
     }}
   }});
-}}
+}});
 </script>
 </body>
 </html>"""
-    
+
+
+def generate(force=False):
+    """Regenerate what changed; returns (path, changed)."""
+    data = _load()
+    report = generate_report(data)
+    cache = _load_cache()
+
+    history = data["history"]
+    n = len(history)
+    stats = cache.get("stats")
+    if stats is None or cache.get("stats_n") != n:
+        s = history.sell_summary()
+        stats = {"wins": s["wins"], "losses": s["losses"]}
+
+    points = [[s["date"][-5:], s["total_value"]] for s in data.get("daily_snapshots", [])[-CHART_DAYS:]]
+    inputs = {
+        "cards": {k: report[k] for k in ("total_value", "total_pnl", "total_pnl_pct", "balance",
+                                         "position_count", "total_trades")} | stats,
+        "positions": report["positions"],
+        # 老版本写的 {"action": "settle"} 行（auto_portfolio.json 里还有）没有 side / price，不显示
+        "history": [h for h in reversed(history[-HISTORY_ROWS:]) if h["action"] != "settle"],
+        "chart": points,
+    }
+    keys = {name: _key(v) for name, v in inputs.items()}
+    old_keys = cache.get("keys", {})
+    fragments = cache.get("fragments", {})
+    if not force and old_keys == keys and fragments.keys() >= RENDERERS.keys() \
+            and os.path.exists(OUTPUT) and os.path.exists(CHART_OUTPUT):
+        return OUTPUT, False
+
+    for name, render in RENDERERS.items():
+        if force or old_keys.get(name) != keys[name] or name not in fragments:
+            fragments[name] = render(inputs[name])
+
     os.makedirs(os.path.dirname(OUTPUT), exist_ok=True)
-    with open(OUTPUT, "w") as f:
-        f.write(html)
-    return OUTPUT
+    if force or old_keys.get("chart") != keys["chart"] or not os.path.exists(CHART_OUTPUT):
+        atomic_write_json(CHART_OUTPUT, {"labels": [p[0] for p in points], "values": [p[1] for p in points]},
+                          separators=(",", ":"))
+    now = datetime.now().strftime("%Y-%m-%d %H:%M PST")
+    atomic_write_text(OUTPUT, _page(now, fragments, keys["chart"]))
+    atomic_write_json(CACHE_FILE, {"keys": keys, "fragments": fragments, "stats": stats, "stats_n": n})
+    return OUTPUT, True
 
 if __name__ == "__main__":
-    path = generate()
-    print(f"Dashboard generated: {path}")
+    path, changed = generate(force="--force" in sys.argv[1:])
+    print(f"Dashboard generated: {path}" if changed else f"Dashboard unchanged: {path}")
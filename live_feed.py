@@ -0,0 +1,288 @@
+"""Live feed — 一个后台抓取器，SSE 推给所有看板（app.py 的 /api/stream）
+
+不管开几个页面，上游请求量都一样：
+- 市场列表走 market_cache 的共享快照（TTL 内不重复请求 Gamma）
+- 价格走一条 CLOB websocket（price_stream），价格一变就推，不用等下一次快照
+- 持仓里不在热门列表里的市场，快照刷新时用 get_markets_by_ids 批量补一次价
+- 组合每 FEED_INTERVAL 秒算一次 P&L（valuation.Valuation：只重算价格变了的持仓），变了才推
+
+事件（SSE event 名 → data）：
+    snapshot   {"markets": [...], "portfolio": {...}}   连上时 / 掉队重同步时发一次
+    markets    [...]                                     热门列表本身变了（换了市场或排序）
+    prices     {market_id: {"yes", "no"}}                只带变化的市场
+    portfolio  get_pnl() 的结果                           只在数字变了时推
+
+每个连接一个有界队列；客户端太慢队列满了就清空、改发一份 snapshot，
+所以每条更新对每个客户端最多发一次，也不会因为一个慢连接拖住别人。
+没有连接时后台不抓。websockets 没装或 POLYCLAW_SSE_STREAM=0 时只靠快照刷新价格。
+"""
+import asyncio, json, logging, os, queue, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+FEED_MARKETS = 30           # 看板上的热门市场数
+FEED_INTERVAL = 1.0         # 秒：快照/组合检查间隔（推送延迟上限）
+HEARTBEAT = 15              # 秒：没事件时发 SSE 注释保活
+CLIENT_QUEUE = 256          # 每个连接最多积压多少条事件
+USE_STREAM = os.environ.get("POLYCLAW_SSE_STREAM", "1") != "0"
+
+log = logging.getLogger("live_feed")
+
+
+def sse(event, data, event_id=None):
+    """Format one server-sent event."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Hub:
+    """Fan-out of feed events to per-client queues."""
+
+    def __init__(self, maxsize=CLIENT_QUEUE):
+        self.maxsize = maxsize
+        self.seq = 0
+        self.markets = []           # 当前热门列表（snapshot 用）
+        self.portfolio = None
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _snapshot(self):
+        return sse("snapshot", {"markets": self.markets, "portfolio": self.portfolio}, self.seq)
+
+    def subscribe(self):
+        q = queue.Queue(self.maxsize)
+        with self._lock:
+            q.put_nowait(self._snapshot())
+            self._clients.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._clients.discard(q)
+
+    def publish(self, event, data):
+        with self._lock:
+            if event == "markets":
+                self.markets = data
+            elif event == "portfolio":
+                self.portfolio = data
+            elif event == "prices":
+                for m in self.markets:
+                    if m["id"] in data:
+                        m["outcome_yes"], m["outcome_no"] = data[m["id"]]["yes"], data[m["id"]]["no"]
+            self.seq += 1
+            msg = sse(event, data, self.seq)
+            for q in self._clients:
+                try:
+                    q.put_nowait(msg)
+                except queue.Full:
+                    # 掉队了：扔掉积压，直接给最新全量
+                    while not q.empty():
+                        q.get_nowait()
+                    q.put_nowait(self._snapshot())
+
+
+class LiveFeed:
+    """Background fetcher (asyncio loop in a daemon thread) publishing into a Hub."""
+
+    def __init__(self, hub=None, limit=FEED_MARKETS, interval=FEED_INTERVAL, stream=USE_STREAM, connect=None):
+        self.hub = hub or Hub()
+        self.limit = limit
+        self.interval = interval
+        self.stream = stream
+        self.connect = connect
+        self.prices = {}            # market_id -> {"yes", "no"}（热门 + 持仓）
+        self._top = []              # 最近一次快照的热门市场（完整 dict，带 token id）
+        self.extra = {}             # 持仓里不在热门列表的市场 -> market dict
+        self._fetched_at = None
+        self._dirty = True          # 价格或组合可能变了，下一轮重算 P&L
+        self._held_stale = False
+        self._ticked = {}           # 上次算 P&L 之后变过的价格
+        self._ticks_lock = threading.Lock()
+        self._val = None            # valuation.Valuation（流式增量估值）
+        self._val_version = None
+        self._loop = None
+        self._wake = None
+        self._thread = None
+        self._started = threading.Lock()
+        self._stream_task = None
+        self._stream_ids = frozenset()
+
+    def start(self):
+        with self._started:
+            if self._thread is None:
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(ready,), name="live-feed", daemon=True)
+                self._thread.start()
+                ready.wait()
+        return self
+
+    def poke(self):
+        """Recompute the portfolio now (call after a trade)."""
+        self._dirty = True
+        self._held_stale = True     # 持仓可能换了，重新对一遍要补价的市场
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _run(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wake = asyncio.Event()
+        ready.set()
+        self._loop.run_until_complete(self._main())
+
+    async def _main(self):
+        while True:
+            if len(self.hub):
+                try:
+                    await self._tick()
+                except Exception as e:
+                    log.warning(f"live feed tick failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _tick(self):
+        import market_cache
+        snap = await asyncio.to_thread(market_cache.get_snapshot, self.limit)
+        if snap["fetched_at"] != self._fetched_at:
+            self._fetched_at = snap["fetched_at"]
+            await self._apply_snapshot(snap["markets"])
+        elif self._held_stale:
+            await self._refresh_held()
+        if self._dirty:
+            self._dirty = False
+            pnl = await asyncio.to_thread(self._pnl)
+            if pnl != self.hub.portfolio:
+                self.hub.publish("portfolio", pnl)
+        self._ensure_stream()
+
+    async def _refresh_held(self, refetch=False):
+        """Fetch prices for held markets outside the top list."""
+        self._held_stale = False
+        held = await asyncio.to_thread(self._held_ids)
+        top = {m["id"] for m in self._top}
+        keep = {k: v for k, v in self.extra.items() if k in held and not refetch}
+        missing = sorted(held - top - keep.keys())
+        found = {}
+        if missing:
+            from market_data import get_markets_by_ids
+            try:
+                found = await asyncio.to_thread(get_markets_by_ids, missing)
+            except Exception as e:
+                log.warning(f"held market fetch failed: {e}")
+                keep.update((k, v) for k, v in self.extra.items() if k in missing)
+        self.extra = {**keep, **found}
+        if found:
+            self._set_prices(list(found.values()))
+
+    async def _apply_snapshot(self, markets):
+        self._top = markets
+        await self._refresh_held(refetch=True)
+        view = [{k: m.get(k) for k in ("id", "question", "outcome_yes", "outcome_no", "volume_24h",
+                                        "liquidity", "end_date", "category")} for m in markets]
+        if [m["id"] for m in view] != [m["id"] for m in self.hub.markets]:
+            self.hub.publish("markets", view)
+        self._set_prices(markets)
+
+    def _set_prices(self, markets):
+        changed = {}
+        for m in markets:
+            p = {"yes": round(m["outcome_yes"], 4), "no": round(m["outcome_no"], 4)}
+            if self.prices.get(m["id"]) != p:
+                self.prices[m["id"]] = p
+                changed[m["id"]] = p
+        if changed:
+            from valuation import PRICES
+            PRICES.put(changed)         # /api/portfolio 也用上推送价
+            with self._ticks_lock:
+                self._ticked.update(changed)
+            self._dirty = True
+            self.hub.publish("prices", changed)
+
+    def _held_ids(self):
+        import paper_trading
+        return paper_trading.service().read(lambda d: {p["market_id"] for p in d["positions"].values()})
+
+    def _pnl(self):
+        """Portfolio P&L: full revaluation when the portfolio changed, else only the positions that ticked."""
+        import paper_trading
+        with self._ticks_lock:
+            ticked, self._ticked = self._ticked, {}
+        version = paper_trading.version()
+        if self._val is None or version != self._val_version:
+            self._val, self._val_version = paper_trading.valuation(), version
+            self._val.mark(self.prices)
+        elif ticked:
+            self._val.update(ticked)
+        return self._val.summary()
+
+    # ── websocket：价格一变就推 ──
+    def _ensure_stream(self):
+        if not self.stream:
+            return
+        if self._stream_task is not None and self._stream_task.done():
+            self._stream_task = None
+        markets = [m for m in self._top + list(self.extra.values()) if m.get("clob_token_ids")]
+        ids = frozenset(m["id"] for m in markets)
+        if self._stream_task is not None and ids == self._stream_ids:
+            return
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+        try:
+            from price_stream import PriceBook, run_stream
+            if self.connect is None:
+                import websockets  # noqa: F401
+        except ImportError:
+            self.stream = False
+            return
+        book = PriceBook(markets)
+        self._stream_ids = ids
+        self._stream_task = asyncio.ensure_future(
+            run_stream(book, self._on_stream, connect=self.connect))
+
+    def _on_stream(self, changed, book):
+        self._set_prices([{"id": mid, "outcome_yes": book.prices[mid]["yes"],
+                           "outcome_no": book.prices[mid]["no"]} for mid in changed])
+        if self._wake is not None:
+            self._wake.set()    # 组合按新价格马上重算
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """The process-wide feed, started on first use."""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = LiveFeed()
+    return _feed.start()
+
+
+def poke():
+    """Tell a running feed the portfolio changed; no-op if nobody is streaming."""
+    if _feed is not None:
+        _feed.poke()
+
+
+if __name__ == "__main__":
+    # python live_feed.py [seconds] — 打印推送的事件
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    logging.basicConfig(level=logging.INFO)
+    feed = get_feed()
+    q = feed.hub.subscribe()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            msg = q.get(timeout=max(deadline - time.monotonic(), 0.01))
+        except queue.Empty:
+            break
+        event = msg.split("event: ", 1)[1].split("\n", 1)[0]
+        print(f"{time.strftime('%H:%M:%S')} {event:9} {len(msg):6d}B")
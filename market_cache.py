@@ -0,0 +1,122 @@
+"""Shared market snapshot cache — 一次抓取，全进程共用
+
+auto_trader / price_monitor / app 都从这里读市场数据，不再各自请求 Gamma API。
+- 进程内缓存 + 可选文件缓存（跨进程共享，cron 和 monitor 同时跑也只抓一次）
+- TTL 过期才刷新；并发刷新 single-flight，同一时刻只有一个请求在飞
+- 抓取失败时返回旧快照并标记 stale
+"""
+import json, os, sys, time, threading
+
+sys.path.insert(0, os.path.dirname(__file__))
+import market_data
+from atomic_io import atomic_write_json
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), "market_cache.json")
+MARKET_CACHE_TTL = float(os.environ.get("POLYCLAW_MARKET_TTL", 30))   # 秒
+SHARED_FILE_CACHE = os.environ.get("POLYCLAW_SHARED_CACHE", "1") != "0"
+DEFAULT_LIMIT = 100
+
+_snapshot = None            # {"markets", "limit", "fetched_at"}
+_lock = threading.Lock()    # 保护 _snapshot
+_refresh_lock = threading.Lock()  # single-flight: 同时只有一个线程去抓
+
+
+def _fresh(snap, limit, max_age):
+    return (snap is not None and snap["limit"] >= limit
+            and time.time() - snap["fetched_at"] < max_age)
+
+
+def _read_file():
+    if not SHARED_FILE_CACHE or not os.path.exists(CACHE_FILE):
+        return None
+    try:
+        with open(CACHE_FILE) as f:
+            snap = json.load(f)
+        if {"markets", "limit", "fetched_at"} <= snap.keys():
+            return snap
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_file(snap):
+    if not SHARED_FILE_CACHE:
+        return
+    try:
+        atomic_write_json(CACHE_FILE, snap)
+    except OSError:
+        pass
+
+
+def _view(snap, limit, source, stale=False):
+    age = time.time() - snap["fetched_at"]
+    return {
+        "markets": snap["markets"][:limit],
+        "fetched_at": snap["fetched_at"],
+        "age": round(age, 2),
+        "stale": stale,
+        "source": source,
+    }
+
+
+def get_snapshot(limit=DEFAULT_LIMIT, max_age=None, refresh=False):
+    """Return {"markets", "fetched_at", "age", "stale", "source"}.
+
+    A snapshot fetched with a bigger limit also serves smaller ones, since
+    both are ordered by volume24hr. refresh=True forces a new fetch unless
+    another thread completed one while we waited for the refresh lock.
+    """
+    global _snapshot
+    max_age = MARKET_CACHE_TTL if max_age is None else max_age
+    requested_at = time.time()
+
+    with _lock:
+        snap = _snapshot
+    if not refresh and _fresh(snap, limit, max_age):
+        return _view(snap, limit, "memory")
+
+    with _refresh_lock:
+        # 等锁期间别的线程可能已经刷新过了
+        with _lock:
+            snap = _snapshot
+        if snap is not None and snap["limit"] >= limit and snap["fetched_at"] >= requested_at:
+            return _view(snap, limit, "memory")
+        if not refresh:
+            if _fresh(snap, limit, max_age):
+                return _view(snap, limit, "memory")
+            disk = _read_file()
+            if _fresh(disk, limit, max_age):
+                with _lock:
+                    _snapshot = disk
+                return _view(disk, limit, "file")
+
+        fetch_limit = max(limit, DEFAULT_LIMIT)
+        try:
+            markets = market_data.get_trending_markets(fetch_limit)
+        except Exception:
+            fallback = snap or _read_file()
+            if fallback is not None and fallback["markets"]:
+                return _view(fallback, limit, "fallback", stale=True)
+            raise
+        new = {"markets": markets, "limit": fetch_limit, "fetched_at": time.time()}
+        with _lock:
+            _snapshot = new
+        _write_file(new)
+        return _view(new, limit, "api")
+
+
+def get_markets(limit=DEFAULT_LIMIT, max_age=None, refresh=False):
+    """Drop-in replacement for market_data.get_trending_markets that reads the shared snapshot."""
+    return get_snapshot(limit, max_age, refresh)["markets"]
+
+
+def invalidate():
+    """Drop the in-process snapshot (the file copy simply ages out)."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+if __name__ == "__main__":
+    s = get_snapshot()
+    print(f"{len(s['markets'])} markets | source={s['source']} age={s['age']}s stale={s['stale']}")
@@ -1,10 +1,28 @@
 """Polymarket data fetcher - no auth needed for read-only"""
 import json
+import asyncio
 import httpx
 from datetime import datetime
 
 GAMMA_API = "https://gamma-api.polymarket.com"
 
+# 全量市场翻页参数
+PAGE_SIZE = 500             # Gamma /markets 单页上限
+PAGE_CONCURRENCY = 8        # 同时在飞的翻页请求数
+MAX_UNIVERSE = 20000        # 全量抓取的安全上限
+ID_BATCH_SIZE = 50          # 按id批量查询时每个请求带的id数
+
+_client = None
+
+
+def _get_client():
+    """Shared keep-alive client so repeated calls reuse one HTTP/2 connection."""
+    global _client
+    if _client is None:
+        _client = httpx.Client(http2=True, timeout=15,
+                               limits=httpx.Limits(max_keepalive_connections=10))
+    return _client
+
 def _parse_price(raw, idx):
     try:
         prices = json.loads(raw) if raw else [0, 0]
@@ -12,37 +30,173 @@ def _parse_price(raw, idx):
     except:
         return 0
 
-def get_trending_markets(limit=20):
-    """Fetch trending/popular markets"""
-    resp = httpx.get(f"{GAMMA_API}/markets", params={
+def _parse_list(raw):
+    try:
+        return json.loads(raw) if isinstance(raw, str) else list(raw or [])
+    except ValueError:
+        return []
+
+def _normalize(m):
+    """Flatten a raw Gamma market into the dict shape used everywhere else."""
+    return {
+        "id": m.get("id"),
+        "condition_id": m.get("conditionId"),
+        "question": m.get("question", ""),
+        "description": (m.get("description") or "")[:200],
+        "outcome_yes": _parse_price(m.get("outcomePrices", ""), 0),
+        "outcome_no": _parse_price(m.get("outcomePrices", ""), 1),
+        "volume_24h": float(m.get("volume24hr", 0) or 0),
+        "volume_total": float(m.get("volumeNum", 0) or 0),
+        "liquidity": float(m.get("liquidityNum", 0) or 0),
+        "end_date": m.get("endDate", ""),
+        "category": m.get("groupSlug", ""),
+        "clob_token_ids": _parse_list(m.get("clobTokenIds")),  # [YES token, NO token]
+    }
+
+def _page_params(limit, offset=0):
+    return {
         "limit": limit,
+        "offset": offset,
         "active": True,
         "closed": False,
         "order": "volume24hr",
         "ascending": False,
-    }, timeout=15)
+    }
+
+def _record(markets):
+    """每次抓到的价格都追加进 tick store（缺 numpy 或写盘失败都不影响抓取）"""
+    try:
+        from tick_store import record_markets
+    except ImportError:
+        return
+    record_markets(markets)
+
+def get_trending_markets(limit=20):
+    """Fetch trending/popular markets"""
+    resp = _get_client().get(f"{GAMMA_API}/markets", params=_page_params(limit))
     resp.raise_for_status()
-    markets = resp.json()
-    results = []
-    for m in markets:
-        results.append({
-            "id": m.get("id"),
-            "condition_id": m.get("conditionId"),
-            "question": m.get("question", ""),
-            "description": m.get("description", "")[:200],
-            "outcome_yes": _parse_price(m.get("outcomePrices", ""), 0),
-            "outcome_no": _parse_price(m.get("outcomePrices", ""), 1),
-            "volume_24h": float(m.get("volume24hr", 0)),
-            "volume_total": float(m.get("volumeNum", 0)),
-            "liquidity": float(m.get("liquidityNum", 0)),
-            "end_date": m.get("endDate", ""),
-            "category": m.get("groupSlug", ""),
-        })
+    markets = [_normalize(m) for m in resp.json()]
+    _record(markets)
+    return markets
+
+async def get_all_markets_async(max_markets=MAX_UNIVERSE, page_size=PAGE_SIZE,
+                                concurrency=PAGE_CONCURRENCY, base_url=None, client=None):
+    """Page through the whole active /markets universe concurrently.
+
+    Pages are requested in waves of `concurrency` offsets over one shared
+    AsyncClient; paging stops at the first short page. Results keep the
+    volume24hr ordering and are de-duplicated by market id (offset paging
+    can repeat a row when volumes shift between requests).
+    """
+    base_url = base_url or GAMMA_API
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(http2=True, timeout=15,
+                                   limits=httpx.Limits(max_connections=concurrency))
+
+    async def fetch_page(offset):
+        resp = await client.get(f"{base_url}/markets",
+                                params=_page_params(page_size, offset))
+        resp.raise_for_status()
+        return resp.json()
+
+    pages = []
+    try:
+        offset = 0
+        done = False
+        while not done and offset < max_markets:
+            offsets = [offset + i * page_size for i in range(concurrency)
+                       if offset + i * page_size < max_markets]
+            wave = await asyncio.gather(*(fetch_page(o) for o in offsets))
+            for page in wave:
+                pages.append(page)
+                if len(page) < page_size:
+                    done = True
+                    break
+            offset = offsets[-1] + page_size
+    finally:
+        if own_client:
+            await client.aclose()
+
+    results, seen = [], set()
+    for page in pages:
+        for m in page:
+            mid = m.get("id")
+            if mid in seen:
+                continue
+            seen.add(mid)
+            results.append(_normalize(m))
+            if len(results) >= max_markets:
+                return results
     return results
 
+def _run(coro):
+    """asyncio.run, also from code that is itself called inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # 同步调用方跑在事件循环里（比如 websocket 回调）：asyncio.run 会直接报错，换个线程跑
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+def get_all_markets(max_markets=MAX_UNIVERSE, page_size=PAGE_SIZE,
+                    concurrency=PAGE_CONCURRENCY, base_url=None):
+    """Blocking wrapper around get_all_markets_async for scripts and cron jobs."""
+    markets = _run(get_all_markets_async(max_markets, page_size, concurrency, base_url))
+    _record(markets)
+    return markets
+
+async def get_markets_by_ids_async(ids=(), condition_ids=(), batch_size=ID_BATCH_SIZE,
+                                   base_url=None, client=None):
+    """Fetch specific markets by Gamma id and/or condition id, keyed by market id.
+
+    Ids are chunked into bulk `?id=..&id=..` requests that run concurrently, so
+    the cost is O(len(ids) / batch_size) requests no matter how far the markets
+    have fallen down the trending list. No active/closed filter is applied:
+    resolved markets must still come back so positions can be settled.
+    """
+    base_url = base_url or GAMMA_API
+    ids = [str(i) for i in dict.fromkeys(ids) if i]
+    condition_ids = [c for c in dict.fromkeys(condition_ids) if c]
+    batches = [("id", ids[i:i + batch_size]) for i in range(0, len(ids), batch_size)]
+    batches += [("condition_ids", condition_ids[i:i + batch_size])
+                for i in range(0, len(condition_ids), batch_size)]
+    if not batches:
+        return {}
+
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(http2=True, timeout=15)
+
+    async def fetch_batch(param, chunk):
+        resp = await client.get(f"{base_url}/markets",
+                                params=[(param, v) for v in chunk] + [("limit", len(chunk))])
+        resp.raise_for_status()
+        return resp.json()
+
+    try:
+        pages = await asyncio.gather(*(fetch_batch(p, c) for p, c in batches))
+    finally:
+        if own_client:
+            await client.aclose()
+
+    results = {}
+    for page in pages:
+        for m in page:
+            results[m.get("id")] = _normalize(m)
+    return results
+
+def get_markets_by_ids(ids=(), condition_ids=(), batch_size=ID_BATCH_SIZE, base_url=None):
+    """Blocking wrapper around get_markets_by_ids_async."""
+    markets = _run(get_markets_by_ids_async(ids, condition_ids, batch_size, base_url))
+    _record(list(markets.values()))
+    return markets
+
 def get_market_detail(market_id):
     """Fetch single market details"""
-    resp = httpx.get(f"{GAMMA_API}/markets/{market_id}", timeout=15)
+    resp = _get_client().get(f"{GAMMA_API}/markets/{market_id}")
     resp.raise_for_status()
     return resp.json()
 
@@ -64,6 +218,12 @@ def search_markets(query, limit=10):
     return resp.json()
 
 if __name__ == "__main__":
+    import sys, time
+    if len(sys.argv) > 1 and sys.argv[1] == "all":
+        t0 = time.time()
+        universe = get_all_markets()
+        print(f"Fetched {len(universe)} markets in {time.time()-t0:.2f}s")
+        sys.exit(0)
     markets = get_trending_markets(10)
     for m in markets:
         print(f"  {m['question']}")
@@ -0,0 +1,281 @@
+"""Mock CLOB — 本地假 Polymarket CLOB，给实盘下单路径（execution.ClobBackend）做联调
+
+    python mock_clob.py [port]          # 起服务（默认 8878），POLYCLAW_CLOB_HOST=http://127.0.0.1:8878
+    python mock_clob.py demo            # 起服务 + 用 ClobBackend 下几单、挪盘口、对账，打印过程
+
+实现 py-clob-client 下单要用到的接口：/time、/auth/api-key、/auth/derive-api-key、
+/tick-size、/neg-risk、/fee-rate、/book、/books、/order、/orders（POST 下单 / DELETE 撤单）、
+/data/order/<id>。订单按 makerAmount/takerAmount 还原价格和股数，和内存里的盘口撮合：
+能成交的部分立即成交（吃掉盘口），GTC 剩余挂着，FAK/FOK 剩余作废。
+管理接口：POST /mock/book {"token_id", "bids", "asks"} 换盘口并撮合挂单；GET /mock/orders。
+MOCK_LATENCY（秒）给每个请求加延迟，用来看并发提交的效果。
+不校验签名和 L2 HMAC —— 只为了跑通流程。
+"""
+import base64, os, secrets, sys, threading, time, uuid
+
+from flask import Flask, jsonify, request
+
+sys.path.insert(0, os.path.dirname(__file__))
+from execution_sim import OrderBook
+
+MOCK_PORT = 8878
+MOCK_LATENCY = float(os.environ.get("MOCK_LATENCY", "0"))
+
+app = Flask(__name__)
+_lock = threading.Lock()
+books = {}      # token_id -> OrderBook
+orders = {}     # order_id -> dict
+CREDS = {"apiKey": str(uuid.uuid4()), "secret": base64.urlsafe_b64encode(secrets.token_bytes(32)).decode(),
+         "passphrase": secrets.token_hex(16)}
+
+
+@app.before_request
+def _latency():
+    if MOCK_LATENCY:
+        time.sleep(MOCK_LATENCY)
+
+
+def _book(token_id):
+    return books.setdefault(str(token_id), OrderBook())
+
+
+def _tick(token_id):
+    b = books.get(str(token_id))
+    mid = b.mid if b is not None and b.mid else 0.5
+    return 0.001 if mid < 0.04 or mid > 0.96 else 0.01
+
+
+def _book_json(token_id):
+    b = _book(token_id)
+    return {
+        "market": "", "asset_id": str(token_id), "timestamp": str(int(time.time() * 1000)), "hash": "",
+        "bids": [{"price": str(p), "size": str(s)} for p, s in b.bids],
+        "asks": [{"price": str(p), "size": str(s)} for p, s in b.asks],
+        "min_order_size": "5", "neg_risk": False, "tick_size": str(_tick(token_id)), "last_trade_price": "0.5",
+    }
+
+
+def _take(order):
+    """Match an order against its book, consuming the liquidity it takes."""
+    b = _book(order["asset_id"])
+    action = "buy" if order["side"] == "BUY" else "sell"
+    want = order["original_size"] - order["size_matched"]
+    fill = b.walk(action, shares=want, limit=order["price"])
+    if not fill["shares"]:
+        return 0.0, 0.0
+    levels = b.asks if action == "buy" else b.bids
+    left = fill["shares"]
+    for i, (p, s) in enumerate(levels):
+        if left <= 1e-9:
+            break
+        n = min(s, left)
+        levels[i] = (p, s - n)
+        left -= n
+    levels[:] = [(p, s) for p, s in levels if s > 1e-9]
+    order["size_matched"] += fill["shares"]
+    order["cost_matched"] += fill["cost"]
+    return fill["shares"], fill["cost"]
+
+
+def _place(body):
+    o = body["order"]
+    maker, taker = int(o["makerAmount"]) / 1e6, int(o["takerAmount"]) / 1e6
+    size, usd = (taker, maker) if o["side"] == "BUY" else (maker, taker)
+    order = {
+        "id": "0x" + secrets.token_hex(32), "asset_id": str(o["tokenId"]), "side": o["side"],
+        "price": round(usd / size, 6), "original_size": size, "size_matched": 0.0, "cost_matched": 0.0,
+        "order_type": body.get("orderType", "GTC"), "status": "LIVE", "created_at": int(time.time()),
+    }
+    if order["order_type"] == "FOK" and _book(order["asset_id"]).depth(
+            "buy" if order["side"] == "BUY" else "sell", order["price"]) < usd - 1e-6:
+        return {"success": False, "errorMsg": "order couldn't be fully filled (FOK)", "orderID": "", "status": ""}
+    shares, cost = _take(order)
+    if order["size_matched"] >= order["original_size"] - 1e-9:
+        order["status"] = "MATCHED"
+    elif order["order_type"] in ("FAK", "FOK"):
+        order["status"] = "CANCELED"
+    orders[order["id"]] = order
+    making, taking = (cost, shares) if order["side"] == "BUY" else (shares, cost)
+    return {"success": True, "errorMsg": "", "orderID": order["id"],
+            "status": "matched" if shares else "live" if order["status"] == "LIVE" else order["status"].lower(),
+            "makingAmount": f"{making:.6f}" if shares else "", "takingAmount": f"{taking:.6f}" if shares else ""}
+
+
+def _order_json(order):
+    return {"id": order["id"], "status": order["status"], "asset_id": order["asset_id"],
+            "side": order["side"], "price": str(order["price"]),
+            "original_size": str(order["original_size"]), "size_matched": str(round(order["size_matched"], 6)),
+            "order_type": order["order_type"], "created_at": order["created_at"]}
+
+
+def _cancel(ids):
+    canceled, not_canceled = [], {}
+    for oid in ids:
+        order = orders.get(oid)
+        if order is None:
+            not_canceled[oid] = "order not found"
+        elif order["status"] != "LIVE":
+            not_canceled[oid] = f"order is {order['status'].lower()}"
+        else:
+            order["status"] = "CANCELED"
+            canceled.append(oid)
+    return {"canceled": canceled, "not_canceled": not_canceled}
+
+
+@app.route("/time")
+def api_time():
+    return jsonify(int(time.time()))
+
+
+@app.route("/auth/api-key", methods=["POST"])
+@app.route("/auth/derive-api-key")
+def api_key():
+    return jsonify(CREDS)
+
+
+@app.route("/tick-size")
+def api_tick_size():
+    return jsonify({"minimum_tick_size": _tick(request.args["token_id"])})
+
+
+@app.route("/neg-risk")
+def api_neg_risk():
+    return jsonify({"neg_risk": False})
+
+
+@app.route("/fee-rate")
+def api_fee_rate():
+    return jsonify({"base_fee": 0})
+
+
+@app.route("/book")
+def api_book():
+    with _lock:
+        return jsonify(_book_json(request.args["token_id"]))
+
+
+@app.route("/books", methods=["POST"])
+def api_books():
+    with _lock:
+        return jsonify([_book_json(p["token_id"]) for p in request.get_json(force=True)])
+
+
+@app.route("/order", methods=["POST"])
+def api_post_order():
+    with _lock:
+        return jsonify(_place(request.get_json(force=True)))
+
+
+@app.route("/orders", methods=["POST"])
+def api_post_orders():
+    with _lock:
+        return jsonify([_place(body) for body in request.get_json(force=True)])
+
+
+@app.route("/order", methods=["DELETE"])
+def api_cancel():
+    with _lock:
+        return jsonify(_cancel([request.get_json(force=True)["orderID"]]))
+
+
+@app.route("/orders", methods=["DELETE"])
+def api_cancel_orders():
+    with _lock:
+        return jsonify(_cancel(request.get_json(force=True)))
+
+
+@app.route("/data/order/<order_id>")
+def api_get_order(order_id):
+    with _lock:
+        order = orders.get(order_id)
+        return jsonify(_order_json(order) if order else None)
+
+
+@app.route("/mock/book", methods=["POST"])
+def mock_book():
+    """Replace a token's book, then let resting orders on it trade against the new levels."""
+    d = request.get_json(force=True)
+    with _lock:
+        books[str(d["token_id"])] = OrderBook(d.get("bids", ()), d.get("asks", ()))
+        filled = 0
+        for order in orders.values():
+            if order["asset_id"] == str(d["token_id"]) and order["status"] == "LIVE":
+                shares, _ = _take(order)
+                filled += shares > 0
+                if order["size_matched"] >= order["original_size"] - 1e-9:
+                    order["status"] = "MATCHED"
+        return jsonify({"ok": True, "orders_filled": filled})
+
+
+@app.route("/mock/orders")
+def mock_orders():
+    with _lock:
+        return jsonify([_order_json(o) for o in orders.values()])
+
+
+def serve(port=MOCK_PORT):
+    """Run the mock in a daemon thread; returns its base URL."""
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def _demo():
+    import httpx, logging, tempfile
+    from py_clob_client.client import ClobClient
+    from execution import ClobBackend, OrderManager
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    host = serve(0)
+    yes, no = "1001", "1002"
+    httpx.post(f"{host}/mock/book", json={"token_id": yes, "bids": [[0.40, 500]], "asks": [[0.42, 100], [0.45, 1000]]})
+    httpx.post(f"{host}/mock/book", json={"token_id": no, "bids": [[0.56, 500]], "asks": [[0.58, 1000]]})
+    client = ClobClient(host, chain_id=137, key="0x" + secrets.token_hex(32))
+    client.set_api_creds(client.create_or_derive_api_creds())
+    state = os.path.join(tempfile.mkdtemp(prefix="mock_clob_"), "live_orders.json")
+    backend = ClobBackend(client, OrderManager(client, path=state, poll_interval=0.2))
+    m = {"id": "42", "question": "Mock market?", "outcome_yes": 0.41, "outcome_no": 0.57,
+         "clob_token_ids": [yes, no]}
+
+    t0 = time.perf_counter()
+    taker, _ = backend.limit_order(m, "yes", 0.45, 100, strategy="fear", order_type="FAK")
+    resting, _ = backend.limit_order(m, "no", 0.50, 50, strategy="ls")
+    print(f"queued 2 orders in {(time.perf_counter() - t0) * 1000:.1f}ms (non-blocking)")
+    backend.manager.flush()
+    print(f"sent after {(time.perf_counter() - t0) * 1000:.0f}ms")
+    for name, order in (("taker", taker), ("resting", resting)):
+        fill = backend.match(order)
+        rec = backend.manager.get(order["client_id"])
+        print(f"  {name:8} {rec['status']:9} filled {order['filled']:.2f} sh "
+              f"(${order['cost']:.2f})  done={backend.done(order)}" + (f"  fill @ {fill['avg_price']:.4f}" if fill else ""))
+
+    httpx.post(f"{host}/mock/book", json={"token_id": no, "bids": [[0.47, 500]], "asks": [[0.49, 60]]})
+    time.sleep(0.5)
+    fill = backend.match(resting)
+    print(f"book moved → resting order fill: {fill['shares']:.2f} sh @ {fill['avg_price']:.4f}" if fill else "no fill")
+    backend.replace([(resting, 0.48)])
+    backend.manager.flush()
+    print(f"replaced @ 0.48 → {backend.manager.get(resting['client_id'])['status']}")
+    backend.cancel([resting])
+    backend.manager.flush()
+    time.sleep(0.3)
+    print(f"cancelled → {backend.manager.get(resting['client_id'])['status']}, done={backend.done(resting)}, "
+          f"refund ${resting['amount'] - resting['cost']:.2f}")
+    # 挂单和撤单落在同一批（BATCH_WINDOW 内）：撤单要生效，单子不能发出去
+    before = len(httpx.get(f"{host}/mock/orders").json())
+    quick, _ = backend.limit_order(m, "no", 0.30, 20, strategy="ls")
+    backend.cancel([quick])
+    backend.manager.flush()
+    rec = backend.manager.get(quick["client_id"])
+    posted = len(httpx.get(f"{host}/mock/orders").json()) - before
+    print(f"submit+cancel in one batch → {rec['status']}, order_id={rec['order_id']}, posted={posted}")
+    backend.manager.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "demo":
+        _demo()
+    else:
+        port = int(sys.argv[1]) if len(sys.argv) > 1 else MOCK_PORT
+        app.run(host="127.0.0.1", port=port, debug=False, threaded=True)
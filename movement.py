@@ -0,0 +1,319 @@
+"""Rolling-window move detector — 多周期动量 + 波动率 z-score + 成交量突增
+
+price_monitor（轮询/websocket/async 三种模式）和 news_scanner 共用。
+
+每个市场一段定长环形缓冲（numpy 二维数组的一行：时间、YES 价、24h 量），
+更新 O(1)：写入 head，同时增量维护相邻 tick 价差的 Σd、Σd²（滚动波动率）。
+查询某个周期（1m/5m/1h）时在两段有序的环里二分找 "t - 周期" 时刻的价格。
+
+警报规则（任一周期满足即报，取信号最强的周期）：
+- 价格：|相对变化| >= 阈值（持仓 ALERT_THRESHOLD，trending TRENDING_THRESHOLD）
+- 波动：|z| >= Z_THRESHOLD 且绝对变化 >= MIN_ABS_MOVE（历史样本够了才算）
+- 成交量：24h量 / 最长周期前的24h量 >= VOLUME_SPIKE_RATIO
+警报字典和以前 check_price_movements 的格式一致，另加 horizon / zscore / volume_ratio / signal。
+"""
+import time
+from datetime import datetime
+
+import numpy as np
+
+HORIZONS = {"1m": 60, "5m": 300, "1h": 3600}
+RING_SIZE = 1024            # 每个市场保留的样本数
+RESOLUTION = 5              # 秒；这个间隔内只留第一条和最新一条，环能覆盖更长时间
+HELD_THRESHOLD = 0.05       # 持仓市场 5%
+TRENDING_THRESHOLD = 0.08   # trending 市场 8%（噪音多）
+Z_THRESHOLD = 4.0
+MIN_ABS_MOVE = 0.01         # z-score 警报至少要 1¢ 的变化，避免几乎不动的市场误报
+MIN_VOL_SAMPLES = 20        # 至少这么多个价差才估波动率
+VOLUME_SPIKE_RATIO = 3.0
+
+
+class MoveDetector:
+    def __init__(self, ring=RING_SIZE, horizons=None, held_threshold=HELD_THRESHOLD,
+                 trending_threshold=TRENDING_THRESHOLD, z_threshold=Z_THRESHOLD,
+                 volume_spike=VOLUME_SPIKE_RATIO, min_abs_move=MIN_ABS_MOVE, resolution=RESOLUTION):
+        self.ring = ring
+        self.horizons = dict(horizons or HORIZONS)
+        self.held_threshold = held_threshold
+        self.trending_threshold = trending_threshold
+        self.z_threshold = z_threshold
+        self.volume_spike = volume_spike
+        self.min_abs_move = min_abs_move
+        self.resolution = resolution
+        self.slots = {}     # market_id -> row
+        self.questions = {}
+        self._alloc(64)
+
+    def _alloc(self, rows):
+        self.ts = np.zeros((rows, self.ring))
+        self.yes = np.zeros((rows, self.ring))
+        self.vol = np.zeros((rows, self.ring))
+        self.head = np.zeros(rows, np.int64)    # 下一次写入的位置
+        self.count = np.zeros(rows, np.int64)
+        self.sum_d = np.zeros(rows)
+        self.sum_d2 = np.zeros(rows)
+
+    def _grow(self):
+        old = (self.ts, self.yes, self.vol, self.head, self.count, self.sum_d, self.sum_d2)
+        n = len(self.head)
+        self._alloc(n * 2)
+        for new, prev in zip((self.ts, self.yes, self.vol, self.head, self.count, self.sum_d, self.sum_d2), old):
+            new[:n] = prev
+
+    def _row(self, market_id):
+        i = self.slots.get(market_id)
+        if i is None:
+            i = self.slots[market_id] = len(self.slots)
+            if i >= len(self.head):
+                self._grow()
+        return i
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _recompute(self, i):
+        """Exact Σd/Σd² from the ring, so float drift from incremental updates can't build up."""
+        n = self.count[i]
+        if n < 2:
+            self.sum_d[i] = self.sum_d2[i] = 0.0
+            return
+        order = (self.head[i] - n + np.arange(n)) % self.ring
+        d = np.diff(self.yes[i, order])
+        self.sum_d[i] = d.sum()
+        self.sum_d2[i] = (d * d).sum()
+
+    # ---------- 更新 ----------
+    def update(self, market_id, ts, yes, volume=None):
+        """Push one observation (O(1)); returns the row index."""
+        i = self._row(market_id)
+        R, h, n = self.ring, self.head[i], self.count[i]
+        vol = np.nan if volume is None else volume
+        if n:
+            last = (h - 1) % R
+            if ts < self.ts[i, last]:
+                return i   # 乱序的旧数据直接丢
+            if n >= 2 and ts - self.ts[i, (h - 2) % R] < self.resolution:
+                # 太密：覆盖最后一条（保留窗口里的第一条当基准），价差和也跟着换
+                prev = self.yes[i, (h - 2) % R]
+                old_d, new_d = self.yes[i, last] - prev, yes - prev
+                self.sum_d[i] += new_d - old_d
+                self.sum_d2[i] += new_d * new_d - old_d * old_d
+                self.ts[i, last], self.yes[i, last], self.vol[i, last] = ts, yes, vol
+                return i
+            d = yes - self.yes[i, last]
+            self.sum_d[i] += d
+            self.sum_d2[i] += d * d
+            if n == R:
+                # 挤掉最老的样本，同时去掉它和第二老之间的价差
+                gone = self.yes[i, (h + 1) % R] - self.yes[i, h]
+                self.sum_d[i] -= gone
+                self.sum_d2[i] -= gone * gone
+        self.ts[i, h], self.yes[i, h], self.vol[i, h] = ts, yes, vol
+        self.head[i] = (h + 1) % R
+        if n < R:
+            self.count[i] = n + 1
+        elif self.head[i] == 0:
+            self._recompute(i)   # 每绕一圈校正一次，摊下来还是 O(1)
+        return i
+
+    def seed(self, prices, ts):
+        """Load a price_cache-style {market_id: {"yes", "volume_24h", "question"}} dict as history."""
+        for mid, p in prices.items():
+            self.update(mid, ts, p["yes"], p.get("volume_24h"))
+            if p.get("question"):
+                self.questions[mid] = p["question"]
+
+    def warm(self, store, since):
+        """Replay tick-store history (ts >= since) so a restart doesn't lose the lookback."""
+        ticks = store.read(start=since)
+        if not len(ticks):
+            return 0
+        ids = {}
+        for t, slot, y, v in zip(ticks["ts"].tolist(), ticks["market"].tolist(),
+                                 ticks["yes"].tolist(), ticks["volume"].tolist()):
+            mid = ids.get(slot)
+            if mid is None:
+                mid = ids[slot] = store.market_id(slot)
+            self.update(mid, t, y, None if v != v else v)
+        return len(ticks)
+
+    # ---------- 查询 ----------
+    def _index_at(self, i, t):
+        """Ring index of the latest sample with ts <= t (the oldest sample if none)."""
+        R, h, n = self.ring, self.head[i], self.count[i]
+        start = (h - n) % R
+        ts = self.ts[i]
+        if start + n <= R:
+            k = np.searchsorted(ts[start:start + n], t, side="right") - 1
+            return start + max(k, 0)
+        first = ts[start:]             # 环绕：[start, R) 和 [0, h) 各自有序
+        if t < ts[0]:
+            k = np.searchsorted(first, t, side="right") - 1
+            return start + max(k, 0)
+        return np.searchsorted(ts[:h], t, side="right") - 1
+
+    def sigma(self, market_id):
+        """Std of tick-to-tick YES changes in the window, or None with too little history."""
+        i = self.slots.get(market_id)
+        if i is None:
+            return None
+        k = self.count[i] - 1
+        if k < MIN_VOL_SAMPLES:
+            return None
+        var = (self.sum_d2[i] - self.sum_d[i] ** 2 / k) / (k - 1)
+        return float(np.sqrt(var)) if var > 0 else 0.0
+
+    def metrics(self, market_id):
+        """{"yes", "volume", "horizons": {name: {"old", "change", "pct", "z", "ticks"}}, "volume_ratio"}."""
+        i = self.slots.get(market_id)
+        if i is None or self.count[i] == 0:
+            return None
+        R = self.ring
+        last = (self.head[i] - 1) % R
+        now, yes, vol = self.ts[i, last], self.yes[i, last], self.vol[i, last]
+        sigma = self.sigma(market_id)
+        out = {"yes": float(yes), "volume": float(vol), "horizons": {}, "volume_ratio": None}
+        longest = None
+        for name, secs in self.horizons.items():
+            j = self._index_at(i, now - secs)
+            if j == last:
+                continue
+            old = float(self.yes[i, j])
+            change = float(yes) - old
+            ticks = (last - j) % R
+            z = None
+            if sigma:
+                z = change / (sigma * np.sqrt(ticks))
+            out["horizons"][name] = {
+                "old": old, "change": change, "ticks": int(ticks),
+                "pct": abs(change) / old if old > 0.001 else None,
+                "z": None if z is None else float(z),
+            }
+            if longest is None or secs > longest[0]:
+                longest = (secs, j)
+        if longest is not None:
+            ref = self.vol[i, longest[1]]
+            if ref > 0 and vol == vol:
+                out["volume_ratio"] = float(vol / ref)
+        return out
+
+    def evaluate(self, market_id, held=False):
+        """Alert dict for the strongest signal on this market, or None."""
+        m = self.metrics(market_id)
+        if m is None:
+            return None
+        threshold = self.held_threshold if held else self.trending_threshold
+        best = None   # (rank, strength, name, h, signal)
+        for name, h in m["horizons"].items():
+            pct, z = h["pct"], h["z"]
+            if pct is not None and pct >= threshold:
+                signal = "strong" if pct >= 2 * threshold else "moderate"
+                cand = (2, pct / threshold, name, h, signal)
+            elif z is not None and abs(z) >= self.z_threshold and abs(h["change"]) >= self.min_abs_move:
+                cand = (1, abs(z) / self.z_threshold, name, h, "zscore")
+            else:
+                continue
+            if best is None or cand[:2] > best[:2]:
+                best = cand
+        ratio = m["volume_ratio"]
+        if best is None and ratio is not None and ratio >= self.volume_spike and m["horizons"]:
+            name = max(m["horizons"], key=lambda n: self.horizons[n])
+            best = (0, ratio, name, m["horizons"][name], "volume_spike")
+        if best is None:
+            return None
+        _, _, name, h, signal = best
+        new = m["yes"]
+        return {
+            "market_id": market_id,
+            "question": self.questions.get(market_id, "Unknown"),
+            "old_price": h["old"],
+            "new_price": new,
+            "change_pct": round((h["pct"] or 0) * 100, 1),
+            "direction": "📈" if new > h["old"] else "📉",
+            "horizon": name,
+            "zscore": None if h["z"] is None else round(h["z"], 2),
+            "volume_ratio": None if ratio is None else round(ratio, 2),
+            "signal": signal,
+            "time": datetime.now().isoformat(),
+        }
+
+    def _may_alert(self, rows, held):
+        """Vectorised pre-check of evaluate() for many rows at once.
+
+        Same rules with slightly loosened thresholds, so it can only let extra
+        rows through; evaluate() makes the exact call on the ones that pass.
+        """
+        R, loose = self.ring, 1 - 1e-9
+        n, head = self.count[rows], self.head[rows]
+        start, last = (head - n) % R, (head - 1) % R
+        now, yes, vol = self.ts[rows, last], self.yes[rows, last], self.vol[rows, last]
+        k = n - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = (self.sum_d2[rows] - self.sum_d[rows] ** 2 / k) / (k - 1)
+            sigma = np.where((k >= MIN_VOL_SAMPLES) & (var > 0), np.sqrt(var), 0.0)
+        threshold = np.where(held, self.held_threshold, self.trending_threshold) * loose
+        hit = np.zeros(len(rows), bool)
+        longest_j = last
+        for secs in sorted(self.horizons.values()):
+            # 每行的环按时间有序：二分数出 ts <= now - secs 的样本数，同 _index_at
+            t = now - secs
+            lo, hi = np.zeros(len(rows), np.int64), n.copy()
+            while True:
+                active = lo < hi
+                if not active.any():
+                    break
+                mid = (lo + hi) // 2
+                le = self.ts[rows, (start + mid) % R] <= t
+                lo = np.where(active & le, mid + 1, lo)
+                hi = np.where(active & ~le, mid, hi)
+            j = (start + np.maximum(lo - 1, 0)) % R
+            old = self.yes[rows, j]
+            move = np.abs(yes - old)
+            ticks = (last - j) % R
+            hit |= (j != last) & (((old > 0.001) & (move >= threshold * old))
+                                  | ((sigma > 0) & (move >= self.min_abs_move * loose)
+                                     & (move >= self.z_threshold * loose * sigma * np.sqrt(ticks))))
+            longest_j = j
+        ref = self.vol[rows, longest_j]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spike = (longest_j != last) & (ref > 0) & (vol == vol) & (vol / ref >= self.volume_spike * loose)
+        return hit | spike
+
+    def _push(self, prices, ts):
+        ids, rows = [], []
+        for mid, p in prices.items():
+            if p.get("question"):
+                self.questions[mid] = p["question"]
+            ids.append(mid)
+            rows.append(self.update(mid, ts, p["yes"], p.get("volume_24h")))
+        return ids, np.array(rows, np.int64)
+
+    def observe(self, prices, held_ids=(), ts=None):
+        """Feed a price_cache-style dict for one tick and return alerts for it."""
+        ids, rows = self._push(prices, time.time() if ts is None else ts)
+        if not ids:
+            return []
+        held = np.fromiter((mid in held_ids for mid in ids), bool, len(ids))
+        alerts = []
+        for k in np.flatnonzero(self._may_alert(rows, held)).tolist():
+            a = self.evaluate(ids[k], held=bool(held[k]))
+            if a:
+                alerts.append(a)
+        return alerts
+
+    def observe_split(self, prices, ts=None):
+        """observe() with every market evaluated both as held and as trending.
+
+        Returns ({market_id: alert}, {market_id: alert}), for replays that only
+        decide later which markets are held (backtest.AlertTape).
+        """
+        ids, rows = self._push(prices, time.time() if ts is None else ts)
+        held_alerts, trending_alerts = {}, {}
+        if ids:
+            # 持仓阈值更低，按持仓预筛覆盖两种情况
+            for k in np.flatnonzero(self._may_alert(rows, np.ones(len(ids), bool))).tolist():
+                for held, out in ((True, held_alerts), (False, trending_alerts)):
+                    a = self.evaluate(ids[k], held=held)
+                    if a:
+                        out[ids[k]] = a
+        return held_alerts, trending_alerts
@@ -1,5 +1,5 @@
 """免费新闻扫描 — 0成本信息源"""
-import httpx, json, re
+import httpx, json, re, time
 from datetime import datetime
 
 NEWS_SOURCES = [
@@ -8,43 +8,55 @@ NEWS_SOURCES = [
     {"name": "ESPN", "url": "https://www.espn.com/", "focus": "sports"},
 ]
 
-def scan_polymarket_movers(markets_before, markets_after):
-    """Detect significant price movements between two snapshots."""
-    movers = []
-    before_map = {m["id"]: m for m in markets_before}
+def scan_polymarket_movers(markets_before, markets_after, detector=None):
+    """Detect significant price movements between two snapshots.
+
+    Snapshots are {"time", "markets"} dicts (save_snapshot's format) or bare
+    market lists; the detector is fed at the snapshots' own times, so the
+    1m/5m/1h horizons line up with when the prices were actually taken.
+    Uses the same rolling detector as price_monitor (trending thresholds);
+    pass a long-lived `detector` to get multi-horizon moves across calls.
+    """
+    from movement import MoveDetector
+    markets_before, t_before = _snapshot_frame(markets_before)
+    markets_after, t_after = _snapshot_frame(markets_after)
+    if t_after is None:
+        t_after = time.time()
+    if detector is None:
+        detector = MoveDetector()
+        # 没带时间的旧调用方式：当作一分钟前的快照
+        detector.seed({m["id"]: _price(m) for m in markets_before},
+                      t_after - 60 if t_before is None else t_before)
+    alerts = detector.observe({m["id"]: _price(m) for m in markets_after}, ts=t_after)
+    by_id = {m["id"]: m for m in markets_after}
     
-    for m in markets_after:
-        prev = before_map.get(m["id"])
-        if not prev:
-            continue
-        
-        price_change = abs(m["outcome_yes"] - prev["outcome_yes"])
-        vol_ratio = m["volume_24h"] / max(prev["volume_24h"], 1)
-        
-        if price_change >= 0.05:  # 5%+ price move
-            movers.append({
-                "question": m["question"],
-                "id": m["id"],
-                "price_before": prev["outcome_yes"],
-                "price_after": m["outcome_yes"],
-                "change": m["outcome_yes"] - prev["outcome_yes"],
-                "volume_24h": m["volume_24h"],
-                "signal": "strong" if price_change >= 0.10 else "moderate",
-            })
-        elif vol_ratio > 3:  # volume spike 3x+
-            movers.append({
-                "question": m["question"],
-                "id": m["id"],
-                "price_before": prev["outcome_yes"],
-                "price_after": m["outcome_yes"],
-                "change": m["outcome_yes"] - prev["outcome_yes"],
-                "volume_24h": m["volume_24h"],
-                "signal": "volume_spike",
-            })
+    movers = []
+    for a in alerts:
+        m = by_id[a["market_id"]]
+        movers.append({
+            "question": m["question"],
+            "id": m["id"],
+            "price_before": a["old_price"],
+            "price_after": a["new_price"],
+            "change": a["new_price"] - a["old_price"],
+            "volume_24h": m["volume_24h"],
+            "signal": a["signal"],
+            "horizon": a["horizon"],
+        })
     
     movers.sort(key=lambda x: abs(x["change"]), reverse=True)
     return movers
 
+def _snapshot_frame(snapshot):
+    """(markets, epoch seconds or None) from a snapshot dict or a bare market list."""
+    if not isinstance(snapshot, dict):
+        return snapshot, None
+    when = snapshot.get("time")
+    return snapshot["markets"], datetime.fromisoformat(when).timestamp() if when else None
+
+def _price(m):
+    return {"yes": m["outcome_yes"], "no": m["outcome_no"], "question": m["question"], "volume_24h": m["volume_24h"]}
+
 def fetch_headline(url, timeout=10):
     """Fetch headlines from a news source."""
     try:
@@ -63,15 +75,17 @@ def fetch_headline(url, timeout=10):
 SNAPSHOT_FILE = __import__('os').path.join(__import__('os').path.dirname(__file__), "market_snapshot.json")
 
 def save_snapshot(markets):
-    with open(SNAPSHOT_FILE, "w") as f:
-        json.dump({"time": datetime.now().isoformat(), "markets": markets}, f)
+    from atomic_io import atomic_write_json
+    atomic_write_json(SNAPSHOT_FILE, {"time": datetime.now().isoformat(), "markets": markets})
 
-def load_snapshot():
+def load_snapshot(with_time=False):
+    """Markets of the last saved snapshot (the whole {"time", "markets"} dict with with_time=True)."""
     try:
         with open(SNAPSHOT_FILE) as f:
-            return json.load(f)["markets"]
+            snap = json.load(f)
+        return snap if with_time else snap["markets"]
     except:
-        return []
+        return {"time": None, "markets": []} if with_time else []
 
 if __name__ == "__main__":
     for src in NEWS_SOURCES:
@@ -1,15 +1,34 @@
-"""Paper trading engine - simulated trades with fake money"""
+"""Paper trading engine - simulated trades with fake money
+
+组合常驻内存（PortfolioService，一把锁），不再每次 buy / sell / get_pnl 都整份读写：
+- 每笔变更先追加到 portfolio.log.jsonl（一行一条，fsync 后才返回）→ 再改内存
+- 完整快照（portfolio.json / portfolio.db）由后台线程每 SNAPSHOT_INTERVAL 秒、
+  或日志攒到 SNAPSHOT_EVERY 条、或进程退出时写，写完截掉已落盘的日志
+- 启动 / 发现别的进程改过文件时：读快照 + 重放 seq 更新的日志 → 崩在哪一步都不丢已返回的交易
+- 跨进程写仍用 file_lock 串行；读只 stat 一下文件，没变就直接用内存
+"""
+import atexit
 import json
 import os
+import sys
+import threading
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(__file__))
+import portfolio_db
+from atomic_io import atomic_write_json, file_lock
+
 DATA_FILE = os.path.join(os.path.dirname(__file__), "portfolio.json")
+DB_FILE = os.path.join(os.path.dirname(__file__), "portfolio.db")
+LOG_FILE = os.path.join(os.path.dirname(__file__), "portfolio.log.jsonl")
+STORE = os.environ.get("POLYCLAW_STORE", "json")   # json | sqlite
 STARTING_BALANCE = 1000.0  # $1000 USDC 模拟资金
+FILL_MODEL = os.environ.get("POLYCLAW_FILLS", "mid")   # mid | book（按 CLOB 盘口逐档成交）
+MAX_SLIPPAGE = 0.05        # book 模式下最多比报价差 5%
+SNAPSHOT_INTERVAL = float(os.environ.get("POLYCLAW_SNAPSHOT_INTERVAL", 5))   # 秒
+SNAPSHOT_EVERY = 1000      # 日志攒到这么多条就提前落快照（限制重放长度）
 
-def _load():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE) as f:
-            return json.load(f)
+def _new_portfolio():
     return {
         "balance": STARTING_BALANCE,
         "positions": {},  # market_id -> {question, side, shares, avg_price, bought_at}
@@ -17,12 +36,233 @@ def _load():
         "created": datetime.now().isoformat(),
     }
 
+def _load_json():
+    if os.path.exists(DATA_FILE):
+        with open(DATA_FILE) as f:
+            return json.load(f)
+    return _new_portfolio()
+
+def _load():
+    """Last full snapshot (without the log applied)."""
+    if STORE == "sqlite":
+        return portfolio_db.load(DB_FILE, _new_portfolio)
+    return _load_json()
+
 def _save(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    if STORE == "sqlite":
+        portfolio_db.save(data, DB_FILE)
+        return
+    atomic_write_json(DATA_FILE, data, indent=2)
+
+def _lock():
+    return file_lock(DB_FILE if STORE == "sqlite" else DATA_FILE)
+
+def _snapshot_files():
+    return (DB_FILE, DB_FILE + "-wal") if STORE == "sqlite" else (DATA_FILE,)
+
+
+def _apply(data, rec):
+    """Apply one log record to an in-memory portfolio (also used for replay)."""
+    data["balance"] = rec["balance"]
+    for key, pos in rec["positions"].items():
+        if pos is None:
+            data["positions"].pop(key, None)
+        else:
+            data["positions"][key] = pos
+    if rec.get("trade"):
+        data["history"].append(rec["trade"])
+
+
+def _read_log(path):
+    """Complete records of a mutation log; stops at a torn last line."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+class PortfolioService:
+    """In-memory portfolio with an append-only mutation log and write-behind snapshots."""
+
+    def __init__(self, log_path=LOG_FILE, interval=SNAPSHOT_INTERVAL):
+        self.log_path = log_path
+        self.interval = interval
+        self.lock = threading.RLock()
+        self.data = None
+        self.seq = 0                # 最后一条已应用日志的序号
+        self.pending = 0            # 还没进快照的日志条数
+        self._seen = None           # 上次读 / 写后文件的 stat
+        self._log = None
+        self._wake = threading.Event()
+        self._writer = None
+        atexit.register(self.close)
+
+    # ── 加载 / 重放 ──
+    def _token(self):
+        out = []
+        for path in _snapshot_files() + (self.log_path, self.log_path + ".old"):
+            try:
+                st = os.stat(path)
+                out.append((st.st_ino, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    def _ensure(self):
+        """Reload from disk if this is the first use or another process changed the files."""
+        token = self._token()
+        if self.data is not None and token == self._seen:
+            return
+        data = _load()
+        seq = data.pop("log_seq", 0)
+        pending = 0
+        for path in (self.log_path + ".old", self.log_path):
+            for rec in _read_log(path):
+                if rec["seq"] > seq:
+                    _apply(data, rec)
+                    seq = rec["seq"]
+                    pending += 1
+        self.data, self.seq, self.pending, self._seen = data, seq, pending, token
+
+    def version(self):
+        with self.lock:
+            self._ensure()
+            return f"{self.data.get('created')}:{self.seq}"
+
+    def read(self, fn):
+        with self.lock:
+            self._ensure()
+            return fn(self.data)
+
+    # ── 变更 ──
+    def mutate(self, fn):
+        """fn(data) -> (record or None, result). The record is logged durably, then applied."""
+        with _lock(), self.lock:
+            self._ensure()
+            rec, result = fn(self.data)
+            if rec is None:
+                return result
+            rec = {"seq": self.seq + 1, **rec}
+            if self._log is None:
+                self._log = open(self.log_path, "a", encoding="utf-8")
+            self._log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            _apply(self.data, rec)
+            self.seq += 1
+            self.pending += 1
+            self._seen = self._token()
+            self._start_writer()
+            if self.pending >= SNAPSHOT_EVERY:
+                self._wake.set()
+            return result
+
+    # ── 快照（后台） ──
+    def _start_writer(self):
+        if self._writer is None and self.interval > 0:
+            self._writer = threading.Thread(target=self._write_behind, name="portfolio-snapshot", daemon=True)
+            self._writer.start()
+
+    def _write_behind(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"⚠️ portfolio snapshot failed: {e}", file=sys.stderr)
+
+    def snapshot(self):
+        """Write the full state, then drop the log records it covers."""
+        with _lock(), self.lock:
+            self._ensure()
+            old = self.log_path + ".old"
+            if not self.pending and not os.path.exists(old):
+                return False
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            # 先把日志挪开：快照写到一半崩了，重放 .old + 新日志照样完整
+            if os.path.exists(self.log_path):
+                if os.path.exists(old):
+                    with open(self.log_path, encoding="utf-8") as src, open(old, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                        dst.flush()
+                        os.fsync(dst.fileno())
+                    os.remove(self.log_path)
+                else:
+                    os.replace(self.log_path, old)
+            self.data["log_seq"] = self.seq
+            try:
+                _save(self.data)
+            finally:
+                self.data.pop("log_seq", None)
+            os.remove(old)
+            self.pending = 0
+            self._seen = self._token()
+            return True
+
+    def reset(self):
+        with _lock(), self.lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            for path in (DATA_FILE, DB_FILE, DB_FILE + "-wal", DB_FILE + "-shm",
+                         self.log_path, self.log_path + ".old"):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.data, self.seq, self.pending, self._seen = None, 0, 0, None
+
+    def close(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            print(f"⚠️ portfolio snapshot failed: {e}", file=sys.stderr)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def service():
+    """The process-wide PortfolioService."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PortfolioService()
+    return _service
+
 
 def get_portfolio():
-    return _load()
+    def copy(data):
+        history = data["history"]
+        return {**data, "positions": {k: dict(p) for k, p in data["positions"].items()},
+                "history": list(history) if isinstance(history, list) else history}
+    return service().read(copy)
+
+def version():
+    """Change token for the portfolio (generation + log seq) — for ETags / caches."""
+    return service().version()
+
+def _book_fill(market_id, side, action, price, usd=None, shares=None):
+    """Walk the market's CLOB book (FAK, at most MAX_SLIPPAGE worse than `price`); None if unavailable."""
+    from execution_sim import ExecutionSimulator, BookCache
+    from market_data import get_markets_by_ids
+    m = get_markets_by_ids([market_id]).get(market_id)
+    if not m:
+        return None
+    sim = ExecutionSimulator(BookCache(), synthetic=False)
+    sim.begin_tick(markets=[m])
+    limit = price * (1 + MAX_SLIPPAGE) if action == "buy" else price * (1 - MAX_SLIPPAGE)
+    return sim.market_order(m, side, action, usd=usd, shares=shares, limit=limit)
 
 def buy(market_id, question, side, price, amount):
     """
@@ -31,23 +271,34 @@ def buy(market_id, question, side, price, amount):
     price: current price (0-1)
     amount: USD to spend
     """
-    data = _load()
+    fill = None
+    if FILL_MODEL == "book" and 0 < price < 1:
+        # 查盘口要走网络，放在锁外面；锁里只改内存
+        fill = _book_fill(market_id, side, "buy", price, usd=amount)
+    return service().mutate(lambda data: _buy(data, market_id, question, side, price, amount, fill))
+
+def _buy(data, market_id, question, side, price, amount, fill=None):
     if amount > data["balance"]:
-        return {"error": f"余额不足。当前: ${data['balance']:.2f}, 需要: ${amount:.2f}"}
+        return None, {"error": f"余额不足。当前: ${data['balance']:.2f}, 需要: ${amount:.2f}"}
     if price <= 0 or price >= 1:
-        return {"error": f"价格异常: {price}"}
-    
+        return None, {"error": f"价格异常: {price}"}
+    slippage = None
+    if fill is not None:
+        if fill["shares"] < 0.01:
+            return None, {"error": f"盘口深度不足（{price*100:.1f}¢ 上下 {MAX_SLIPPAGE:.0%} 内没有卖单）"}
+        amount, price, slippage = fill["cost"], fill["avg_price"], fill["slippage"]
+
     shares = amount / price
-    data["balance"] -= amount
-    
+    balance = data["balance"] - amount
+
     key = f"{market_id}_{side}"
     if key in data["positions"]:
-        pos = data["positions"][key]
+        pos = dict(data["positions"][key])
         total_shares = pos["shares"] + shares
         pos["avg_price"] = (pos["shares"] * pos["avg_price"] + shares * price) / total_shares
         pos["shares"] = total_shares
     else:
-        data["positions"][key] = {
+        pos = {
             "market_id": market_id,
             "question": question,
             "side": side,
@@ -55,8 +306,8 @@ def buy(market_id, question, side, price, amount):
             "avg_price": price,
             "bought_at": datetime.now().isoformat(),
         }
-    
-    data["history"].append({
+
+    trade = {
         "action": "buy",
         "market_id": market_id,
         "question": question,
@@ -65,10 +316,9 @@ def buy(market_id, question, side, price, amount):
         "amount": amount,
         "shares": shares,
         "time": datetime.now().isoformat(),
-    })
-    
-    _save(data)
-    return {
+    }
+
+    return {"op": "buy", "balance": balance, "positions": {key: pos}, "trade": trade}, {
         "ok": True,
         "action": "买入",
         "question": question,
@@ -76,32 +326,48 @@ def buy(market_id, question, side, price, amount):
         "shares": round(shares, 2),
         "price": price,
         "cost": amount,
-        "balance": round(data["balance"], 2),
+        "slippage": None if slippage is None else round(slippage * 100, 2),
+        "balance": round(balance, 2),
     }
 
 def sell(market_id, side, price, shares=None):
     """Sell shares. If shares=None, sell all."""
-    data = _load()
     key = f"{market_id}_{side}"
-    
+    fill = quoted = None
+    if FILL_MODEL == "book":
+        # 锁外先按当前持仓查盘口；锁里持仓要是变了（别的请求刚卖过）就不用这份报价
+        held = service().read(lambda data: data["positions"].get(key, {}).get("shares"))
+        if held is not None and (shares or held) <= held:
+            quoted = shares or held
+            fill = _book_fill(market_id, side, "sell", price, shares=quoted)
+    return service().mutate(lambda data: _sell(data, market_id, side, price, shares, fill, quoted))
+
+def _sell(data, market_id, side, price, shares=None, fill=None, quoted=None):
+    key = f"{market_id}_{side}"
+
     if key not in data["positions"]:
-        return {"error": "没有该持仓"}
-    
-    pos = data["positions"][key]
+        return None, {"error": "没有该持仓"}
+
+    pos = dict(data["positions"][key])
     sell_shares = shares or pos["shares"]
     if sell_shares > pos["shares"]:
-        return {"error": f"持仓不足。当前: {pos['shares']:.2f} 股"}
-    
+        return None, {"error": f"持仓不足。当前: {pos['shares']:.2f} 股"}
+    slippage = None
+    if fill is not None:
+        if sell_shares != quoted:
+            return None, {"error": f"持仓刚变过（现在 {pos['shares']:.2f} 股），请重试"}
+        if fill["shares"] < 0.01:
+            return None, {"error": f"盘口深度不足（{price*100:.1f}¢ 下方 {MAX_SLIPPAGE:.0%} 内没有买单）"}
+        sell_shares, price, slippage = fill["shares"], fill["avg_price"], fill["slippage"]
+
     proceeds = sell_shares * price
-    data["balance"] += proceeds
-    
+    balance = data["balance"] + proceeds
+
     profit = (price - pos["avg_price"]) * sell_shares
-    
+
     pos["shares"] -= sell_shares
-    if pos["shares"] < 0.01:
-        del data["positions"][key]
-    
-    data["history"].append({
+
+    trade = {
         "action": "sell",
         "market_id": market_id,
         "question": pos["question"],
@@ -111,10 +377,10 @@ def sell(market_id, side, price, shares=None):
         "proceeds": proceeds,
         "profit": profit,
         "time": datetime.now().isoformat(),
-    })
-    
-    _save(data)
-    return {
+    }
+
+    return {"op": "sell", "balance": balance, "positions": {key: pos if pos["shares"] >= 0.01 else None},
+            "trade": trade}, {
         "ok": True,
         "action": "卖出",
         "question": pos["question"],
@@ -123,48 +389,54 @@ def sell(market_id, side, price, shares=None):
         "price": price,
         "proceeds": round(proceeds, 2),
         "profit": round(profit, 2),
-        "balance": round(data["balance"], 2),
+        "slippage": None if slippage is None else round(slippage * 100, 2),
+        "balance": round(balance, 2),
     }
 
-def get_pnl(current_prices=None):
-    """Calculate total P&L. current_prices: {market_id_side: price}"""
-    data = _load()
-    total_invested = STARTING_BALANCE - data["balance"]
-    positions_value = 0
-    
-    details = []
-    for key, pos in data["positions"].items():
-        current = current_prices.get(key, pos["avg_price"]) if current_prices else pos["avg_price"]
-        value = pos["shares"] * current
-        cost = pos["shares"] * pos["avg_price"]
-        pnl = value - cost
-        positions_value += value
-        details.append({
-            "question": pos["question"],
-            "side": pos["side"],
-            "shares": round(pos["shares"], 2),
-            "avg_price": round(pos["avg_price"], 4),
-            "current_price": round(current, 4),
-            "value": round(value, 2),
-            "pnl": round(pnl, 2),
-            "pnl_pct": round(pnl / cost * 100, 1) if cost > 0 else 0,
-        })
-    
-    total_value = data["balance"] + positions_value
-    total_pnl = total_value - STARTING_BALANCE
-    
-    return {
-        "balance": round(data["balance"], 2),
-        "positions_value": round(positions_value, 2),
-        "total_value": round(total_value, 2),
-        "total_pnl": round(total_pnl, 2),
-        "total_pnl_pct": round(total_pnl / STARTING_BALANCE * 100, 1),
-        "positions": details,
-        "trade_count": len(data["history"]),
-    }
+def get_pnl(current_prices=None, live=False):
+    """Calculate total P&L.
+
+    current_prices: {market_id_side: price}. live=True (and no current_prices) marks every
+    held position to market with one batched, cached price lookup (valuation.PRICES).
+    Positions without a price are valued at avg_price.
+    """
+    val = valuation()
+    if current_prices:
+        val.mark_keys(current_prices)
+    elif live and val.market_ids:
+        from valuation import PRICES
+        val.mark(PRICES.get(val.held_ids()))
+    return val.summary()
+
+def valuation():
+    """Columnar valuation.Valuation of the current portfolio (at cost until marked)."""
+    from valuation import Valuation
+    return service().read(lambda data: Valuation.from_portfolio(data, STARTING_BALANCE))
 
 def reset():
     """Reset portfolio"""
-    if os.path.exists(DATA_FILE):
-        os.remove(DATA_FILE)
+    service().reset()
     return {"ok": True, "message": "模拟账户已重置，余额 $1,000"}
+
+
+if __name__ == "__main__":
+    # python paper_trading.py bench [n] — 连续下 n 单看吞吐（在临时目录里跑，不碰真实组合）
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        import tempfile, time
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+        tmp = tempfile.mkdtemp(prefix="paper_bench_")
+        DATA_FILE, DB_FILE = os.path.join(tmp, "portfolio.json"), os.path.join(tmp, "portfolio.db")
+        _service = PortfolioService(os.path.join(tmp, "portfolio.log.jsonl"))
+        t0 = time.perf_counter()
+        for i in range(n):
+            buy(str(i % 50), f"Q{i % 50}", "yes", 0.5, 0.1)
+            if i % 10 == 9:
+                sell(str(i % 50), "yes", 0.55, 0.1)
+        ms = (time.perf_counter() - t0) * 1000
+        ops = n + n // 10
+        print(f"{ops} orders in {ms:.0f}ms → {ops / ms * 1000:,.0f} orders/s")
+        t0 = time.perf_counter()
+        service().snapshot()
+        print(f"snapshot {(time.perf_counter() - t0) * 1000:.1f}ms, trades {get_pnl()['trade_count']}")
+    else:
+        print(json.dumps(get_pnl(), ensure_ascii=False, indent=2))
@@ -0,0 +1,220 @@
+"""SQLite portfolio store — auto_trader / paper_trading 的可选存储后端
+
+POLYCLAW_STORE=sqlite 时启用。表结构：
+- meta:      余额、创建时间等标量（JSON 编码）
+- positions: 持仓，按 market_id / strategy 建索引
+- trades:    交易记录，按 时间 / (strategy, action) / market_id 建索引
+- snapshots: 每日快照，按日期唯一
+
+_load() 返回的 data 和 JSON 后端形状一样，只是 data["history"] 换成 TradeHistory：
+append / len / 切片照旧，since()、tail()、sell_summary() 都是走索引的 SQL 查询。
+
+一次性迁移：python portfolio_db.py migrate
+"""
+import json, os, sqlite3, sys
+from collections.abc import Sequence
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+from trade_journal import summarize_sells
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS positions (
+    key TEXT PRIMARY KEY,
+    market_id TEXT,
+    strategy TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_positions_market ON positions(market_id);
+CREATE INDEX IF NOT EXISTS idx_positions_strategy ON positions(strategy);
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL,
+    action TEXT,
+    strategy TEXT,
+    market_id TEXT,
+    profit REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades(ts);
+CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades(strategy, action);
+CREATE INDEX IF NOT EXISTS idx_trades_market ON trades(market_id);
+CREATE TABLE IF NOT EXISTS snapshots (
+    date TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+TABLE_KEYS = ("positions", "history", "daily_snapshots")
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _ts(entry):
+    try:
+        return datetime.fromisoformat(entry["time"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TradeHistory(Sequence):
+    """List-like view over the trades table; appends are inserted on save()."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._pending = []
+
+    def append(self, entry):
+        self._pending.append(entry)
+
+    def extend(self, entries):
+        self._pending.extend(entries)
+
+    def flush(self):
+        if not self._pending:
+            return
+        self.conn.executemany(
+            "INSERT INTO trades (ts, action, strategy, market_id, profit, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [(_ts(e), e.get("action"), e.get("strategy", "unknown"), e.get("market_id"),
+              e.get("profit"), json.dumps(e, ensure_ascii=False)) for e in self._pending],
+        )
+        self._pending = []
+
+    def _rows(self, sql, params=()):
+        return [json.loads(r[0]) for r in self.conn.execute(sql, params)]
+
+    def __len__(self):
+        # 只追加不删除，max(id) 走主键，比 COUNT(*) 全表扫快
+        n = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()[0]
+        return n + len(self._pending)
+
+    def __iter__(self):
+        for (data,) in self.conn.execute("SELECT data FROM trades ORDER BY id"):
+            yield json.loads(data)
+        yield from list(self._pending)
+
+    def tail(self, n):
+        if n <= len(self._pending):
+            return self._pending[len(self._pending) - n:]
+        rows = self._rows("SELECT data FROM trades ORDER BY id DESC LIMIT ?", (n - len(self._pending),))
+        return rows[::-1] + self._pending
+
+    def since(self, cutoff):
+        rows = self._rows("SELECT data FROM trades WHERE ts >= ? ORDER BY ts, id", (cutoff.timestamp(),))
+        return rows + [e for e in self._pending if (_ts(e) or 0) >= cutoff.timestamp()]
+
+    def sell_summary(self):
+        wins, losses, realized = self.conn.execute(
+            "SELECT COALESCE(SUM(profit > 0), 0), COALESCE(SUM(profit < 0), 0), COALESCE(SUM(profit), 0) "
+            "FROM trades WHERE action = 'sell'").fetchone()
+        by_strategy = {}
+        for st, w, l, p in self.conn.execute(
+                "SELECT strategy, SUM(COALESCE(profit, 0) > 0), SUM(COALESCE(profit, 0) <= 0), "
+                "COALESCE(SUM(profit), 0) FROM trades WHERE action = 'sell' GROUP BY strategy"):
+            by_strategy[st] = {"wins": w, "losses": l, "profit": p}
+        pending = summarize_sells(e for e in self._pending if e.get("action") == "sell")
+        for st, v in pending["by_strategy"].items():
+            cur = by_strategy.setdefault(st, {"wins": 0, "losses": 0, "profit": 0})
+            for k in cur:
+                cur[k] += v[k]
+        return {"wins": wins + pending["wins"], "losses": losses + pending["losses"],
+                "realized": realized + pending["realized"], "by_strategy": by_strategy}
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            if idx.start is not None and idx.start < 0 and idx.stop is None and idx.step is None:
+                return self.tail(-idx.start)
+            return list(self)[idx]
+        if idx < 0:
+            if -idx > len(self):
+                raise IndexError("trade index out of range")
+            return self.tail(-idx)[0]
+        return list(self)[idx]
+
+    def __repr__(self):
+        return f"TradeHistory({len(self)} entries)"
+
+
+def load(path, default):
+    """Load a portfolio dict from `path`; a fresh DB is seeded from default()."""
+    conn = connect(path)
+    meta = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+    if not meta:
+        data = default()
+        data.pop("history", None)
+    else:
+        data = meta
+    data["positions"] = {k: json.loads(v) for k, v in conn.execute("SELECT key, data FROM positions")}
+    data["daily_snapshots"] = [json.loads(v) for (v,) in conn.execute("SELECT data FROM snapshots ORDER BY date")]
+    data["history"] = TradeHistory(conn)
+    return data
+
+
+def save(data, path=None):
+    """Write meta, positions and snapshots, and insert pending trades, in one transaction."""
+    history = data["history"]
+    conn = history.conn if isinstance(history, TradeHistory) else connect(path)
+    if not isinstance(history, TradeHistory):
+        history = TradeHistory(conn)
+        history.extend(data["history"])
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items() if k not in TABLE_KEYS],
+        )
+        positions = data.get("positions", {})
+        held = {k for (k,) in conn.execute("SELECT key FROM positions")}
+        conn.executemany("DELETE FROM positions WHERE key = ?", [(k,) for k in held - positions.keys()])
+        conn.executemany(
+            "INSERT OR REPLACE INTO positions (key, market_id, strategy, data) VALUES (?, ?, ?, ?)",
+            [(k, str(p.get("market_id")), p.get("strategy"), json.dumps(p, ensure_ascii=False))
+             for k, p in positions.items()],
+        )
+        snaps = data.get("daily_snapshots", [])
+        conn.execute("DELETE FROM snapshots")
+        conn.executemany("INSERT OR REPLACE INTO snapshots (date, data) VALUES (?, ?)",
+                         [(s["date"], json.dumps(s, ensure_ascii=False)) for s in snaps])
+        history.flush()
+
+
+def migrate(json_load, db_path):
+    """Copy a portfolio loaded by a JSON backend's _load() into a new SQLite file."""
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists")
+    data = json_load()
+    history = list(data["history"])
+    # 老的 auto_trader 记录没有 market_id：按 question 从现有持仓/挂单里补（已平掉的市场查不到就留空）
+    by_question = {p["question"]: p["market_id"]
+                   for p in list(data["positions"].values()) + list(data.get("orders", {}).values())
+                   if p.get("question") and p.get("market_id")}
+    history = [e if e.get("market_id") or e.get("question") not in by_question
+               else dict(e, market_id=by_question[e["question"]]) for e in history]
+    conn = connect(db_path)
+    data = dict(data, history=TradeHistory(conn))
+    data["history"].extend(history)
+    save(data)
+    conn.close()
+    return len(history)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        import auto_trader, paper_trading
+        for name, mod in (("auto_trader", auto_trader), ("paper_trading", paper_trading)):
+            try:
+                n = migrate(mod._load_json, mod.DB_FILE)
+                print(f"✅ {name}: {n} trades → {mod.DB_FILE}")
+            except FileExistsError as e:
+                print(f"⏭️  {name}: {e}")
+    else:
+        print("usage: python portfolio_db.py migrate")
@@ -9,6 +9,7 @@ import json, os, sys, time, logging
 from datetime import datetime, timedelta
 
 sys.path.insert(0, os.path.dirname(__file__))
+from atomic_io import atomic_write_json, file_lock
 
 PORTFOLIO_FILE = os.path.join(os.path.dirname(__file__), "auto_portfolio.json")
 PRICE_CACHE_FILE = os.path.join(os.path.dirname(__file__), "price_cache.json")
@@ -23,6 +24,7 @@ CONSECUTIVE_FAILURES = 0     # 连续失败计数
 MAX_FAILURES_BEFORE_BACKOFF = 3  # 连续3次失败则降速
 COOLDOWN_MINUTES = 30        # 同一市场警报冷却30分钟
 MAX_ALERTS_PER_HOUR = 5      # 每小时最多触发5次交易
+STREAM_RESUBSCRIBE = 300     # websocket模式每5分钟重建订阅（捕捉新开仓位）
 
 # Trending markets也监控（发现新机会）
 SCAN_TRENDING = True
@@ -40,10 +42,9 @@ log = logging.getLogger("price_monitor")
 
 
 def load_portfolio():
-    if os.path.exists(PORTFOLIO_FILE):
-        with open(PORTFOLIO_FILE) as f:
-            return json.load(f)
-    return {"positions": {}}
+    # 走 auto_trader 的存储后端（JSON journal 或 SQLite），不直接读文件
+    from auto_trader import _load
+    return _load()
 
 
 def load_price_cache():
@@ -54,93 +55,135 @@ def load_price_cache():
 
 
 def save_price_cache(cache):
-    with open(PRICE_CACHE_FILE, "w") as f:
-        json.dump(cache, f, indent=2)
+    atomic_write_json(PRICE_CACHE_FILE, cache, indent=2)
 
 
 def load_alerts():
     if os.path.exists(ALERT_FILE):
         with open(ALERT_FILE) as f:
-            return json.load(f)
-    return {"alerts": [], "last_trigger": None, "triggers_this_hour": 0, "hour": None}
+            data = json.load(f)
+    else:
+        data = {"alerts": [], "last_trigger": None}
+    _cooldown_index(data)
+    data.setdefault("trigger_times", [])
+    return data
+
+
+def _cooldown_index(alert_data):
+    """market_id -> epoch of its last triggered alert (rebuilt from the alert log for old files)."""
+    index = alert_data.get("last_alert")
+    if index is None:
+        index = alert_data["last_alert"] = {}
+        for prev in alert_data.get("alerts", []):
+            try:
+                ts = datetime.fromisoformat(prev["time"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            index[prev["market_id"]] = max(ts, index.get(prev["market_id"], 0))
+    return index
 
 
 def save_alerts(data):
-    with open(ALERT_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    atomic_write_json(ALERT_FILE, data, indent=2)
+
+
+def _price_entry(m):
+    return {
+        "yes": m["outcome_yes"],
+        "no": m["outcome_no"],
+        "question": m["question"],
+        "volume_24h": m["volume_24h"],
+    }
 
 
 def fetch_market_prices(market_ids):
-    """Fetch current prices for specific markets from Gamma API."""
-    from market_data import get_trending_markets
-    try:
-        markets = get_trending_markets(100)
-        prices = {}
-        for m in markets:
-            prices[m["id"]] = {
-                "yes": m["outcome_yes"],
-                "no": m["outcome_no"],
-                "question": m["question"],
-                "volume_24h": m["volume_24h"],
-            }
-        return prices
-    except Exception as e:
-        log.error(f"Failed to fetch prices: {e}")
-        return {}
+    """Fetch current prices: held markets by id (O(held) bulk requests) plus
+    the trending list from the shared snapshot when SCAN_TRENDING is on."""
+    from market_cache import get_markets
+    from market_data import get_markets_by_ids
+    prices = {}
+    if SCAN_TRENDING:
+        try:
+            # 每个tick强制刷新一次；同一tick里的交易周期直接复用这份快照
+            for m in get_markets(100, refresh=True):
+                prices[m["id"]] = _price_entry(m)
+        except Exception as e:
+            log.error(f"Failed to fetch trending prices: {e}")
+    if market_ids:
+        try:
+            for mid, m in get_markets_by_ids(market_ids).items():
+                prices[mid] = _price_entry(m)
+        except Exception as e:
+            log.error(f"Failed to fetch held prices: {e}")
+    return prices
 
 
-def check_price_movements(current_prices, cached_prices):
-    """Compare current vs cached prices, return alerts."""
-    alerts = []
-    
-    for mid, cur in current_prices.items():
-        if mid not in cached_prices:
-            continue
-        
-        old = cached_prices[mid]
-        old_yes = old.get("yes", 0)
-        cur_yes = cur["yes"]
-        
-        if old_yes <= 0.001:
-            continue
-        
-        pct_change = abs(cur_yes - old_yes) / old_yes
-        
-        # Different thresholds for held vs trending
-        threshold = ALERT_THRESHOLD  # default 5%
-        
-        if pct_change >= threshold:
-            direction = "📈" if cur_yes > old_yes else "📉"
-            alerts.append({
-                "market_id": mid,
-                "question": cur.get("question", "Unknown"),
-                "old_price": old_yes,
-                "new_price": cur_yes,
-                "change_pct": round(pct_change * 100, 1),
-                "direction": direction,
-                "time": datetime.now().isoformat(),
-            })
-    
-    return alerts
+_detector = None
 
 
-def should_trigger_trade(alert_data):
-    """Check cooldown and rate limits."""
-    now = datetime.now()
-    current_hour = now.strftime("%Y-%m-%d-%H")
-    
-    # Reset hourly counter
-    if alert_data.get("hour") != current_hour:
-        alert_data["hour"] = current_hour
-        alert_data["triggers_this_hour"] = 0
-    
-    if alert_data["triggers_this_hour"] >= MAX_ALERTS_PER_HOUR:
-        log.info(f"Rate limited: {alert_data['triggers_this_hour']} triggers this hour")
+def get_detector():
+    """Process-wide MoveDetector, warmed from the last hour of the tick store
+    (or price_cache.json when there is no recorded history yet)."""
+    global _detector
+    if _detector is None:
+        from movement import MoveDetector, HORIZONS
+        _detector = MoveDetector(held_threshold=ALERT_THRESHOLD, trending_threshold=TRENDING_THRESHOLD)
+        now = time.time()
+        warmed = 0
+        try:
+            from tick_store import default_store
+            warmed = _detector.warm(default_store(), since=now - max(HORIZONS.values()))
+        except (ImportError, OSError, ValueError) as e:
+            log.warning(f"Tick history unavailable, starting cold: {e}")
+        if not warmed:
+            cache = load_price_cache()
+            if cache:
+                _detector.seed(cache, now - SCAN_INTERVAL)
+    return _detector
+
+
+def check_price_movements(current_prices, held_ids=(), detector=None):
+    """Feed this tick's prices to the rolling detector and return alerts.
+
+    Looks at 1m/5m/1h returns, volatility z-scores and volume spikes rather
+    than only the previous tick, so slow moves spread over several scans are
+    caught too. Held markets use ALERT_THRESHOLD, trending ones TRENDING_THRESHOLD.
+    """
+    return (detector or get_detector()).observe(current_prices, held_ids)
+
+
+def _recent_triggers(alert_data, now):
+    """Trigger epochs inside the sliding one-hour window (older ones are dropped)."""
+    times = [t for t in alert_data.get("trigger_times", []) if now - t < 3600]
+    alert_data["trigger_times"] = times
+    return times
+
+
+def should_trigger_trade(alert_data, now=None):
+    """Rate limit: at most MAX_ALERTS_PER_HOUR triggers in any rolling 60 minutes."""
+    now = time.time() if now is None else now
+    recent = _recent_triggers(alert_data, now)
+    if len(recent) >= MAX_ALERTS_PER_HOUR:
+        wait = 3600 - (now - recent[0])
+        log.info(f"Rate limited: {len(recent)} triggers in the last hour, next slot in {wait/60:.0f}m")
         return False
-    
     return True
 
 
+def record_trigger(alert_data, alerts, now=None):
+    """Book a trigger: rate-limit window, per-market cooldowns and the alert log."""
+    now = time.time() if now is None else now
+    _recent_triggers(alert_data, now).append(now)
+    index = _cooldown_index(alert_data)
+    for a in alerts:
+        index[a["market_id"]] = now
+    # 冷却期已过的市场不用再记，map 大小跟着活跃市场走
+    horizon = now - COOLDOWN_MINUTES * 60
+    alert_data["last_alert"] = {mid: t for mid, t in index.items() if t > horizon}
+    alert_data["last_trigger"] = datetime.fromtimestamp(now).isoformat()
+    # Keep last 200 alerts
+    alert_data["alerts"] = (alert_data.get("alerts", []) + alerts)[-200:]
+
 def trigger_trading_cycle(alerts):
     """Detect price movement → immediately execute trading cycle."""
     from auto_trader import run_trading_cycle
@@ -176,12 +219,39 @@ def trigger_trading_cycle(alerts):
     }
     
     trigger_file = os.path.join(os.path.dirname(__file__), "trigger_trade.json")
-    with open(trigger_file, "w") as f:
-        json.dump(trigger, f, indent=2, ensure_ascii=False)
+    with file_lock(trigger_file):
+        atomic_write_json(trigger_file, trigger, indent=2)
     
     return trigger_file
 
 
+def filter_cooldown(new_alerts, held_ids, alert_data, now=None):
+    """Drop alerts for markets still in cooldown and tag held positions."""
+    now = time.time() if now is None else now
+    last_alert = _cooldown_index(alert_data)
+    cooldown = COOLDOWN_MINUTES * 60
+    cooled_alerts = []
+    for a in new_alerts:
+        last = last_alert.get(a["market_id"])
+        if last is not None and now - last < cooldown:
+            continue
+        
+        # Held positions get priority
+        a["is_held"] = a["market_id"] in held_ids
+        cooled_alerts.append(a)
+    return cooled_alerts
+
+def process_alerts(new_alerts, held_ids, alert_data):
+    """Apply cooldown + rate limit and run a trading cycle. Returns True if triggered."""
+    cooled_alerts = filter_cooldown(new_alerts, held_ids, alert_data)
+    if not cooled_alerts or not should_trigger_trade(alert_data):
+        return False
+    trigger_trading_cycle(cooled_alerts)
+    record_trigger(alert_data, cooled_alerts)
+    save_alerts(alert_data)
+    return True
+
+
 def run_monitor_loop():
     """Main monitoring loop — runs forever."""
     log.info("=" * 50)
@@ -196,7 +266,6 @@ def run_monitor_loop():
         try:
             # 1. Load current state
             portfolio = load_portfolio()
-            cache = load_price_cache()
             alert_data = load_alerts()
             
             # 2. Get held market IDs
@@ -211,40 +280,11 @@ def run_monitor_loop():
                 continue
             
             # 4. Check for movements
-            new_alerts = check_price_movements(current_prices, cache)
-            
-            # 5. Filter for held positions (priority) and cooldown
-            now = datetime.now()
-            cooled_alerts = []
-            for a in new_alerts:
-                # Check cooldown
-                last_alert_time = None
-                for prev in alert_data.get("alerts", [])[-50:]:
-                    if prev["market_id"] == a["market_id"]:
-                        try:
-                            last_alert_time = datetime.fromisoformat(prev["time"])
-                        except:
-                            pass
-                
-                if last_alert_time and (now - last_alert_time).total_seconds() < COOLDOWN_MINUTES * 60:
-                    continue
-                
-                # Held positions get priority
-                a["is_held"] = a["market_id"] in held_ids
-                cooled_alerts.append(a)
+            new_alerts = check_price_movements(current_prices, held_ids)
             
-            # 6. Trigger if we have alerts
-            if cooled_alerts and should_trigger_trade(alert_data):
-                trigger_trading_cycle(cooled_alerts)
-                alert_data["triggers_this_hour"] = alert_data.get("triggers_this_hour", 0) + 1
-                alert_data["last_trigger"] = now.isoformat()
-                alert_data["alerts"] = alert_data.get("alerts", []) + cooled_alerts
-                # Keep last 200 alerts
-                alert_data["alerts"] = alert_data["alerts"][-200:]
-                save_alerts(alert_data)
-            else:
-                if not new_alerts:
-                    log.debug("No price movements detected")
+            # 5-6. Cooldown filter, then trigger
+            if not process_alerts(new_alerts, held_ids, alert_data) and not new_alerts:
+                log.debug("No price movements detected")
             
             # 7. Update cache
             save_price_cache(current_prices)
@@ -261,10 +301,98 @@ def run_monitor_loop():
         time.sleep(SCAN_INTERVAL)
 
 
+def _watch_markets(held_ids):
+    """Held markets (by id) plus the trending list — the set the stream subscribes to."""
+    from market_cache import get_markets
+    from market_data import get_markets_by_ids
+    markets = {}
+    if SCAN_TRENDING:
+        try:
+            markets.update({m["id"]: m for m in get_markets(100)})
+        except Exception as e:
+            log.error(f"Failed to fetch trending markets: {e}")
+    if held_ids:
+        try:
+            markets.update(get_markets_by_ids(held_ids))
+        except Exception as e:
+            log.error(f"Failed to fetch held markets: {e}")
+    return list(markets.values())
+
+
+def run_stream_monitor(connect=None, rounds=None):
+    """Event-driven monitor over the CLOB market websocket.
+
+    Prices live in memory; check_price_movements only sees the ids that just
+    changed and the rolling detector keeps their history across subscriptions.
+    price_cache.json is written at most once per SCAN_INTERVAL and only when
+    something changed.
+    The subscription is rebuilt every STREAM_RESUBSCRIBE seconds so newly
+    opened positions get picked up. `connect`/`rounds` let a replay drive it.
+    Alerts go to a single worker thread, so a trading cycle (blocking HTTP)
+    never stalls the websocket loop; cycles still run one at a time.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from price_stream import PriceBook, run_stream
+    from tick_store import record_prices
+    
+    log.info("=" * 50)
+    log.info("🔍 PolyClaw Price Monitor started (websocket stream)")
+    log.info(f"   Alert threshold: {ALERT_THRESHOLD*100}%")
+    log.info(f"   Max triggers/hour: {MAX_ALERTS_PER_HOUR}")
+    log.info("=" * 50)
+    
+    done = 0
+    while rounds is None or done < rounds:
+        done += 1
+        portfolio = load_portfolio()
+        alert_data = load_alerts()
+        held_ids = {pos["market_id"] for pos in portfolio.get("positions", {}).values()}
+        book = PriceBook(_watch_markets(held_ids))
+        if not book.tokens:
+            log.warning("Nothing to subscribe to, sleeping...")
+            time.sleep(SCAN_INTERVAL_FALLBACK)
+            continue
+        log.info(f"📡 Subscribed to {len(book.prices)} markets ({len(held_ids)} held)")
+        
+        detector = get_detector()
+        detector.observe(book.prices, held_ids)   # 订阅时的快照价也进历史
+        state = {"rolled": time.monotonic(), "dirty": False}
+        # alert_data 只在这个线程里读写（冷却 / 限频 / 交易），和事件循环不共享
+        worker = ThreadPoolExecutor(1, thread_name_prefix="alerts")
+        
+        def handle_alerts(new_alerts):
+            try:
+                process_alerts(new_alerts, held_ids, alert_data)
+            except Exception as e:
+                log.error(f"❌ Alert handling failed: {e}", exc_info=True)
+        
+        def on_change(changed, book):
+            current = {mid: book.prices[mid] for mid in changed}
+            record_prices(current)   # websocket 的价格不经过 market_data，单独落 tick store
+            new_alerts = check_price_movements(current, held_ids, detector)
+            if new_alerts:
+                worker.submit(handle_alerts, new_alerts)
+            state["dirty"] = True
+            now = time.monotonic()
+            if now - state["rolled"] >= SCAN_INTERVAL:
+                save_price_cache(book.prices)
+                state["rolled"], state["dirty"] = now, False
+        
+        try:
+            asyncio.run(run_stream(book, on_change, connect=connect,
+                                   duration=STREAM_RESUBSCRIBE if connect is None else None,
+                                   reconnect=connect is None))
+        finally:
+            worker.shutdown(wait=True)   # 下一轮重新 load_alerts 之前把排队的交易跑完
+        if state["dirty"]:
+            save_price_cache(book.prices)
+
+
 def run_once():
     """Single scan — useful for testing."""
     portfolio = load_portfolio()
-    cache = load_price_cache()
+    detector = get_detector()
     
     held_ids = {pos["market_id"] for pos in portfolio.get("positions", {}).values()}
     current_prices = fetch_market_prices(held_ids)
@@ -275,12 +403,13 @@ def run_once():
     
     print(f"📊 Scanned {len(current_prices)} markets, {len(held_ids)} held")
     
-    if cache:
-        alerts = check_price_movements(current_prices, cache)
+    if len(detector):
+        alerts = check_price_movements(current_prices, held_ids, detector)
         if alerts:
             print(f"\n🚨 {len(alerts)} price movements:")
             for a in alerts:
-                print(f"  {a['direction']} {a['question'][:50]} | {a['change_pct']:+.1f}%")
+                print(f"  {a['direction']} {a['question'][:50]} | {a['change_pct']:+.1f}% "
+                      f"[{a['horizon']} {a['signal']}]")
         else:
             print("✅ No significant movements")
     else:
@@ -292,5 +421,7 @@ def run_once():
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "once":
         run_once()
+    elif len(sys.argv) > 1 and sys.argv[1] == "stream":
+        run_stream_monitor()
     else:
         run_monitor_loop()
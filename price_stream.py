@@ -0,0 +1,206 @@
+"""CLOB market websocket price feed — 事件驱动，替代轮询
+
+订阅持仓+关注市场的 YES/NO token，价格常驻内存，
+每次推送只回调价格真正变化的 market_id。
+
+测试/回放: run_stream(..., connect=replay_connect(messages)) 用录制的消息驱动，
+不需要网络。
+"""
+import asyncio, json, logging, os, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+CLOB_WS_URL = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+PING_INTERVAL = 10          # 服务端要求客户端定期发 PING
+RECONNECT_DELAY = 2         # 断线重连起始间隔（指数退避）
+RECONNECT_DELAY_MAX = 60
+MAX_SPREAD_FOR_MID = 0.10   # 价差太大时用成交价而不是中间价（和Gamma展示价一致）
+
+log = logging.getLogger("price_stream")
+
+
+class PriceBook:
+    """In-memory prices keyed by market_id, in the price_cache.json entry format."""
+
+    def __init__(self, markets=()):
+        self.prices = {}        # market_id -> {"yes", "no", "question", "volume_24h"}
+        self.tokens = {}        # token_id -> (market_id, "yes" | "no")
+        self.quotes = {}        # token_id -> {"bid", "ask", "last"}
+        for m in markets:
+            self.add_market(m)
+
+    def add_market(self, m):
+        tokens = m.get("clob_token_ids") or []
+        if len(tokens) < 2:
+            return
+        self.tokens[str(tokens[0])] = (m["id"], "yes")
+        self.tokens[str(tokens[1])] = (m["id"], "no")
+        self.prices[m["id"]] = {
+            "yes": m["outcome_yes"],
+            "no": m["outcome_no"],
+            "question": m["question"],
+            "volume_24h": m["volume_24h"],
+        }
+
+    def asset_ids(self):
+        return list(self.tokens)
+
+    def _price_for(self, token_id):
+        q = self.quotes.get(token_id, {})
+        bid, ask, last = q.get("bid"), q.get("ask"), q.get("last")
+        if bid is not None and ask is not None and ask - bid <= MAX_SPREAD_FOR_MID:
+            return round((bid + ask) / 2, 4)
+        if last is not None:
+            return last
+        if bid is not None and ask is not None:
+            return round((bid + ask) / 2, 4)
+        return None
+
+    def _update_quote(self, token_id, **fields):
+        q = self.quotes.setdefault(token_id, {})
+        for k, v in fields.items():
+            if v is not None:
+                q[k] = float(v)
+
+    def _apply_token(self, token_id):
+        """Recompute the market price after a quote change; return market_id if it moved."""
+        if token_id not in self.tokens:
+            return None
+        price = self._price_for(token_id)
+        if price is None:
+            return None
+        mid, side = self.tokens[token_id]
+        entry = self.prices[mid]
+        yes = price if side == "yes" else round(1 - price, 4)
+        if abs(entry["yes"] - yes) < 1e-9:
+            return None
+        entry["yes"], entry["no"] = yes, round(1 - yes, 4)
+        return mid
+
+    def handle_message(self, raw):
+        """Apply one websocket frame; return the set of market_ids whose price changed."""
+        if isinstance(raw, (bytes, bytearray)):
+            raw = raw.decode()
+        if isinstance(raw, str):
+            if raw in ("PONG", "PING", ""):
+                return set()
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                return set()
+        events = raw if isinstance(raw, list) else [raw]
+        touched = []
+        for ev in events:
+            etype = ev.get("event_type")
+            if etype == "book":
+                bids = ev.get("bids") or ev.get("buys") or []
+                asks = ev.get("asks") or ev.get("sells") or []
+                token = str(ev.get("asset_id"))
+                self._update_quote(
+                    token,
+                    bid=max((float(b["price"]) for b in bids), default=None),
+                    ask=min((float(a["price"]) for a in asks), default=None),
+                )
+                touched.append(token)
+            elif etype == "price_change":
+                for ch in ev.get("price_changes") or ev.get("changes") or []:
+                    token = str(ch.get("asset_id") or ev.get("asset_id"))
+                    self._update_quote(token, bid=ch.get("best_bid"), ask=ch.get("best_ask"))
+                    touched.append(token)
+            elif etype == "last_trade_price":
+                token = str(ev.get("asset_id"))
+                self._update_quote(token, last=ev.get("price"))
+                touched.append(token)
+        changed = set()
+        for token in touched:
+            mid = self._apply_token(token)
+            if mid is not None:
+                changed.add(mid)
+        return changed
+
+
+def replay_connect(messages, delay=0.0):
+    """Stand-in for websockets.connect that replays recorded frames, then closes.
+
+    `messages` is an iterable of frames (str/dict/list) or a path to a JSONL
+    recording with one frame per line.
+    """
+    if isinstance(messages, str):
+        with open(messages) as f:
+            messages = [line.strip() for line in f if line.strip()]
+    frames = [m if isinstance(m, str) else json.dumps(m) for m in messages]
+
+    class _ReplaySocket:
+        def __init__(self):
+            self.sent = []
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def send(self, msg):
+            self.sent.append(msg)
+
+        def __aiter__(self):
+            return self._frames()
+
+        async def _frames(self):
+            for frame in frames:
+                if delay:
+                    await asyncio.sleep(delay)
+                yield frame
+
+    def connect(url, **kwargs):
+        return _ReplaySocket()
+    return connect
+
+
+async def _pinger(ws):
+    while True:
+        await asyncio.sleep(PING_INTERVAL)
+        await ws.send("PING")
+
+
+async def run_stream(book, on_change, connect=None, url=CLOB_WS_URL,
+                     duration=None, reconnect=True):
+    """Subscribe to every token in `book` and call on_change(changed_ids, book)
+    whenever prices move. Returns after `duration` seconds (None = forever), or
+    when the socket closes and reconnect=False. on_change may be a coroutine."""
+    if connect is None:
+        import websockets
+        connect = websockets.connect
+    deadline = time.monotonic() + duration if duration else None
+    delay = RECONNECT_DELAY
+
+    async def consume():
+        nonlocal delay
+        async with connect(url) as ws:
+            await ws.send(json.dumps({"assets_ids": book.asset_ids(), "type": "market"}))
+            pinger = asyncio.create_task(_pinger(ws))
+            try:
+                delay = RECONNECT_DELAY
+                async for raw in ws:
+                    changed = book.handle_message(raw)
+                    if changed:
+                        result = on_change(changed, book)
+                        if asyncio.iscoroutine(result):
+                            await result
+            finally:
+                pinger.cancel()
+
+    while True:
+        remaining = deadline - time.monotonic() if deadline else None
+        if remaining is not None and remaining <= 0:
+            return
+        try:
+            await asyncio.wait_for(consume(), remaining)
+        except asyncio.TimeoutError:
+            return
+        except Exception as e:
+            log.warning(f"Price stream disconnected: {e}")
+        if not reconnect:
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RECONNECT_DELAY_MAX)
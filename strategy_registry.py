@@ -0,0 +1,163 @@
+"""Strategy registry — 策略接口 + 注册表 + 声明式配置
+
+auto_trader 的四个内置策略（fear / hp / momentum / ls）都是 Strategy 子类，
+用 @register 登记。交易周期只认这个接口：
+- scan(ctx, cfg)          → [(score, market, side), ...]，按优先度排好
+- order_size(balance, cfg) / entry_price(market, side) → 下单金额 / 价格
+- exit_levels(cfg)        → (止盈, 止损)
+- resting                 → True 时下限价挂单，否则吃单（只影响 book 成交模型，见 execution_sim.py）
+
+部署时用 strategies.yaml / strategies.json（或 POLYCLAW_STRATEGIES 指定的路径）
+启停、排序、调参，不用改代码：
+
+    strategies:
+      - name: fear
+        params: {FEAR_POSITION_PCT: 0.10}     # 只对这个策略生效的常量覆盖
+      - name: hp
+        enabled: false
+      - name: ls
+        max_new: 1                            # 每周期最多开几个
+      - name: meanrev                         # 第五个策略：指向任意模块里的 Strategy 子类
+        class: my_strategies:MeanReversion
+
+列表顺序就是分配优先级；没写进配置的已注册策略按默认顺序排在后面。
+没有配置文件时就是四个内置策略的默认行为。YAML 需要 PyYAML，JSON 不需要。
+"""
+import importlib, json, os
+from types import SimpleNamespace
+
+CONFIG_FILE = os.environ.get("POLYCLAW_STRATEGIES") or os.path.join(os.path.dirname(__file__), "strategies.yaml")
+ENTRY_KEYS = {"name", "enabled", "class", "params", "max_new", "min_order", "topic_exempt"}
+
+REGISTRY = {}   # name -> Strategy 子类（注册顺序 = 默认优先级）
+
+
+def register(cls):
+    if not cls.name:
+        raise ValueError(f"{cls.__name__} needs a name")
+    REGISTRY[cls.name] = cls
+    return cls
+
+
+class Strategy:
+    name = ""
+    emoji = "📈"
+    label = ""
+    key_prefix = None       # 持仓 key 前缀，默认 = name
+    size_pct = None         # cfg 常量名：仓位占余额比例
+    take_profit = None      # cfg 常量名
+    stop_loss = None        # cfg 常量名
+    max_positions = None    # cfg 常量名：同时持仓上限（None = 只受 MAX_POSITIONS 限制）
+    min_order = 30          # 下单金额低于这个就停止本策略本轮开仓
+    max_new = 2             # 每周期最多开几个
+    topic_exempt = False    # True = 不受同主题限制
+    resting = False         # True = 挂限价单（GTC），book 成交模型下没成交的部分留到后面的 tick
+    price_fmt = ".0f"       # 开仓动作里价格（¢）的格式
+
+    def __init__(self, params=None, max_new=None, min_order=None, topic_exempt=None):
+        self.params = dict(params or {})
+        if max_new is not None:
+            self.max_new = max_new
+        if min_order is not None:
+            self.min_order = min_order
+        if topic_exempt is not None:
+            self.topic_exempt = topic_exempt
+        self._cfg = (None, None)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name}>"
+
+    @property
+    def prefix(self):
+        return self.key_prefix or self.name
+
+    def config(self, cfg):
+        """cfg with this strategy's params layered on top (cached per base cfg)."""
+        if not self.params:
+            return cfg
+        base, derived = self._cfg
+        if base is not cfg:
+            derived = SimpleNamespace(**{**vars(cfg), **self.params})
+            self._cfg = (cfg, derived)
+        return derived
+
+    def scan(self, ctx, cfg):
+        raise NotImplementedError
+
+    def order_size(self, balance, cfg):
+        return round(min(balance * getattr(cfg, self.size_pct), balance - cfg.MIN_RESERVE), 2)
+
+    def entry_price(self, m, side):
+        """Fill price for a proposal, or None to skip it."""
+        price = m["outcome_yes"] if side == "yes" else m["outcome_no"]
+        return price if 0 < price < 1 else None
+
+    def exit_levels(self, cfg):
+        return getattr(cfg, self.take_profit), getattr(cfg, self.stop_loss)
+
+    def position_cap(self, cfg):
+        return getattr(cfg, self.max_positions) if self.max_positions else None
+
+
+def load_config(path=None):
+    """Parsed strategy config, or {} when the file doesn't exist."""
+    path = path or CONFIG_FILE
+    if not os.path.exists(path):
+        alt = os.path.splitext(path)[0] + ".json"
+        if path.endswith((".yaml", ".yml")) and os.path.exists(alt):
+            path = alt
+        else:
+            return {}
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(f"{path} needs PyYAML (pip install pyyaml) — or use a .json config")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def _resolve_class(spec):
+    module, _, attr = spec.partition(":")
+    cls = getattr(importlib.import_module(module), attr)
+    if not (isinstance(cls, type) and issubclass(cls, Strategy)):
+        raise TypeError(f"{spec} is not a Strategy subclass")
+    return cls
+
+
+def build(config, known_params=None):
+    """Instantiate enabled strategies in priority order from a parsed config.
+
+    known_params: names params may override (the engine's cfg constants);
+    unknown names raise KeyError so a typo doesn't silently run the default.
+    """
+    entries = config.get("strategies", []) if isinstance(config, dict) else config
+    strategies, seen = [], set()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        unknown = entry.keys() - ENTRY_KEYS
+        if unknown:
+            raise ValueError(f"strategy {entry.get('name')!r}: unknown key(s) {', '.join(sorted(unknown))}")
+        name = entry["name"]
+        if name in seen:
+            raise ValueError(f"strategy {name!r} listed twice")
+        seen.add(name)
+        cls = _resolve_class(entry["class"]) if "class" in entry else REGISTRY.get(name)
+        if cls is None:
+            raise KeyError(f"unknown strategy {name!r} (registered: {', '.join(REGISTRY)})")
+        params = entry.get("params") or {}
+        if known_params is not None and "class" not in entry:
+            bad = params.keys() - known_params
+            if bad:
+                raise KeyError(f"strategy {name!r}: unknown param(s) {', '.join(sorted(bad))}")
+        if not entry.get("enabled", True):
+            continue
+        s = cls(params, entry.get("max_new"), entry.get("min_order"), entry.get("topic_exempt"))
+        s.name = name
+        strategies.append(s)
+    for name, cls in REGISTRY.items():
+        if name not in seen:
+            strategies.append(cls())
+    return strategies
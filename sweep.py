@@ -0,0 +1,191 @@
+"""Parameter sweep — 多进程网格搜索策略常量
+
+    python sweep.py <snapshots> FEAR_POSITION_PCT=0.08,0.12,0.16 HP_MIN_PRICE=0.85:0.90:0.01 \
+        [--workers N] [--top 20] [--out sweep_result.json]
+
+每个参数写成 NAME=v1,v2,... 或 NAME=start:stop:step（含 stop），名字必须是 auto_trader 的常量。
+所有组合的笛卡尔积分给 ProcessPoolExecutor，每个组合是一次 backtest.run_backtest，
+参数通过显式的 cfg（auto_trader._config(**overrides)）传进去，不改模块全局变量。
+
+快照只解析一次，转成列式 .npy（时间偏移 + 每行 市场序号/yes/no/量/流动性），
+worker 用 np.load(mmap_mode="r") 映射同一份文件 —— 数据不随任务 pickle，
+多个 worker 共享操作系统页缓存。
+"""
+import itertools, os, shutil, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+import auto_trader
+import backtest
+
+COLUMNS = ("market", "yes", "no", "volume", "liquidity")
+SORT_KEYS = ("sharpe", "total_pnl", "win_rate", "max_drawdown_pct")
+
+_dataset = None   # worker 进程里的 SnapshotArrays
+_tape = None      # worker 进程里的 backtest.AlertTape（动量警报每个 worker 只算一遍）
+
+
+class SnapshotArrays:
+    """Snapshot frames stored column-wise in .npy files, opened as read-only memmaps."""
+
+    def __init__(self, directory, times, ids, questions):
+        self.directory = directory
+        self.times = times
+        self.ids = ids
+        self.questions = questions
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.cols = {c: np.load(os.path.join(directory, f"{c}.npy"), mmap_mode="r") for c in COLUMNS}
+
+    @classmethod
+    def build(cls, snapshots, directory):
+        """Parse snapshots once and write the column files into `directory`."""
+        times, offsets = [], [0]
+        ids, questions, slot = [], [], {}
+        rows = {c: [] for c in COLUMNS}
+        for snap in snapshots:
+            times.append(snap["time"])
+            for m in snap["markets"]:
+                i = slot.get(m["id"])
+                if i is None:
+                    i = slot[m["id"]] = len(ids)
+                    ids.append(m["id"])
+                    questions.append(m["question"])
+                rows["market"].append(i)
+                rows["yes"].append(m["outcome_yes"])
+                rows["no"].append(m["outcome_no"])
+                rows["volume"].append(m.get("volume_24h", 0))
+                rows["liquidity"].append(m.get("liquidity", 0))
+            offsets.append(len(rows["market"]))
+        np.save(os.path.join(directory, "offsets.npy"), np.asarray(offsets, np.int64))
+        np.save(os.path.join(directory, "market.npy"), np.asarray(rows.pop("market"), np.int32))
+        for c, values in rows.items():
+            np.save(os.path.join(directory, f"{c}.npy"), np.asarray(values, np.float64))
+        return cls(directory, times, ids, questions)
+
+    def __len__(self):
+        return len(self.times)
+
+    def frames(self):
+        """Yield {"time", "markets"} dicts rebuilt from the mapped columns."""
+        ids, questions = self.ids, self.questions
+        c = self.cols
+        for k, when in enumerate(self.times):
+            lo, hi = int(self.offsets[k]), int(self.offsets[k + 1])
+            markets = [
+                {"id": ids[i], "question": questions[i], "outcome_yes": y, "outcome_no": n,
+                 "volume_24h": v, "liquidity": l}
+                for i, y, n, v, l in zip(c["market"][lo:hi].tolist(), c["yes"][lo:hi].tolist(),
+                                         c["no"][lo:hi].tolist(), c["volume"][lo:hi].tolist(),
+                                         c["liquidity"][lo:hi].tolist())
+            ]
+            yield {"time": when, "markets": markets}
+
+
+def parse_values(spec):
+    """'0.1,0.2' -> [0.1, 0.2]; '0.85:0.9:0.01' -> inclusive range; ints stay ints."""
+    def num(s):
+        s = s.strip()
+        if s.lower() in ("true", "false"):
+            return s.lower() == "true"
+        return int(s) if s.lstrip("-").isdigit() else float(s)
+
+    if ":" in spec:
+        start, stop, step = (num(x) for x in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"range step must be > 0: {spec}")
+        out, k = [], 0
+        while start + k * step <= stop + 1e-9:
+            v = start + k * step
+            out.append(v if isinstance(v, int) else round(v, 10))
+            k += 1
+        return out
+    return [num(x) for x in spec.split(",") if x.strip()]
+
+
+def expand_grid(params):
+    """{name: [values]} -> list of override dicts, skipping impossible HP/LS price bands."""
+    names = list(params)
+    defaults = auto_trader._config()
+    grid = []
+    for combo in itertools.product(*(params[n] for n in names)):
+        overrides = dict(zip(names, combo))
+        get = lambda k: overrides.get(k, getattr(defaults, k))
+        if get("HP_MIN_PRICE") > get("HP_MAX_PRICE") or get("LS_MIN_PRICE") > get("LS_MAX_PRICE"):
+            continue
+        grid.append(overrides)
+    return grid
+
+
+def _init_worker(directory, times, ids, questions):
+    global _dataset, _tape
+    _dataset = SnapshotArrays(directory, times, ids, questions)
+    _tape = backtest.AlertTape()
+
+
+def _run_trial(overrides):
+    result = backtest.run_backtest(_dataset.frames(), cfg=auto_trader._config(**overrides), tape=_tape)
+    result.pop("equity")
+    return {"params": overrides, **result}
+
+
+def run_sweep(snapshots, params, workers=None, sort_key="sharpe"):
+    """Backtest every combination in `params` across a process pool; best first by sort_key."""
+    grid = expand_grid(params)
+    auto_trader._config(**{k: v[0] for k, v in params.items() if v})   # 名字拼错在主进程就报错
+    directory = tempfile.mkdtemp(prefix="polyclaw_sweep_")
+    try:
+        data = SnapshotArrays.build(snapshots, directory)
+        init = (directory, data.times, data.ids, data.questions)
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=_init_worker, initargs=init) as pool:
+            results = list(pool.map(_run_trial, grid))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    reverse = sort_key != "max_drawdown_pct"
+    return sorted(results, key=lambda r: r[sort_key], reverse=reverse)
+
+
+def _print_table(results, top):
+    print(f"{'#':>3} {'Sharpe':>7} {'PnL%':>8} {'maxDD%':>7} {'win%':>6} {'trades':>7}  params")
+    for rank, r in enumerate(results[:top], 1):
+        params = " ".join(f"{k}={v}" for k, v in r["params"].items())
+        print(f"{rank:>3} {r['sharpe']:>7.2f} {r['total_pnl_pct']:>8.2f} {r['max_drawdown_pct']:>7.2f} "
+              f"{r['win_rate']:>6.1f} {r['trades']:>7}  {params}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or "=" in args[0]:
+        print("Usage: python sweep.py <snapshots.jsonl|dir> NAME=v1,v2|start:stop:step ... "
+              "[--workers N] [--top N] [--sort sharpe|total_pnl|win_rate|max_drawdown_pct] [--out file]")
+        sys.exit(1)
+
+    def opt(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    params = {}
+    for a in args[1:]:
+        if "=" in a and not a.startswith("--"):
+            name, spec = a.split("=", 1)
+            params[name.strip().upper()] = parse_values(spec)
+    try:
+        auto_trader._config(**{k: v[0] for k, v in params.items()})
+    except KeyError as e:
+        print(f"❌ {e.args[0]}")
+        sys.exit(1)
+    sort_key = opt("--sort", "sharpe")
+    if sort_key not in SORT_KEYS:
+        print(f"❌ --sort must be one of {', '.join(SORT_KEYS)}")
+        sys.exit(1)
+
+    t0 = time.time()
+    results = run_sweep(backtest.load_snapshots(args[0]), params,
+                        workers=int(opt("--workers", 0)) or None, sort_key=sort_key)
+    print(f"🔬 {len(results)} configs in {time.time() - t0:.1f}s")
+    _print_table(results, int(opt("--top", 20)))
+    if opt("--out"):
+        from atomic_io import atomic_write_json
+        atomic_write_json(opt("--out"), results, indent=2)
+        print(f"saved → {opt('--out')}")
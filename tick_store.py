@@ -0,0 +1,273 @@
+"""Columnar tick store — 每次看到的市场价格都落盘，按日期分区
+
+以前只保留上一帧（price_cache.json / market_snapshot.json），每个tick覆盖，
+动量回看、波动率、回测都没有数据。这里把每个观测到的
+(ts, market, yes, no, volume_24h, liquidity) 追加到 ticks/ 下：
+
+- ticks/YYYY-MM-DD.bin   当天（UTC）的定长二进制记录，只追加，可直接 np.memmap
+- ticks/YYYY-MM-DD.npz   过了当天后压缩成列式 npz，按 (market, ts) 排序，按市场读是二分切片
+- ticks/symbols.txt      market_id 符号表，行号 = 记录里的 market 列
+
+写入不在内存里攒数据（每批直接 append 到文件），连续录几周内存也是平的。
+多个进程（monitor / cron / Flask）同时写时，每个分区和符号表各自用 file_lock 串行化。
+POLYCLAW_TICKS=0 关闭记录。
+"""
+import os, sys, time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+from atomic_io import file_lock
+
+TICK_DIR = os.path.join(os.path.dirname(__file__), "ticks")
+RECORD_TICKS = os.environ.get("POLYCLAW_TICKS", "1") != "0"
+
+TICK_DTYPE = np.dtype([
+    ("ts", "<f8"), ("market", "<i4"), ("yes", "<f8"), ("no", "<f8"),
+    ("volume", "<f8"), ("liquidity", "<f8"),
+])
+COLUMNS = TICK_DTYPE.names
+
+
+def _epoch(t):
+    if t is None or isinstance(t, (int, float)):
+        return t
+    if t.tzinfo is None:
+        return t.timestamp()
+    return t.astimezone(timezone.utc).timestamp()
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+class TickStore:
+    def __init__(self, directory=TICK_DIR):
+        self.directory = directory
+        self.symbol_file = os.path.join(directory, "symbols.txt")
+        self._slots = {}        # market_id -> slot
+        self._ids = []          # slot -> market_id
+        self._symbols_read = 0  # 已读到的符号表字节数
+        self._compacted_day = None
+
+    # ---------- 符号表 ----------
+    def _read_symbols(self):
+        if not os.path.exists(self.symbol_file):
+            return
+        with open(self.symbol_file, encoding="utf-8") as f:
+            f.seek(self._symbols_read)
+            chunk = f.read()
+        # 只消费完整的行，半行留到下次
+        complete = chunk[:chunk.rfind("\n") + 1]
+        for mid in complete.splitlines():
+            self._slots[mid] = len(self._ids)
+            self._ids.append(mid)
+        self._symbols_read += len(complete.encode("utf-8"))
+
+    def slots(self, market_ids):
+        """market_id -> slot for every id, assigning new slots under the symbol lock."""
+        market_ids = [str(mid) for mid in market_ids]
+        missing = [mid for mid in market_ids if mid not in self._slots]
+        if missing:
+            os.makedirs(self.directory, exist_ok=True)
+            with file_lock(self.symbol_file):
+                self._read_symbols()
+                new = list(dict.fromkeys(mid for mid in missing if mid not in self._slots))
+                if new:
+                    with open(self.symbol_file, "a", encoding="utf-8") as f:
+                        f.write("".join(f"{mid}\n" for mid in new))
+                    self._read_symbols()
+        return [self._slots[mid] for mid in market_ids]
+
+    def market_id(self, slot):
+        if slot >= len(self._ids):
+            self._read_symbols()
+        return self._ids[slot]
+
+    def slot(self, market_id):
+        """Slot of a known market id, or None if it was never recorded."""
+        market_id = str(market_id)
+        if market_id not in self._slots:
+            self._read_symbols()
+        return self._slots.get(market_id)
+
+    # ---------- 写入 ----------
+    def append(self, rows, ts=None):
+        """Append ticks. rows: iterable of (market_id, yes, no, volume_24h, liquidity)."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        ts = _epoch(ts) if ts is not None else time.time()
+        day = _day(ts)
+        if self._compacted_day != day:
+            self.compact(before=day)
+            self._compacted_day = day
+
+        rec = np.empty(len(rows), TICK_DTYPE)
+        rec["ts"] = ts
+        rec["market"] = self.slots(r[0] for r in rows)
+        for k, col in enumerate(("yes", "no", "volume", "liquidity"), 1):
+            rec[col] = [np.nan if r[k] is None else r[k] for r in rows]
+
+        path = os.path.join(self.directory, f"{day}.bin")
+        with file_lock(path):
+            with open(path, "ab") as f:
+                f.write(rec.tobytes())
+        return len(rec)
+
+    def record_markets(self, markets, ts=None):
+        """Append one tick per normalized market dict (market_data._normalize format)."""
+        return self.append(((m["id"], m["outcome_yes"], m["outcome_no"],
+                             m.get("volume_24h"), m.get("liquidity")) for m in markets), ts)
+
+    def record_prices(self, prices, ts=None):
+        """Append ticks from a price_cache-style {market_id: {"yes", "no", "volume_24h"}} dict."""
+        return self.append(((mid, p["yes"], p["no"], p.get("volume_24h"), p.get("liquidity"))
+                            for mid, p in prices.items()), ts)
+
+    # ---------- 压缩 ----------
+    def partitions(self):
+        """Sorted day strings that have any data."""
+        if not os.path.isdir(self.directory):
+            return []
+        days = {fn[:10] for fn in os.listdir(self.directory) if fn.endswith((".bin", ".npz"))}
+        return sorted(days)
+
+    def compact(self, before=None):
+        """Fold raw .bin partitions older than `before` (default: today UTC) into sorted .npz."""
+        before = before or _day(time.time())
+        done = []
+        for day in self.partitions():
+            if day >= before:
+                continue
+            raw = os.path.join(self.directory, f"{day}.bin")
+            if not os.path.exists(raw):
+                continue
+            with file_lock(raw):
+                if not os.path.exists(raw):
+                    continue
+                data = self._read_raw(raw)
+                old = self._read_npz(os.path.join(self.directory, f"{day}.npz"))
+                if old is not None:
+                    data = np.concatenate([old, data])
+                data = data[np.lexsort((data["ts"], data["market"]))]
+                self._write_npz(day, data)
+                os.remove(raw)
+            done.append(day)
+        return done
+
+    def _write_npz(self, day, data):
+        path = os.path.join(self.directory, f"{day}.npz")
+        tmp = os.path.join(self.directory, f".{day}.npz.tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **{c: data[c] for c in COLUMNS})
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # ---------- 读取 ----------
+    @staticmethod
+    def _read_raw(path):
+        n = os.path.getsize(path) // TICK_DTYPE.itemsize   # 忽略写了一半的尾记录
+        if n == 0:
+            return np.empty(0, TICK_DTYPE)
+        return np.memmap(path, TICK_DTYPE, mode="r", shape=(n,))
+
+    @staticmethod
+    def _read_npz(path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            out = np.empty(len(z["ts"]), TICK_DTYPE)
+            for c in COLUMNS:
+                out[c] = z[c]
+        return out
+
+    def read(self, market_id=None, start=None, end=None):
+        """Ticks in [start, end] (epoch seconds or datetime), optionally for one market, sorted by ts."""
+        start, end = _epoch(start), _epoch(end)
+        slot = None
+        if market_id is not None:
+            slot = self.slot(market_id)
+            if slot is None:
+                return np.empty(0, TICK_DTYPE)
+        first = _day(start) if start is not None else None
+        last = _day(end) if end is not None else None
+        parts = []
+        for day in self.partitions():
+            if (first and day < first) or (last and day > last):
+                continue
+            npz = self._read_npz(os.path.join(self.directory, f"{day}.npz"))
+            if npz is not None:
+                if slot is not None:
+                    lo, hi = np.searchsorted(npz["market"], [slot, slot + 1])
+                    npz = npz[lo:hi]
+                parts.append(npz)
+            raw = os.path.join(self.directory, f"{day}.bin")
+            if os.path.exists(raw):
+                mm = self._read_raw(raw)
+                parts.append(mm[mm["market"] == slot] if slot is not None else np.array(mm))
+        if not parts:
+            return np.empty(0, TICK_DTYPE)
+        data = np.concatenate(parts)
+        mask = np.ones(len(data), bool)
+        if start is not None:
+            mask &= data["ts"] >= start
+        if end is not None:
+            mask &= data["ts"] <= end
+        data = data[mask]
+        return data[np.argsort(data["ts"], kind="stable")]
+
+    def series(self, market_id, start=None, end=None, column="yes"):
+        """(ts, values) arrays for one market — the lookback input for momentum/volatility."""
+        data = self.read(market_id, start, end)
+        return data["ts"], data[column]
+
+
+_default = None
+
+
+def default_store():
+    global _default
+    if _default is None:
+        _default = TickStore()
+    return _default
+
+
+def record_markets(markets, ts=None):
+    """Best-effort hook for fetchers: never lets a disk problem break a price fetch."""
+    if not RECORD_TICKS or not markets:
+        return
+    try:
+        default_store().record_markets(markets, ts)
+    except OSError:
+        pass
+
+
+def record_prices(prices, ts=None):
+    if not RECORD_TICKS or not prices:
+        return
+    try:
+        default_store().record_prices(prices, ts)
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    store = default_store()
+    args = sys.argv[1:]
+    if args and args[0] == "compact":
+        print(f"compacted: {store.compact() or 'nothing'}")
+    elif args and args[0] == "show" and len(args) > 1:
+        hours = float(args[2]) if len(args) > 2 else 24
+        ts, yes = store.series(args[1], start=time.time() - hours * 3600)
+        for t, y in zip(ts[-20:], yes[-20:]):
+            print(f"{datetime.fromtimestamp(t).strftime('%m-%d %H:%M:%S')}  {y*100:6.2f}¢")
+        print(f"{len(ts)} ticks in the last {hours:g}h")
+    else:
+        for day in store.partitions():
+            files = [fn for fn in (f"{day}.bin", f"{day}.npz") if os.path.exists(os.path.join(store.directory, fn))]
+            size = sum(os.path.getsize(os.path.join(store.directory, fn)) for fn in files)
+            print(f"{day}  {'+'.join(f[-3:] for f in files):8}  {size/1024:8.1f} KB")
+        print("Usage: python tick_store.py [compact | show <market_id> [hours]]")
@@ -0,0 +1,250 @@
+"""Append-only trade journal + compact portfolio state
+
+auto_portfolio.json 以前每轮都带着全部 history 整体重写。现在拆成两份：
+- auto_portfolio.json: 只放余额/持仓/日快照等小状态，每次保存整体重写（无缩进）
+- auto_trades.jsonl:   交易记录，一行一笔，只追加不重写
+
+data["history"] 换成 TradeJournal，接口和 list 一样（append / len / 迭代 / 切片），
+但只有真正需要全量数据时才读文件；len() 是 O(1)，history[-20:] 和 since()
+从文件尾部倒着读，和历史长度无关。
+
+journal 超过 JOURNAL_SEGMENT_BYTES 时压缩归档成 auto_trades.jsonl.000001.gz，
+当前文件清空重新开始，所以追加和读尾部的成本不会随历史增长。
+
+旧格式（history 内嵌在 state 里）第一次 load 时自动迁移到 journal。
+"""
+import glob, gzip, json, os, shutil, sys
+from collections.abc import Sequence
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+from atomic_io import atomic_write_json, file_lock
+
+READ_BLOCK = 64 * 1024
+JOURNAL_SEGMENT_BYTES = 8 * 1024 * 1024   # 活跃 journal 超过 8MB 就归档压缩
+
+
+def _iter_lines_reversed(path):
+    """Yield non-empty lines of a file from last to first, reading fixed-size blocks."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b""
+        while pos > 0:
+            step = min(READ_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            lines = buf.split(b"\n")
+            buf = lines[0]
+            for line in reversed(lines[1:]):
+                if line.strip():
+                    yield line
+        if buf.strip():
+            yield buf
+
+
+def _open_lines(path):
+    opener = gzip.open if path.endswith(".gz") else open
+    return opener(path, "rb")
+
+
+def _count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with _open_lines(path) as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _parse(line):
+    """Decode one journal line; None for blanks or a line another process is still appending."""
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _segments(path):
+    """Sealed, gzipped segments of a journal, oldest first."""
+    return sorted(glob.glob(glob.escape(path) + ".*.gz"))
+
+
+def summarize_sells(sells):
+    """Win/loss/realized totals plus per-strategy stats, same rules as the weekly report."""
+    wins = losses = 0
+    realized = 0
+    by_strategy = {}
+    for s in sells:
+        profit = s.get("profit", 0)
+        if profit > 0:
+            wins += 1
+        elif profit < 0:
+            losses += 1
+        realized += profit
+        st = by_strategy.setdefault(s.get("strategy", "unknown"), {"wins": 0, "losses": 0, "profit": 0})
+        if profit > 0:
+            st["wins"] += 1
+        else:
+            st["losses"] += 1
+        st["profit"] += profit
+    return {"wins": wins, "losses": losses, "realized": realized, "by_strategy": by_strategy}
+
+
+class TradeJournal(Sequence):
+    """List-like view over an append-only JSONL trade log.
+
+    New entries are buffered by append() and written by flush(), which is
+    what save() calls — so a cycle that never saves leaves the file untouched.
+    """
+
+    def __init__(self, path, count=None):
+        self.path = path
+        if count is None:
+            count = sum(_count_lines(p) for p in _segments(path) + [path])
+        self._count = count
+        self._pending = []
+
+    def append(self, entry):
+        self._pending.append(entry)
+
+    def extend(self, entries):
+        self._pending.extend(entries)
+
+    def flush(self):
+        if not self._pending:
+            return
+        lines = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in self._pending)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._count += len(self._pending)
+        self._pending = []
+
+    def compact(self, max_bytes=None):
+        """Seal the active file into the next gzip segment once it grows past max_bytes."""
+        max_bytes = JOURNAL_SEGMENT_BYTES if max_bytes is None else max_bytes
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < max_bytes:
+            return None
+        segment = f"{self.path}.{len(_segments(self.path)) + 1:06d}.gz"
+        with open(self.path, "rb") as src, gzip.open(segment + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(segment + ".tmp", segment)
+        os.truncate(self.path, 0)
+        return segment
+
+    def __len__(self):
+        return self._count + len(self._pending)
+
+    def __iter__(self):
+        for path in _segments(self.path) + [self.path]:
+            if not os.path.exists(path):
+                continue
+            with _open_lines(path) as f:
+                for line in f:
+                    entry = _parse(line)
+                    if entry is not None:
+                        yield entry
+        yield from list(self._pending)
+
+    def reversed(self):
+        """Newest first, reading the active file from the end."""
+        yield from reversed(self._pending)
+        for line in _iter_lines_reversed(self.path):
+            entry = _parse(line)
+            if entry is not None:
+                yield entry
+        for segment in reversed(_segments(self.path)):
+            with _open_lines(segment) as f:
+                lines = [line for line in f if line.strip()]
+            for line in reversed(lines):
+                yield json.loads(line)
+
+    def tail(self, n):
+        """Last n entries in chronological order."""
+        out = []
+        for entry in self.reversed():
+            if len(out) >= n:
+                break
+            out.append(entry)
+        return out[::-1]
+
+    def since(self, cutoff):
+        """Entries whose "time" is at or after cutoff (datetime), oldest first."""
+        out = []
+        for entry in self.reversed():
+            try:
+                if datetime.fromisoformat(entry["time"]) < cutoff:
+                    break
+            except (KeyError, ValueError):
+                continue
+            out.append(entry)
+        return out[::-1]
+
+    def sell_summary(self):
+        return summarize_sells(e for e in self if e.get("action") == "sell")
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            if idx.start is not None and idx.start < 0 and idx.stop is None and idx.step is None:
+                return self.tail(-idx.start)
+            return list(self)[idx]
+        if idx < 0:
+            if -idx > len(self):
+                raise IndexError("journal index out of range")
+            return self.tail(-idx)[0]
+        return list(self)[idx]
+
+    def __repr__(self):
+        return f"TradeJournal({self.path!r}, {len(self)} entries)"
+
+
+def load(state_file, journal_file, default):
+    """Load compact state and attach the journal as data["history"]."""
+    if not os.path.exists(state_file):
+        data = default()
+        data["history"] = TradeJournal(journal_file)
+        return data
+
+    with open(state_file, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if isinstance(data.get("history"), list):
+        # 旧格式：history 内嵌在 state 里 → 迁移一次。要删 journal 文件，
+        # 所以在锁里重新读一遍：别的进程可能已经迁移完并开始追加了
+        with file_lock(state_file):
+            with open(state_file, encoding="utf-8") as f:
+                data = json.load(f)
+            legacy = data.get("history")
+            if isinstance(legacy, list):
+                journal = TradeJournal(journal_file, count=0)
+                for path in _segments(journal_file) + [journal_file]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                journal.extend(legacy)
+                data["history"] = journal
+                save(data, state_file)
+                return data
+
+    count = data.pop("history_count", None)
+    size = data.pop("journal_size", None)
+    actual = os.path.getsize(journal_file) if os.path.exists(journal_file) else 0
+    if size != actual:
+        count = None  # state 和 journal 对不上（上次保存中途退出）→ 重新数
+    data["history"] = TradeJournal(journal_file, count=count)
+    return data
+
+
+def save(data, state_file):
+    """Append pending trades to the journal, then rewrite the small state file."""
+    journal = data["history"]
+    journal.flush()
+    journal.compact()
+    state = {k: v for k, v in data.items() if k != "history"}
+    state["history_count"] = len(journal)
+    state["journal_size"] = os.path.getsize(journal.path) if os.path.exists(journal.path) else 0
+    atomic_write_json(state_file, state, separators=(",", ":"))
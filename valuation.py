@@ -0,0 +1,168 @@
+"""Mark-to-market valuation — 持仓按实时价估值，一次批量查价 + NumPy 列式计算
+
+- PriceCache: market_id -> {"yes", "no"}，按 PRICE_TTL 过期；缺的 / 过期的
+  一次性交给 market_data.get_markets_by_ids（内部按 50 个一批并发请求），
+  同一时刻只有一个线程在查。live_feed 收到的推送价也写进来（put）。
+- Valuation: 一份组合的列式视图（shares / avg_price / 当前价），
+  mark() 全量估值，update() 只重算价格变了的那几行并增量更新总市值（流式用）。
+  summary() 的格式和 paper_trading.get_pnl() 一样。
+
+查价失败或查不到的持仓按成本价估值（和以前 get_pnl 不带价格时一样）。
+"""
+import os, sys, threading, time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+PRICE_TTL = float(os.environ.get("POLYCLAW_PRICE_TTL", 10))   # 秒
+
+
+class PriceCache:
+    """Batched, TTL-cached YES/NO prices by market id."""
+
+    def __init__(self, ttl=PRICE_TTL, fetch=None):
+        self.ttl = ttl
+        self.fetch = fetch
+        self.version = 0            # 任何价格变了就 +1（给响应缓存当 key）
+        self._prices = {}           # market_id -> (fetched_at, {"yes", "no"})
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def put(self, prices, now=None):
+        """Store {market_id: {"yes", "no"}} (e.g. pushed by a websocket); returns the ids that changed."""
+        now = time.time() if now is None else now
+        changed = []
+        with self._lock:
+            for mid, p in prices.items():
+                p = {"yes": p["yes"], "no": p["no"]}
+                old = self._prices.get(mid)
+                if old is None or old[1] != p:
+                    changed.append(mid)
+                self._prices[mid] = (now, p)
+            if changed:
+                self.version += 1
+        return changed
+
+    def _missing(self, ids, now):
+        with self._lock:
+            return [mid for mid in ids if mid not in self._prices or now - self._prices[mid][0] >= self.ttl]
+
+    def get(self, ids):
+        """{market_id: {"yes", "no"}} for ids, fetching stale / unknown ones in one batch."""
+        ids = list(dict.fromkeys(ids))
+        if self._missing(ids, time.time()):
+            with self._fetch_lock:
+                missing = self._missing(ids, time.time())     # 等锁期间别的线程可能已经查过了
+                if missing:
+                    fetch = self.fetch
+                    if fetch is None:
+                        from market_data import get_markets_by_ids as fetch
+                    try:
+                        found = fetch(missing)
+                    except Exception as e:
+                        print(f"⚠️ price lookup failed ({len(missing)} markets): {e}", file=sys.stderr)
+                        found = {}
+                    self.put({mid: {"yes": m["outcome_yes"], "no": m["outcome_no"]} for mid, m in found.items()})
+        with self._lock:
+            return {mid: self._prices[mid][1] for mid in ids if mid in self._prices}
+
+
+PRICES = PriceCache()
+
+
+class Valuation:
+    """Columnar mark-to-market of one portfolio state."""
+
+    def __init__(self, positions, balance, trade_count, starting_balance):
+        pos = list(positions.values())
+        n = len(pos)
+        self.keys = list(positions)
+        self.positions = pos
+        self.balance = balance
+        self.trade_count = trade_count
+        self.starting_balance = starting_balance
+        self.market_ids = [p["market_id"] for p in pos]
+        self.is_yes = np.fromiter((p["side"] == "yes" for p in pos), bool, n)
+        self.shares = np.fromiter((p["shares"] for p in pos), float, n)
+        self.avg = np.fromiter((p["avg_price"] for p in pos), float, n)
+        self.cost = self.shares * self.avg
+        self.price = self.avg.copy()
+        self.value = self.cost.copy()
+        self.positions_value = float(self.value.sum())
+        self.rows = defaultdict(list)   # market_id -> rows
+        for i, mid in enumerate(self.market_ids):
+            self.rows[mid].append(i)
+
+    @classmethod
+    def from_portfolio(cls, data, starting_balance):
+        return cls(data["positions"], data["balance"], len(data["history"]), starting_balance)
+
+    def _quote(self, rows, prices):
+        """Current price per row from {market_id: {"yes", "no"}}; cost basis where unknown."""
+        out = self.avg[rows].copy()
+        for j, i in enumerate(rows):
+            p = prices.get(self.market_ids[i])
+            if p is not None:
+                out[j] = p["yes"] if self.is_yes[i] else p["no"]
+        return out
+
+    def mark(self, prices):
+        """Full revaluation from {market_id: {"yes", "no"}}."""
+        rows = np.arange(len(self.keys))
+        self.price = self._quote(rows, prices)
+        self.value = self.shares * self.price
+        self.positions_value = float(self.value.sum())
+        return self
+
+    def mark_keys(self, current_prices):
+        """Full revaluation from the legacy {market_id_side: price} form."""
+        self.price = np.fromiter((current_prices.get(k, a) for k, a in zip(self.keys, self.avg)), float, len(self.keys))
+        self.value = self.shares * self.price
+        self.positions_value = float(self.value.sum())
+        return self
+
+    def update(self, changed):
+        """Revalue only the rows whose market ticked; returns True if any value moved."""
+        rows = [i for mid in changed if mid in self.rows for i in self.rows[mid]]
+        if not rows:
+            return False
+        rows = np.array(rows)
+        new = self._quote(rows, changed)
+        if np.array_equal(new, self.price[rows]):
+            return False
+        value = self.shares[rows] * new
+        self.positions_value += float((value - self.value[rows]).sum())
+        self.price[rows] = new
+        self.value[rows] = value
+        return True
+
+    def held_ids(self):
+        return list(self.rows)
+
+    def summary(self):
+        """Same shape as paper_trading.get_pnl()."""
+        pnl = self.value - self.cost
+        pct = np.divide(pnl, self.cost, out=np.zeros_like(pnl), where=self.cost > 0) * 100
+        details = [{
+            "question": p["question"],
+            "side": p["side"],
+            "shares": round(p["shares"], 2),
+            "avg_price": round(p["avg_price"], 4),
+            "current_price": round(float(price), 4),
+            "value": round(float(value), 2),
+            "pnl": round(float(d), 2),
+            "pnl_pct": round(float(r), 1),
+        } for p, price, value, d, r in zip(self.positions, self.price, self.value, pnl, pct)]
+        total_value = self.balance + self.positions_value
+        total_pnl = total_value - self.starting_balance
+        return {
+            "balance": round(self.balance, 2),
+            "positions_value": round(self.positions_value, 2),
+            "total_value": round(total_value, 2),
+            "total_pnl": round(total_pnl, 2),
+            "total_pnl_pct": round(total_pnl / self.starting_balance * 100, 1),
+            "positions": details,
+            "trade_count": self.trade_count,
+        }
@@ -0,0 +1,128 @@
+"""Vectorised candidate scoring — 全市场扫描用 NumPy 列式计算
+
+把市场列表转成列（yes/no 价格、24h量、流动性、分类标记、持仓/主题冲突标记），
+每个策略的过滤条件变成布尔掩码、打分变成 np.select，
+结果（顺序、分数）和 auto_trader 里逐个 if/elif 的 _find_*_trades 完全一致。
+
+分类（问题文本跑关键词正则）占了扫描的大头，所以是懒的：每个策略先用价格/交易量
+算掩码，只对还留在掩码里的行分类（分过的行后面的策略直接复用）。
+
+动量策略的输入是 trigger 文件里的几条警报而不是全市场，仍走原来的逐条逻辑。
+
+配置（cfg）是带 auto_trader 常量名属性的对象，见 auto_trader._config()。
+"""
+import numpy as np
+
+
+class MarketFrame:
+    """Columnar view of a market list plus held/topic flags taken from a PortfolioIndex.
+
+    sports / fear / topics are only valid for rows passed to classify().
+    """
+
+    def __init__(self, markets, index, classify, expiry_days=None):
+        n = len(markets)
+        self.markets = markets
+        self.index = index
+        self.classify_fn = classify
+        self.expiry_days = expiry_days
+        self._expiry = {}
+        self.ids = [m["id"] for m in markets]
+        self.yes = np.fromiter((m["outcome_yes"] for m in markets), float, n)
+        self.no = np.fromiter((m["outcome_no"] for m in markets), float, n)
+        self.volume = np.fromiter((m["volume_24h"] for m in markets), float, n)
+        self.liquidity = np.fromiter((m.get("liquidity", 0) for m in markets), float, n)
+        self.held = np.fromiter((index.holds(mid) for mid in self.ids), bool, n)
+
+        self.classified = np.zeros(n, bool)
+        self.sports = np.zeros(n, bool)
+        self.fear = np.zeros(n, bool)
+        self.topics = [()] * n
+        self.touches_held = np.zeros(n, bool)   # 有已持仓的主题，要过 topic_ok
+        self._held_topics = {t for t, c in index.topic_count.items() if c > 0}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def classify(self, mask):
+        """Fill the class / topic columns for the rows in mask that aren't done yet."""
+        held_topics = self._held_topics
+        for i in np.flatnonzero(mask & ~self.classified).tolist():
+            sports, fear, topics = self.classify_fn(self.markets[i])
+            self.sports[i] = sports
+            self.fear[i] = fear is not None
+            self.topics[i] = topics
+            self.touches_held[i] = bool(held_topics) and not held_topics.isdisjoint(topics)
+            self.classified[i] = True
+
+    def topic_ok(self, mask, side, limit=None):
+        """index.topic_ok for the (classified) rows in mask; side is "yes"/"no" or one per row."""
+        ok = np.ones(len(self.ids), bool)
+        for i in np.flatnonzero(mask & self.touches_held).tolist():
+            ok[i] = self.index.topic_ok(self.topics[i], side if isinstance(side, str) else side[i], limit)
+        return ok
+
+    def days_to_expiry(self, rows):
+        """Parsed expiry days for the given rows (NaN = unknown); cached per row."""
+        out = np.full(len(rows), np.nan)
+        if self.expiry_days is None:
+            return out
+        for k, i in enumerate(rows):
+            if i not in self._expiry:
+                self._expiry[i] = self.expiry_days(self.markets[i]["question"])
+            if self._expiry[i] is not None:
+                out[k] = self._expiry[i]
+        return out
+
+    def ranked(self, mask, score, extra=None):
+        """Rows passing mask sorted by score desc; ties keep market order like sorted()."""
+        rows = np.flatnonzero(mask)
+        order = rows[np.argsort(-score[rows], kind="stable")]
+        if extra is None:
+            return [(int(score[i]), self.markets[i]) for i in order]
+        return [(int(score[i]), self.markets[i], extra[i]) for i in order]
+
+
+def fear_candidates(frame, cfg):
+    yes, vol = frame.yes, frame.volume
+    mask = (vol >= cfg.FEAR_MIN_VOLUME) & (yes >= 0.20) & (yes <= 0.80) & ~frame.held
+    frame.classify(mask)
+    mask &= ~frame.sports & frame.fear
+    mask &= frame.topic_ok(mask, "no", cfg.MAX_TOPIC_POSITIONS)
+    score = (np.select([yes > 0.50, yes > 0.35], [30, 20], 10)
+             + np.select([vol > 500000, vol > 200000], [15, 10], 0))
+    return frame.ranked(mask, score)
+
+
+def hp_candidates(frame, cfg):
+    if frame.index.strategy_count["hp"] >= cfg.HP_MAX_POSITIONS:
+        return []
+    yes, no, vol = frame.yes, frame.no, frame.volume
+    yes_high = yes >= no
+    high = np.where(yes_high, yes, no)
+    mask = ((vol >= cfg.HP_MIN_VOLUME) & (high >= cfg.HP_MIN_PRICE) & (high <= cfg.HP_MAX_PRICE)
+            & ~frame.held)
+    sides = np.where(yes_high, "yes", "no")
+    frame.classify(mask)
+    mask &= ~frame.sports
+    mask &= frame.topic_ok(mask, sides, cfg.MAX_TOPIC_POSITIONS)
+    score = (np.select([high <= 0.90, high <= 0.92, high <= 0.94], [20, 15, 10], 5)
+             + np.select([vol > 500000, vol > 300000], [15, 10], 0))
+    return frame.ranked(mask, score, sides.tolist())
+
+
+def longshot_candidates(frame, cfg):
+    if not cfg.LS_ENABLED or frame.index.strategy_count["ls"] >= cfg.LS_MAX_POSITIONS:
+        return []
+    yes, vol = frame.yes, frame.volume
+    mask = (yes >= cfg.LS_MIN_PRICE) & (yes <= cfg.LS_MAX_PRICE) & ~frame.held
+    frame.classify(mask)
+    mask &= ~frame.sports
+    # 到期日要解析问题文本，只对已经过了价格/体育/持仓过滤的行做
+    rows = np.flatnonzero(mask)
+    days = frame.days_to_expiry(rows)
+    mask[rows[days < cfg.LS_MIN_DAYS_TO_EXPIRY]] = False
+    score = (20 + np.select([vol > 100000, vol > 50000], [15, 10], 0)
+             + np.select([yes <= 0.01, yes <= 0.03], [15, 10], 0)
+             + np.where(frame.fear, 10, 0))
+    return frame.ranked(mask, score)